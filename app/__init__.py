@@ -33,10 +33,14 @@ def create_app():
     # Serve static files from the project-level "static" directory so that
     # resources are available when running via ``python run.py`` as well as
     # inside Docker containers.
+    from .database import configure_engine, engine_options, normalize_database_url
+
     app = Flask(__name__, static_folder="../static")
     os.makedirs(app.instance_path, exist_ok=True)
     db_file = os.path.join(app.instance_path, "db.sqlite3")
-    db_uri = os.environ.get("SQLALCHEMY_DATABASE_URI", f"sqlite:///{db_file}")
+    db_uri = normalize_database_url(
+        os.environ.get("SQLALCHEMY_DATABASE_URI", f"sqlite:///{db_file}")
+    )
     app.config['SECRET_KEY'] = os.environ.get(
         "SECRET_KEY", "default-dev-secret"
     )
@@ -71,9 +75,90 @@ def create_app():
         'WHATSAPP_FORCE_TEST_RECIPIENT', ''
     )
 
+    # Outbound WhatsApp pacing shared by all processes through the database:
+    # global messages per minute (0 disables), burst size, and seconds
+    # between two messages to the same chat (0 disables)
+    app.config['WHATSAPP_RATE_PER_MINUTE'] = float(
+        os.environ.get('WHATSAPP_RATE_PER_MINUTE', 20)
+    )
+    app.config['WHATSAPP_RATE_BURST'] = int(os.environ.get('WHATSAPP_RATE_BURST', 5))
+    app.config['WHATSAPP_RECIPIENT_SPACING'] = float(
+        os.environ.get('WHATSAPP_RECIPIENT_SPACING', 3)
+    )
+    # Inbound webhook messages allowed per chat within WEBHOOK_RATE_WINDOW
+    # seconds, counted across all workers (0 disables)
+    app.config['WEBHOOK_RATE_LIMIT'] = int(os.environ.get('WEBHOOK_RATE_LIMIT', 10))
+    app.config['WEBHOOK_RATE_WINDOW'] = float(os.environ.get('WEBHOOK_RATE_WINDOW', 60))
+    # Chats whose inbound buckets each worker keeps in memory (LRU)
+    app.config['WEBHOOK_RATE_CACHE_SIZE'] = int(
+        os.environ.get('WEBHOOK_RATE_CACHE_SIZE', 10000)
+    )
+
     # Gemini AI configuration
     app.config['GEMINI_API_KEY'] = os.environ.get('GEMINI_API_KEY')
     app.config['GEMINI_MODEL'] = os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')
+    # Cache identical questions (same sender context) to save API quota
+    app.config['GEMINI_CACHE_TTL'] = int(os.environ.get('GEMINI_CACHE_TTL', 600))
+    app.config['GEMINI_CACHE_SIZE'] = int(os.environ.get('GEMINI_CACHE_SIZE', 256))
+    # Latency budget per call and circuit breaker for a degraded Gemini API
+    app.config['GEMINI_TIMEOUT'] = float(os.environ.get('GEMINI_TIMEOUT', 6))
+    app.config['GEMINI_BREAKER_THRESHOLD'] = int(
+        os.environ.get('GEMINI_BREAKER_THRESHOLD', 3)
+    )
+    app.config['GEMINI_BREAKER_RESET'] = float(
+        os.environ.get('GEMINI_BREAKER_RESET', 60)
+    )
+
+    # Send admin-triggered notifications (cancellations) in a background
+    # thread; when off they are sent within the request
+    app.config['NOTIFICATIONS_ASYNC'] = os.environ.get(
+        'NOTIFICATIONS_ASYNC', '1'
+    ).lower() in ('1', 'true', 'yes', 'on')
+
+    # Encoded registration attachments kept in memory per process (0 disables)
+    app.config['ATTACHMENT_CACHE_MAX_BYTES'] = int(
+        os.environ.get('ATTACHMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    )
+
+    # Server-Timing header and per-endpoint timing aggregates
+    app.config['REQUEST_PROFILING'] = os.environ.get(
+        'REQUEST_PROFILING', '1'
+    ).lower() in ('1', 'true', 'yes', 'on')
+
+    # Log statements slower than this (ms) with their query plan; 0 disables
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 500))
+
+    # N+1 detector: "warn" or "raise" when one relationship is lazy-loaded
+    # more than NPLUSONE_THRESHOLD times per request/command (off when empty)
+    app.config['NPLUSONE_MODE'] = os.environ.get('NPLUSONE_MODE', '').lower()
+    app.config['NPLUSONE_THRESHOLD'] = int(os.environ.get('NPLUSONE_THRESHOLD', 10))
+
+    # SQLite connection profile (app/database.py); SQLITE_PROFILE=0 keeps
+    # SQLite's defaults (rollback journal, synchronous=FULL)
+    app.config['SQLITE_PROFILE'] = os.environ.get(
+        'SQLITE_PROFILE', '1'
+    ).lower() in ('1', 'true', 'yes', 'on')
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(
+        os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    )
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 32768))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))
+    app.config['SQLITE_TEMP_STORE'] = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+
+    # PostgreSQL pool per process (app/database.py): WEB_CONCURRENCY gunicorn
+    # workers with WEB_THREADS threads share DB_MAX_CONNECTIONS connections
+    app.config['WEB_CONCURRENCY'] = int(os.environ.get('WEB_CONCURRENCY', 2))
+    app.config['WEB_THREADS'] = int(os.environ.get('WEB_THREADS', 2))
+    app.config['DB_MAX_CONNECTIONS'] = int(os.environ.get('DB_MAX_CONNECTIONS', 20))
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 0))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+    # Bearer token for scraping /metrics without an admin session
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
 
     log_level = os.environ.get("LOG_LEVEL")
     if log_level:
@@ -88,18 +173,25 @@ def create_app():
         app.logger.setLevel(logging.INFO)
 
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            configure_engine(app, engine)
     migrate_dir = os.path.join(
         os.path.dirname(os.path.dirname(__file__)), "migrations"
     )
     migrate.init_app(app, db, directory=migrate_dir)
     csrf.init_app(app)
+    from .instrumentation import lazy_load_detector, profiler
+    profiler.init_app(app)
+    lazy_load_detector.init_app(app)
 
     with app.app_context():
-        from . import routes, admin_routes, cli, webhook_routes
+        from . import routes, admin_routes, cli, metrics, webhook_routes
         from .whatsapp_utils import format_phone_display
         app.register_blueprint(routes.bp)
         app.register_blueprint(admin_routes.admin_bp, url_prefix='/admin')
         app.register_blueprint(webhook_routes.webhook_bp, url_prefix='/webhook')
+        app.register_blueprint(metrics.metrics_bp)
         # Blueprints are registered after extensions so migrations can run
 
         # Exempt webhook from CSRF (it uses API key auth)
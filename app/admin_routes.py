@@ -13,7 +13,7 @@ from flask import (
 import flask
 import requests as http_requests
 from functools import wraps
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from uuid import uuid4
 import mimetypes
@@ -21,13 +21,12 @@ import mimetypes
 from werkzeug.utils import secure_filename
 
 from . import db, csrf
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
 from . import email_utils
-from .whatsapp_utils import notify_volunteer_training_canceled, notify_volunteer_training_time_changed, normalize_phone_number
-
-# Alias retained for compatibility with tests that monkeypatch the function.
-send_email = email_utils.send_email
-
+from . import message_log, notifications
+from .whatsapp_utils import normalize_phone_number
+from .attachments import clear_attachment_cache, legacy_file_meta, materialize_stored_file
+from .instrumentation import track_http
 from .template_utils import render_template_string
 from .forms import (
     CoachForm,
@@ -44,12 +43,18 @@ from .models import (
     Training,
     Location,
     EmailSettings,
+    MessageLog,
+    NotificationJob,
     StoredFile,
     TrainingSeries,
     Volunteer,
     WhatsAppTemplate,
+    build_series_key,
 )
 
+# Alias retained for compatibility with tests that monkeypatch the function.
+send_email = email_utils.send_email
+
 admin_bp = Blueprint("admin", __name__)
 
 
@@ -98,6 +103,33 @@ def _as_utc(value):
     return value.astimezone(timezone.utc)
 
 
+def _occupied_location_slots(location_id, dates):
+    """Return ``{utc_datetime: {training_id, ...}}`` for trainings at a location.
+
+    Only active trainings whose start matches one of ``dates`` are included.
+    All candidate dates are checked with one ``IN`` query instead of one
+    round trip per date.
+    """
+
+    dates = [value for value in dates if value is not None]
+    if not dates:
+        return {}
+
+    rows = (
+        db.session.query(Training.id, Training.date)
+        .filter(
+            Training.location_id == location_id,
+            Training.date.in_(dates),
+            Training.is_deleted.is_(False),
+        )
+        .all()
+    )
+    occupied = {}
+    for training_id, training_date in rows:
+        occupied.setdefault(_as_utc(training_date), set()).add(training_id)
+    return occupied
+
+
 def _parse_series_key(series_key):
     """Return tuple describing a series derived from ``series_key``."""
 
@@ -119,39 +151,59 @@ def _parse_series_key(series_key):
 
 
 def _resolve_series(series_key):
-    """Return ``(series, trainings, metadata)`` for ``series_key`` or ``None``."""
+    """Return ``(series, trainings, metadata)`` for ``series_key`` or ``None``.
+
+    Uses the indexed ``Training.series_key`` column, so the lookup cost does
+    not grow with the number of historical series.
+    """
 
     parsed = _parse_series_key(series_key)
     if not parsed:
         return None
 
     weekday, time_label, coach_id, location_id = parsed
-    candidate_series = (
-        TrainingSeries.query.options(joinedload(TrainingSeries.trainings))
-        .filter(TrainingSeries.repeat.is_(True))
+    matching = (
+        Training.query.join(
+            TrainingSeries, Training.series_id == TrainingSeries.id
+        )
+        .options(contains_eager(Training.series))
+        .filter(
+            Training.series_key == series_key,
+            Training.is_deleted.is_(False),
+            TrainingSeries.repeat.is_(True),
+        )
+        .order_by(TrainingSeries.id, Training.date)
         .all()
     )
+    if not matching:
+        return None
+
+    series = matching[0].series
+    trainings = [
+        training for training in matching if training.series_id == series.id
+    ]
+    metadata = {
+        "weekday": weekday,
+        "time_label": f"{time_label[:2]}:{time_label[2:]}",
+        "coach_id": coach_id,
+        "location_id": location_id,
+    }
+    return series, trainings, metadata
 
-    for series in candidate_series:
-        trainings = [
-            training
-            for training in series.trainings
-            if not training.is_deleted
-            and training.coach_id == coach_id
-            and training.location_id == location_id
-            and training.date.weekday() == weekday
-            and training.date.strftime("%H%M") == time_label
-        ]
-        if trainings:
-            metadata = {
-                "weekday": weekday,
-                "time_label": f"{time_label[:2]}:{time_label[2:]}",
-                "coach_id": coach_id,
-                "location_id": location_id,
-            }
-            return series, trainings, metadata
 
-    return None
+def _series_has_other_trainings(series, series_key):
+    """Whether ``series`` has live trainings outside ``series_key``.
+
+    A rule with several weekdays creates one series whose trainings fall
+    under one series key per weekday.
+    """
+    return db.session.query(
+        Training.query.filter(
+            Training.series_id == series.id,
+            Training.series_key != series_key,
+            Training.is_deleted.is_(False),
+        ).exists()
+    ).scalar()
 
 
 def login_required(view):
@@ -428,7 +480,12 @@ def manage_trainings():
     ]
     repeat_feedback = session.pop("repeat_feedback", None)
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    trainings_q = Training.query.filter(
+    trainings_q = Training.query.options(
+        joinedload(Training.coach),
+        joinedload(Training.location),
+        joinedload(Training.series),
+        selectinload(Training.bookings).joinedload(Booking.volunteer),
+    ).filter(
         Training.date >= today,
         Training.is_deleted.is_(False),
     ).order_by(Training.date)
@@ -459,12 +516,10 @@ def manage_trainings():
         )
         series = series_map.get(key)
         if series is None:
-            series_key = (
-                f"{weekday}-{date.strftime('%H%M')}-c{training.coach_id}-"
-                f"l{training.location_id}"
-            )
             series = {
-                "series_key": series_key,
+                "series_key": training.series_key or build_series_key(
+                    date, training.coach_id, training.location_id
+                ),
                 "weekday": weekday,
                 "weekday_label": day_names[weekday],
                 "time_label": time_label,
@@ -528,34 +583,18 @@ def manage_trainings():
                 continue
             planned_dates.append(_normalise_schedule_datetime(occurrence))
         planned_count = len(planned_dates)
-        created = 0
-        conflicts = []
-        new_trainings = []
-
-        for candidate in planned_dates:
-            conflict = (
-                Training.query.filter(
-                    Training.date == candidate,
-                    Training.location_id == form.location_id.data,
-                    Training.is_deleted.is_(False),
-                )
-                .order_by(Training.id)
-                .first()
-            )
-
-            if conflict:
-                conflicts.append(candidate)
-                continue
-
-            new_training = Training(
-                date=candidate,
-                location_id=form.location_id.data,
-                coach_id=form.coach_id.data,
-                max_volunteers=form.max_volunteers.data,
-            )
-            db.session.add(new_training)
-            new_trainings.append(new_training)
-            created += 1
+        occupied = _occupied_location_slots(
+            form.location_id.data, planned_dates
+        )
+        conflicts = [
+            candidate for candidate in planned_dates
+            if _as_utc(candidate) in occupied
+        ]
+        free_dates = [
+            candidate for candidate in planned_dates
+            if _as_utc(candidate) not in occupied
+        ]
+        created = len(free_dates)
 
         conflict_strings = [dt.strftime("%Y-%m-%d %H:%M") for dt in conflicts]
 
@@ -580,8 +619,25 @@ def manage_trainings():
                 max_volunteers=form.max_volunteers.data,
             )
             db.session.add(series)
-            for training in new_trainings:
-                training.series = series
+            db.session.flush()
+            # Bulk INSERT (single executemany); mapper events do not run here,
+            # so the series key is filled in explicitly.
+            db.session.execute(
+                db.insert(Training),
+                [
+                    {
+                        "date": candidate,
+                        "location_id": form.location_id.data,
+                        "coach_id": form.coach_id.data,
+                        "max_volunteers": form.max_volunteers.data,
+                        "series_id": series.id,
+                        "series_key": build_series_key(
+                            candidate, form.coach_id.data, form.location_id.data
+                        ),
+                    }
+                    for candidate in free_dates
+                ],
+            )
             db.session.commit()
         else:
             db.session.rollback()
@@ -658,17 +714,23 @@ def edit_training(training_id):
     if form.validate_on_submit():
         old_date = training.date
         new_date = form.date.data
-        time_changed = (
+        old_location = training.location
+        new_location = db.session.get(Location, form.location_id.data)
+        # Date, hour or place; training_change_job picks the message template
+        changed = (
             old_date is not None
             and new_date is not None
-            and old_date.strftime("%H:%M") != new_date.strftime("%H:%M")
+            and (
+                old_date.strftime("%Y-%m-%d %H:%M") != new_date.strftime("%Y-%m-%d %H:%M")
+                or old_location.id != form.location_id.data
+            )
         )
         booked_volunteers = [
             b.volunteer for b in training.bookings
-        ] if time_changed else []
+        ] if changed else []
 
-        # If time changed and has bookings, require confirmation
-        if time_changed and booked_volunteers and not flask.request.form.get("confirm_time_change"):
+        # If the training moved and has bookings, require confirmation
+        if changed and booked_volunteers and not flask.request.form.get("confirm_time_change"):
             volunteer_names = ", ".join(
                 f"{v.first_name} {v.last_name}" for v in booked_volunteers
             )
@@ -677,71 +739,26 @@ def edit_training(training_id):
                 form=form,
                 training=training,
                 confirm_time_change=True,
-                old_time=old_date.strftime("%H:%M"),
-                new_time=new_date.strftime("%H:%M"),
+                old_label=f"{old_date.strftime('%Y-%m-%d %H:%M')}, {old_location.name}",
+                new_label=(
+                    f"{new_date.strftime('%Y-%m-%d %H:%M')}, "
+                    f"{new_location.name if new_location else '?'}"
+                ),
                 affected_volunteers=volunteer_names,
             )
 
+        old_location_name = old_location.name
         training.date = new_date
         training.location_id = form.location_id.data
         training.coach_id = form.coach_id.data
         training.max_volunteers = form.max_volunteers.data
         db.session.commit()
 
-        # Send notifications if time changed
-        if time_changed and booked_volunteers:
-            old_time_str = old_date.strftime("%H:%M")
-            new_time_str = new_date.strftime("%H:%M")
-            date_str = new_date.strftime("%Y-%m-%d")
-            location_name = training.location.name
-
-            settings = db.session.get(EmailSettings, 1)
-            for vol in booked_volunteers:
-                vol_name = f"{vol.first_name} {vol.last_name}"
-                # WhatsApp notification
-                # Mark booking so 18:00 reminder is skipped (time change msg already asks for confirmation)
-                booking_obj = next((b for b in training.bookings if b.volunteer_id == vol.id), None)
-                if booking_obj:
-                    booking_obj.time_change_notified = True
-
-                if vol.phone_number:
-                    wa_ok, wa_err = notify_volunteer_training_time_changed(
-                        volunteer_phone=vol.phone_number,
-                        volunteer_name=vol_name,
-                        training_old_time=old_time_str,
-                        training_new_time=new_time_str,
-                        training_date=date_str,
-                        training_location=location_name,
-                    )
-                    if not wa_ok:
-                        current_app.logger.warning(
-                            "WhatsApp time-change to %s failed: %s",
-                            vol_name, wa_err,
-                        )
-                # Email notification
-                email_body = (
-                    f"<p>Cześć {vol.first_name}!</p>"
-                    f"<p>Informujemy, że godzina Twojego treningu została zmieniona:</p>"
-                    f"<p>📅 Data: <strong>{date_str}</strong><br>"
-                    f"❌ Stara godzina: <strong>{old_time_str}</strong><br>"
-                    f"✅ Nowa godzina: <strong>{new_time_str}</strong><br>"
-                    f"📍 Miejsce: <strong>{location_name}</strong></p>"
-                    f"<p>Jeśli nie możesz uczestniczyć o nowej godzinie, "
-                    f"prosimy o wypisanie się z treningu.</p>"
-                    f"<p>Pozdrawiamy,<br>Fundacja Widzimy Inaczej</p>"
-                )
-                send_email(
-                    "Zmiana godziny treningu",
-                    None,
-                    [vol.email],
-                    html_body=email_body,
-                )
-            flash(
-                f"Powiadomiono {len(booked_volunteers)} wolontariuszy o zmianie godziny.",
-                "info",
+        if changed and booked_volunteers:
+            job = notifications.training_change_job(
+                [notifications.TrainingChange(training.id, old_date, old_location_name)]
             )
-            # Persist the time_change_notified flags
-            db.session.commit()
+            return _send_notifications(job, "Zaktualizowano trening.", "success")
 
         flash("Zaktualizowano trening.", "success")
         return redirect(url_for("admin.manage_trainings"))
@@ -759,56 +776,96 @@ def cancel_training(training_id):
     if training is None:
         abort(404)
     training.is_canceled = True
+    job = notifications.training_cancellation_job([training.id])
+    return _send_notifications(
+        job, "Trening został oznaczony jako odwołany.", "warning"
+    )
+
+
+def _send_notifications(job, message, category):
+    """Commit the session with ``job`` and send it in the background.
+
+    A job without deliveries is dropped.
+    """
+    if not job.deliveries:
+        db.session.expunge(job)
+        db.session.commit()
+        flash(message, category)
+        return redirect(url_for("admin.manage_trainings"))
     db.session.commit()
+    notifications.start_job(job.id)
+    flash(f"{message} Powiadomienia są wysyłane w tle.", category)
+    return redirect(url_for("admin.notification_job", job_id=job.id))
 
-    subject = "Trening odwołany"
-    settings = db.session.get(EmailSettings, 1)
-    body_template = (
-        settings.cancellation_template
-        if settings and settings.cancellation_template
-        else None
+
+@admin_bp.route("/notifications/<int:job_id>")
+@login_required
+def notification_job(job_id):
+    job = db.session.get(NotificationJob, job_id)
+    if job is None:
+        abort(404)
+    return render_template(
+        "admin/notification_job.html",
+        job=job,
+        progress=notifications.job_progress(job.id),
     )
-    data = {
-        "date": training.date.strftime("%Y-%m-%d %H:%M"),
-        "location": training.location.name,
-        "logo": url_for("static", filename="logo.png", _external=True),
-    }
-    if body_template:
-        html_body = render_template_string(body_template, data)
-    else:
-        html_body = f"Trening {data['date']} w {data['location']} został odwołany."
-    recipients = [b.volunteer.email for b in training.bookings]
-    if recipients:
-        success, error = send_email(
-            subject, None, recipients, html_body=html_body
-        )
-        if not success:
-            msg = "Nie udało się wysłać e-maila"
-            if error:
-                msg += f": {error}"
-            flash(msg, "danger")
-
-    # Send WhatsApp notifications to all volunteers
-    training_date_str = training.date.strftime('%Y-%m-%d %H:%M')
-    for booking in training.bookings:
-        volunteer = booking.volunteer
-        if volunteer.phone_number:
-            volunteer_full_name = f"{volunteer.first_name} {volunteer.last_name}"
-            wa_success, wa_error = notify_volunteer_training_canceled(
-                volunteer_phone=volunteer.phone_number,
-                volunteer_name=volunteer_full_name,
-                training_date=training_date_str,
-                training_location=training.location.name,
-            )
-            if not wa_success and wa_error:
-                current_app.logger.warning(
-                    "WhatsApp notification to %s failed: %s",
-                    volunteer_full_name,
-                    wa_error,
-                )
 
-    flash("Trening został oznaczony jako odwołany.", "warning")
-    return redirect(url_for("admin.manage_trainings"))
+
+@admin_bp.route("/messages")
+@login_required
+def messages():
+    """Outbound WhatsApp messages with delivery status and statistics."""
+    args = flask.request.args
+    status = args.get("status", "")
+    template = args.get("template", "")
+    recipient = args.get("recipient", "").strip()
+    date_from = args.get("date_from", "")
+    date_to = args.get("date_to", "")
+
+    filters = []
+    if status:
+        filters.append(MessageLog.status == status)
+    if template:
+        filters.append(MessageLog.template == template)
+    if recipient:
+        # Whole chat id, so the (recipient, created_at) index is used
+        if "@" in recipient:
+            chat_id = recipient
+        else:
+            chat_id = f"{normalize_phone_number(recipient).lstrip('+')}@c.us"
+        filters.append(MessageLog.recipient == chat_id)
+    try:
+        if date_from:
+            start = datetime.strptime(date_from, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            filters.append(MessageLog.created_at >= start)
+        if date_to:
+            end = datetime.strptime(date_to, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            filters.append(MessageLog.created_at < end + timedelta(days=1))
+    except ValueError:
+        flash("Nieprawidłowy format daty.", "danger")
+        return redirect(url_for("admin.messages"))
+
+    stmt = (
+        db.select(MessageLog)
+        .where(*filters)
+        .order_by(MessageLog.created_at.desc(), MessageLog.id.desc())
+    )
+    pagination = db.paginate(stmt, page=args.get("page", 1, type=int), per_page=50)
+    return render_template(
+        "admin/messages.html",
+        messages=pagination.items,
+        pagination=pagination,
+        stats=message_log.summary(filters),
+        filters={
+            "status": status,
+            "template": template,
+            "recipient": recipient,
+            "date_from": date_from,
+            "date_to": date_to,
+        },
+        status_labels=message_log.STATUS_LABELS,
+        template_labels=message_log.TEMPLATE_LABELS,
+    )
 
 
 @admin_bp.route("/trainings/<int:training_id>/delete", methods=["POST"])
@@ -831,15 +888,6 @@ def edit_series(series_key):
         abort(404)
 
     series, trainings, metadata = resolved
-    form = TrainingSeriesForm(obj=series)
-    form.coach_id.choices = [
-        (c.id, f"{c.first_name} {c.last_name}")
-        for c in Coach.query.order_by(Coach.last_name).all()
-    ]
-    form.location_id.choices = [
-        (loc.id, loc.name) for loc in Location.query.order_by(Location.name).all()
-    ]
-
     upcoming_trainings = [
         training
         for training in trainings
@@ -847,22 +895,29 @@ def edit_series(series_key):
     ]
     if not upcoming_trainings:
         upcoming_trainings = trainings
+    # Prefill from this weekday's trainings; the series row may describe
+    # other weekdays of the same rule
+    first = upcoming_trainings[0]
+
+    form = TrainingSeriesForm(obj=first)
+    form.coach_id.choices = [
+        (c.id, f"{c.first_name} {c.last_name}")
+        for c in Coach.query.order_by(Coach.last_name).all()
+    ]
+    form.location_id.choices = [
+        (loc.id, loc.name) for loc in Location.query.order_by(Location.name).all()
+    ]
 
     if form.validate_on_submit():
-        conflict_dates: list[str] = []
-        for training in upcoming_trainings:
-            conflict = (
-                Training.query.filter(
-                    Training.id != training.id,
-                    Training.date == training.date,
-                    Training.location_id == form.location_id.data,
-                    Training.is_deleted.is_(False),
-                )
-                .order_by(Training.id)
-                .first()
-            )
-            if conflict:
-                conflict_dates.append(training.date.strftime("%Y-%m-%d %H:%M"))
+        occupied = _occupied_location_slots(
+            form.location_id.data,
+            [training.date for training in upcoming_trainings],
+        )
+        conflict_dates: list[str] = [
+            training.date.strftime("%Y-%m-%d %H:%M")
+            for training in upcoming_trainings
+            if occupied.get(_as_utc(training.date), set()) - {training.id}
+        ]
 
         if conflict_dates:
             conflict_list = ", ".join(conflict_dates)
@@ -896,9 +951,18 @@ def edit_series(series_key):
                 metadata=metadata,
             )
 
-        series.coach_id = form.coach_id.data
-        series.location_id = form.location_id.data
-        series.max_volunteers = form.max_volunteers.data
+        now = datetime.now(timezone.utc)
+        before = [
+            notifications.TrainingChange(training.id, training.date, training.location.name)
+            for training in upcoming_trainings
+            if training.bookings and _as_utc(training.date) >= now
+        ]
+
+        # Other weekdays of a shared series keep the series' settings
+        if not _series_has_other_trainings(series, series_key):
+            series.coach_id = form.coach_id.data
+            series.location_id = form.location_id.data
+            series.max_volunteers = form.max_volunteers.data
 
         for training in upcoming_trainings:
             training.coach_id = form.coach_id.data
@@ -906,13 +970,13 @@ def edit_series(series_key):
             training.max_volunteers = form.max_volunteers.data
 
         db.session.commit()
-        flash("Zaktualizowano serię treningów.", "success")
-        return redirect(url_for("admin.manage_trainings"))
+        job = notifications.training_change_job(before)
+        return _send_notifications(job, "Zaktualizowano serię treningów.", "success")
 
     if flask.request.method == "GET":
-        form.coach_id.data = series.coach_id
-        form.location_id.data = series.location_id
-        form.max_volunteers.data = series.max_volunteers
+        form.coach_id.data = first.coach_id
+        form.location_id.data = first.location_id
+        form.max_volunteers.data = first.max_volunteers
 
     weekday_names = [
         "Poniedziałek",
@@ -942,6 +1006,32 @@ def edit_series(series_key):
     )
 
 
+@admin_bp.route("/trainings/series/<series_key>/cancel", methods=["POST"])
+@login_required
+def cancel_series(series_key):
+    resolved = _resolve_series(series_key)
+    if not resolved:
+        abort(404)
+
+    _series, trainings, _metadata = resolved
+    now = datetime.now(timezone.utc)
+    upcoming = [
+        training
+        for training in trainings
+        if not training.is_canceled and _as_utc(training.date) >= now
+    ]
+    if not upcoming:
+        flash("Brak nadchodzących treningów do odwołania.", "info")
+        return redirect(url_for("admin.manage_trainings"))
+
+    for training in upcoming:
+        training.is_canceled = True
+    job = notifications.training_cancellation_job([training.id for training in upcoming])
+    return _send_notifications(
+        job, f"Odwołano {len(upcoming)} treningów z serii.", "warning"
+    )
+
+
 @admin_bp.route("/trainings/series/<series_key>/delete", methods=["POST"])
 @login_required
 def delete_series(series_key):
@@ -951,12 +1041,12 @@ def delete_series(series_key):
 
     series, trainings, _metadata = resolved
 
-    for training in series.trainings:
-        if training.is_deleted:
-            continue
+    # A multi-weekday rule shares one series; delete only this weekday's row
+    for training in trainings:
         training.is_deleted = True
 
-    series.repeat = False
+    if not _series_has_other_trainings(series, series_key):
+        series.repeat = False
     db.session.commit()
     flash("Seria treningów została usunięta.", "info")
     return redirect(url_for("admin.manage_trainings"))
@@ -1199,10 +1289,7 @@ def settings():
                         entry,
                     )
                     continue
-                safe_name = secure_filename(stored_file.filename or "")
-                if not safe_name:
-                    safe_name = f"file_{entry}"
-                stored_name = f"legacy_{entry}_{safe_name}"
+                meta = legacy_file_meta(stored_file)
                 try:
                     attachments_dir.mkdir(parents=True, exist_ok=True)
                 except OSError:
@@ -1211,30 +1298,18 @@ def settings():
                     )
                     flash(attachment_error_message, "danger")
                     error_occurred = True
-                    normalized.append(
-                        {
-                            "stored_name": stored_name,
-                            "original_name": stored_file.filename,
-                            "content_type": stored_file.content_type,
-                        }
+                    normalized.append(meta)
+                    continue
+                try:
+                    # Streams the blob only when the file is not on disk yet
+                    materialize_stored_file(stored_file, attachments_dir)
+                except OSError:
+                    current_app.logger.warning(
+                        "Failed to materialize legacy stored file %s",
+                        attachments_dir / meta["stored_name"],
                     )
                     continue
-                target_path = attachments_dir / stored_name
-                if not target_path.exists():
-                    try:
-                        target_path.write_bytes(stored_file.data)
-                    except OSError:
-                        current_app.logger.warning(
-                            "Failed to materialize legacy stored file %s", target_path
-                        )
-                        continue
-                normalized.append(
-                    {
-                        "stored_name": stored_name,
-                        "original_name": stored_file.filename,
-                        "content_type": stored_file.content_type,
-                    }
-                )
+                normalized.append(meta)
                 continue
             current_app.logger.warning(
                 "Unexpected attachment metadata entry in settings: %r", entry
@@ -1377,6 +1452,8 @@ def settings():
         settings.registration_files_adult = updated_adult
         settings.registration_files_minor = updated_minor
         db.session.commit()
+        if (updated_adult, updated_minor) != (existing_adult, existing_minor):
+            clear_attachment_cache()
         flash("Zapisano ustawienia.", "success")
         return redirect(url_for("admin.settings"))
 
@@ -1665,7 +1742,7 @@ def whatsapp_chat():
 def whatsapp_api_chats():
     """Return list of WhatsApp chats from WAHA, filtered to known contacts."""
     import re
-    from .whatsapp_utils import normalize_phone_number
+    from .whatsapp_utils import normalize_phone_number, remember_lid_phones
 
     # Build set of known phone numbers (volunteers + coaches) as bare digits
     known_phones = set()
@@ -1692,15 +1769,17 @@ def whatsapp_api_chats():
 
     try:
         waha_session = _get_waha_session()
-        r = http_requests.get(
-            f"{_get_waha_url()}/api/{waha_session}/chats",
-            headers=_get_waha_headers(),
-            timeout=15,
-        )
+        with track_http("waha"):
+            r = http_requests.get(
+                f"{_get_waha_url()}/api/{waha_session}/chats",
+                headers=_get_waha_headers(),
+                timeout=15,
+            )
         if r.status_code != 200:
             return jsonify([])
         raw = r.json()
         chats = []
+        lid_phones = {}
         for c in raw:
             chat_id = c.get("id", {}).get("_serialized", "")
             name = c.get("name", "")
@@ -1713,6 +1792,9 @@ def whatsapp_api_chats():
             if name_digits and name_digits in known_phones:
                 digits = name_digits
                 phone = f"+{digits}"
+                # Only number matches are trusted for webhook replies
+                if chat_id.endswith("@lid"):
+                    lid_phones[chat_id] = digits
             else:
                 # Fallback: match by contact name (e.g. "Mariusz Appel")
                 matched_digits = name_to_phone.get(name.strip().lower(), "")
@@ -1745,6 +1827,10 @@ def whatsapp_api_chats():
                 "unreadCount": c.get("unreadCount", 0),
                 "lastMessage": last_msg[:80],
             })
+        # Prefill the @lid cache so the webhook never has to look these up.
+        # Name matches are shown in the list but never stored: two contacts
+        # with the same name would route replies to the wrong person.
+        remember_lid_phones(lid_phones)
         # Sort by timestamp desc
         chats.sort(key=lambda x: x["timestamp"], reverse=True)
         return jsonify(chats)
@@ -1760,11 +1846,12 @@ def whatsapp_api_messages(chat_id):
     try:
         waha_session = _get_waha_session()
         limit = flask_request.args.get("limit", 50, type=int)
-        r = http_requests.get(
-            f"{_get_waha_url()}/api/{waha_session}/chats/{chat_id}/messages?limit={limit}",
-            headers=_get_waha_headers(),
-            timeout=15,
-        )
+        with track_http("waha"):
+            r = http_requests.get(
+                f"{_get_waha_url()}/api/{waha_session}/chats/{chat_id}/messages?limit={limit}",
+                headers=_get_waha_headers(),
+                timeout=15,
+            )
         if r.status_code != 200:
             return jsonify([])
         raw = r.json()
@@ -1803,12 +1890,13 @@ def whatsapp_api_send():
             "text": message,
             "session": waha_session,
         }
-        r = http_requests.post(
-            f"{_get_waha_url()}/api/sendText",
-            json=payload,
-            headers=_get_waha_headers(),
-            timeout=30,
-        )
+        with track_http("waha"):
+            r = http_requests.post(
+                f"{_get_waha_url()}/api/sendText",
+                json=payload,
+                headers=_get_waha_headers(),
+                timeout=30,
+            )
         if r.status_code in (200, 201):
             return jsonify({"ok": True})
         else:
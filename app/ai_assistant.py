@@ -4,15 +4,25 @@ Uses the free tier of Gemini 2.5 Flash to handle conversational messages
 that don't match structured commands (POTWIERDZAM / REZYGNUJĘ).
 """
 
-import json
+import hashlib
 import os
-from datetime import datetime, timezone, timedelta
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
 from typing import Optional
 
 import requests
 from flask import current_app
+from requests.adapters import HTTPAdapter
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
 
-from .models import Volunteer, Booking, Training, Coach, db
+from .instrumentation import track_http
+from .metrics import GEMINI_CALLS
+from .models import Volunteer, Booking, Training, Coach, Location, db
 
 
 # System prompt that defines the assistant's personality and knowledge
@@ -41,11 +51,214 @@ ZASADY:
 """
 
 
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+
+# Overall deadline (seconds) for one Gemini call; GEMINI_TIMEOUT overrides
+DEFAULT_TIMEOUT_SECONDS = 6.0
+# Default breaker settings; GEMINI_BREAKER_THRESHOLD / GEMINI_BREAKER_RESET override
+DEFAULT_BREAKER_THRESHOLD = 3
+DEFAULT_BREAKER_RESET_SECONDS = 60.0
+
+# Pooled HTTP session so webhook threads reuse TLS connections to Gemini
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+# requests' timeouts apply per socket read, so a trickling reply could run far
+# past the budget; calls run here and the caller stops waiting at the deadline
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini")
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream errors.
+
+    ``closed``: calls pass through. After ``threshold`` consecutive failures
+    the breaker is ``open`` and calls are rejected until ``reset_after``
+    seconds pass; then it is ``half-open`` and lets a single probe through.
+    A successful probe closes the breaker, a failed one re-opens it.
+    """
+
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Return ``True`` when a call may be attempted now."""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def reset(self) -> None:
+        self.record_success()
+
+
+_breaker = CircuitBreaker(DEFAULT_BREAKER_THRESHOLD, DEFAULT_BREAKER_RESET_SECONDS)
+
+
+def _configure_breaker() -> CircuitBreaker:
+    """Apply breaker settings from the app config and return the breaker."""
+    _breaker.threshold = int(
+        current_app.config.get("GEMINI_BREAKER_THRESHOLD", DEFAULT_BREAKER_THRESHOLD)
+    )
+    _breaker.reset_after = float(
+        current_app.config.get("GEMINI_BREAKER_RESET", DEFAULT_BREAKER_RESET_SECONDS)
+    )
+    return _breaker
+
+
+# Default bounds for the answer cache (overridable via GEMINI_CACHE_TTL /
+# GEMINI_CACHE_SIZE)
+DEFAULT_CACHE_TTL_SECONDS = 600
+DEFAULT_CACHE_MAX_ENTRIES = 256
+
+# cache key -> (expires_at, reply); most recently used entries at the end
+_response_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _normalize_question(message: str) -> str:
+    """Lower-case *message* and drop punctuation/extra whitespace."""
+    text = re.sub(r"[^\w\s]", " ", message.lower())
+    return " ".join(text.split())
+
+
+def _cache_key(message: str, context: str, model: str) -> str:
+    """Return the cache key for *message* asked with *context*."""
+    context_hash = hashlib.sha256(f"{model}\n{context}".encode()).hexdigest()
+    return f"{context_hash}:{_normalize_question(message)}"
+
+
+def _cache_get(key: str) -> Optional[str]:
+    """Return a cached reply for *key* unless it has expired."""
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _response_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, reply = entry
+        if expires_at <= now:
+            del _response_cache[key]
+            return None
+        _response_cache.move_to_end(key)
+        return reply
+
+
+def _cache_put(key: str, reply: str, ttl: float, max_entries: int) -> None:
+    """Store *reply*, evicting least recently used entries over the limit."""
+    if ttl <= 0 or max_entries <= 0:
+        return
+    with _cache_lock:
+        _response_cache[key] = (time.monotonic() + ttl, reply)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > max_entries:
+            _response_cache.popitem(last=False)
+
+
+def clear_response_cache() -> None:
+    """Drop all cached Gemini replies."""
+    with _cache_lock:
+        _response_cache.clear()
+
+
+# Per-person prompt context, rebuilt at most every CONTEXT_CACHE_TTL_SECONDS
+# and dropped whenever a booking or training changes
+CONTEXT_CACHE_TTL_SECONDS = 60
+_context_cache: dict[tuple[str, int], tuple[float, str]] = {}
+_context_lock = threading.Lock()
+
+
+def clear_context_cache() -> None:
+    """Drop all cached volunteer/coach contexts."""
+    with _context_lock:
+        _context_cache.clear()
+
+
+def _cached_context(kind: str, person_id: int, build) -> str:
+    key = (kind, person_id)
+    now = time.monotonic()
+    with _context_lock:
+        entry = _context_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+    context = build()
+    with _context_lock:
+        _context_cache[key] = (now + CONTEXT_CACHE_TTL_SECONDS, context)
+    return context
+
+
+@event.listens_for(Booking, "after_insert")
+@event.listens_for(Booking, "after_update")
+@event.listens_for(Booking, "after_delete")
+@event.listens_for(Training, "after_insert")
+@event.listens_for(Training, "after_update")
+@event.listens_for(Training, "after_delete")
+def _invalidate_context_on_change(mapper, connection, target):
+    clear_context_cache()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_context_on_bulk_change(orm_execute_state):
+    # Query.delete()/update() bypass the mapper events above
+    if orm_execute_state.is_delete or orm_execute_state.is_update:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (Booking, Training):
+            clear_context_cache()
+
+
 def _get_volunteer_context(volunteer: Volunteer) -> str:
     """Build context about volunteer's upcoming trainings."""
+    return _cached_context(
+        "volunteer", volunteer.id, lambda: _build_volunteer_context(volunteer)
+    )
+
+
+def _build_volunteer_context(volunteer: Volunteer) -> str:
     now = datetime.now(timezone.utc)
     upcoming = (
-        Booking.query.join(Training)
+        db.session.query(
+            Training.date,
+            Location.name,
+            Coach.first_name,
+            Coach.last_name,
+            Coach.phone_number,
+            Booking.is_confirmed,
+        )
+        .select_from(Booking)
+        .join(Training, Booking.training_id == Training.id)
+        .join(Location, Training.location_id == Location.id)
+        .join(Coach, Training.coach_id == Coach.id)
         .filter(
             Booking.volunteer_id == volunteer.id,
             Training.date >= now,
@@ -62,15 +275,13 @@ def _get_volunteer_context(volunteer: Volunteer) -> str:
 
     lines = [f"Wolontariusz: {volunteer.first_name} {volunteer.last_name}"]
     lines.append("Nadchodzące treningi:")
-    for b in upcoming:
-        t = b.training
-        status = "potwierdzony" if b.is_confirmed is True else (
-            "odwołany" if b.is_confirmed is False else "oczekuje potwierdzenia"
+    for date, location_name, coach_first, coach_last, coach_phone, is_confirmed in upcoming:
+        status = "potwierdzony" if is_confirmed is True else (
+            "odwołany" if is_confirmed is False else "oczekuje potwierdzenia"
         )
-        coach_phone = t.coach.phone_number or "brak"
         lines.append(
-            f"- {t.date.strftime('%Y-%m-%d %H:%M')} w {t.location.name}, "
-            f"trener: {t.coach.first_name} {t.coach.last_name} (tel: {coach_phone}), "
+            f"- {date.strftime('%Y-%m-%d %H:%M')} w {location_name}, "
+            f"trener: {coach_first} {coach_last} (tel: {coach_phone or 'brak'}), "
             f"status: {status}"
         )
     return "\n".join(lines)
@@ -78,14 +289,27 @@ def _get_volunteer_context(volunteer: Volunteer) -> str:
 
 def _get_coach_context(coach: Coach) -> str:
     """Build context about coach's upcoming trainings."""
+    return _cached_context("coach", coach.id, lambda: _build_coach_context(coach))
+
+
+def _build_coach_context(coach: Coach) -> str:
     now = datetime.now(timezone.utc)
     upcoming = (
-        Training.query.filter(
+        db.session.query(
+            Training.date,
+            Location.name,
+            Training.max_volunteers,
+            func.count(Booking.id),
+        )
+        .join(Location, Training.location_id == Location.id)
+        .outerjoin(Booking, Booking.training_id == Training.id)
+        .filter(
             Training.coach_id == coach.id,
             Training.date >= now,
             Training.is_canceled.is_(False),
             Training.is_deleted.is_(False),
         )
+        .group_by(Training.id, Location.name)
         .order_by(Training.date)
         .limit(5)
         .all()
@@ -96,11 +320,10 @@ def _get_coach_context(coach: Coach) -> str:
 
     lines = [f"Trener: {coach.first_name} {coach.last_name}"]
     lines.append("Nadchodzące treningi:")
-    for training in upcoming:
-        volunteer_count = Booking.query.filter_by(training_id=training.id).count()
+    for date, location_name, max_volunteers, volunteer_count in upcoming:
         lines.append(
-            f"- {training.date.strftime('%Y-%m-%d %H:%M')} w {training.location.name}, "
-            f"zapisanych wolontariuszy: {volunteer_count}/{training.max_volunteers}"
+            f"- {date.strftime('%Y-%m-%d %H:%M')} w {location_name}, "
+            f"zapisanych wolontariuszy: {volunteer_count}/{max_volunteers}"
         )
     return "\n".join(lines)
 
@@ -142,11 +365,25 @@ def ask_gemini(
             context = f"Trener: {coach.first_name} {coach.last_name}"
         sender_label = "trenera"
 
+    cache_key = _cache_key(message, f"{sender_label}\n{context}", model)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        current_app.logger.info("Gemini reply served from cache")
+        GEMINI_CALLS.labels("cached").inc()
+        return cached
+
     user_content = message
     if context:
         user_content = f"[Kontekst: {context}]\n\nWiadomość od {sender_label}: {message}"
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+    breaker = _configure_breaker()
+    if not breaker.allow():
+        current_app.logger.warning("Gemini circuit open; skipping API call")
+        GEMINI_CALLS.labels("circuit_open").inc()
+        return None
+
+    url = GEMINI_API_URL.format(model=model)
+    budget = float(current_app.config.get("GEMINI_TIMEOUT", DEFAULT_TIMEOUT_SECONDS))
 
     payload = {
         "system_instruction": {
@@ -172,37 +409,72 @@ def ask_gemini(
 
     try:
         current_app.logger.info("Calling Gemini API for message: %s", message[:50])
-        resp = requests.post(
-            url,
-            params={"key": api_key},
-            json=payload,
-            timeout=15,
-        )
+        with track_http("gemini"):
+            future = _pool.submit(
+                _http.post,
+                url,
+                params={"key": api_key},
+                json=payload,
+                timeout=(min(budget, 3.05), budget),
+            )
+            try:
+                resp = future.result(timeout=budget)
+            except FutureTimeout:
+                # The worker gives up on its own read timeout; nobody waits for it
+                future.cancel()
+                raise requests.Timeout(
+                    f"no Gemini reply within {budget:.1f}s"
+                ) from None
 
         if resp.status_code != 200:
             current_app.logger.error("Gemini API error: %s %s", resp.status_code, resp.text[:200])
+            if resp.status_code == 429 or resp.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            GEMINI_CALLS.labels("error").inc()
             return None
 
+        breaker.record_success()
+
         data = resp.json()
         candidates = data.get("candidates", [])
         if not candidates:
             current_app.logger.warning("Gemini returned no candidates")
+            GEMINI_CALLS.labels("empty").inc()
             return None
 
         parts = candidates[0].get("content", {}).get("parts", [])
-        if not parts:
-            return None
-
-        text = parts[0].get("text", "").strip()
+        text = parts[0].get("text", "").strip() if parts else ""
         if not text:
+            GEMINI_CALLS.labels("empty").inc()
             return None
 
         current_app.logger.info("Gemini response: %s", text[:100])
+        GEMINI_CALLS.labels("ok").inc()
+        _cache_put(
+            cache_key,
+            text,
+            ttl=current_app.config.get("GEMINI_CACHE_TTL", DEFAULT_CACHE_TTL_SECONDS),
+            max_entries=current_app.config.get(
+                "GEMINI_CACHE_SIZE", DEFAULT_CACHE_MAX_ENTRIES
+            ),
+        )
         return text
 
     except requests.RequestException as exc:
-        current_app.logger.exception("Gemini API request failed: %s", exc)
+        breaker.record_failure()
+        current_app.logger.warning("Gemini API request failed: %s", exc)
+        GEMINI_CALLS.labels("error").inc()
         return None
     except (KeyError, IndexError, ValueError) as exc:
         current_app.logger.exception("Failed to parse Gemini response: %s", exc)
+        GEMINI_CALLS.labels("error").inc()
+        return None
+    except Exception:
+        # Anything else must still settle a half-open probe, or the breaker
+        # would reject every call until the process restarts
+        breaker.record_failure()
+        current_app.logger.exception("Unexpected error in Gemini call")
+        GEMINI_CALLS.labels("error").inc()
         return None
@@ -0,0 +1,153 @@
+"""Registration email attachments stored on disk.
+
+Attachments live in ``instance/attachments`` and are referenced from
+``EmailSettings.registration_files_*`` by metadata dicts (``stored_name``,
+``original_name``, ``content_type``). Older installations referenced
+:class:`~app.models.StoredFile` rows by id instead; those are copied to
+disk on first use by the settings page or all at once by
+``flask migrate-stored-files``.
+
+Registration emails reuse base64-encoded MIME parts from an in-process LRU
+cache bounded by ``ATTACHMENT_CACHE_MAX_BYTES``. Files on disk are keyed by
+name, mtime and size, so a replaced file is never served stale, even by
+another worker; the settings page also clears the cache when files change.
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from email.message import MIMEPart
+from pathlib import Path
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from .email_utils import attachment_part
+
+_parts: OrderedDict[tuple, tuple[int, MIMEPart]] = OrderedDict()
+_parts_bytes = 0
+_parts_lock = threading.Lock()
+
+
+def attachments_dir() -> Path:
+    return Path(current_app.instance_path) / "attachments"
+
+
+def legacy_stored_name(stored_file) -> str:
+    """Return the on-disk name used for a legacy ``StoredFile`` row."""
+    safe_name = secure_filename(stored_file.filename or "") or f"file_{stored_file.id}"
+    return f"legacy_{stored_file.id}_{safe_name}"
+
+
+def legacy_file_meta(stored_file) -> dict:
+    return {
+        "stored_name": legacy_stored_name(stored_file),
+        "original_name": stored_file.filename,
+        "content_type": stored_file.content_type,
+    }
+
+
+def materialize_stored_file(stored_file, directory: Path) -> Path:
+    """Stream ``stored_file`` into ``directory`` unless it is already there.
+
+    The blob is copied chunk by chunk into a temporary file which is then
+    renamed, so a crash never leaves a truncated attachment behind. Raises
+    ``OSError`` when the file cannot be written.
+    """
+    target = directory / legacy_stored_name(stored_file)
+    if target.exists():
+        return target
+    fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in stored_file.iter_data():
+                handle.write(chunk)
+        os.replace(tmp_name, target)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return target
+
+
+def clear_attachment_cache() -> None:
+    """Drop all cached attachment parts."""
+    global _parts_bytes
+    with _parts_lock:
+        _parts.clear()
+        _parts_bytes = 0
+
+
+def _cached_part(key: tuple) -> MIMEPart | None:
+    with _parts_lock:
+        entry = _parts.get(key)
+        if entry is None:
+            return None
+        _parts.move_to_end(key)
+        return entry[1]
+
+
+def _cache_part(key: tuple, part: MIMEPart) -> None:
+    global _parts_bytes
+    size = len(part.get_payload())
+    limit = current_app.config.get("ATTACHMENT_CACHE_MAX_BYTES", 0)
+    if size > limit:
+        return
+    with _parts_lock:
+        previous = _parts.pop(key, None)
+        if previous is not None:
+            _parts_bytes -= previous[0]
+        _parts[key] = (size, part)
+        _parts_bytes += size
+        while _parts_bytes > limit:
+            _, (evicted, _) = _parts.popitem(last=False)
+            _parts_bytes -= evicted
+
+
+def registration_attachments(entries) -> list[MIMEPart]:
+    """Return MIME parts for the attachment ``entries`` of ``EmailSettings``.
+
+    Legacy ``StoredFile`` ids come first, then files from disk, as before the
+    cache existed. Missing files are logged and skipped.
+    """
+    from sqlalchemy.orm import undefer
+
+    from .models import StoredFile
+
+    legacy_ids = [entry for entry in entries if isinstance(entry, int)]
+    legacy = {file_id: _cached_part(("stored_file", file_id)) for file_id in legacy_ids}
+    missing_ids = [file_id for file_id, part in legacy.items() if part is None]
+    if missing_ids:
+        # Not yet migrated to disk: load the blobs in one query
+        for stored_file in StoredFile.query.options(undefer(StoredFile.data)).filter(
+            StoredFile.id.in_(missing_ids)
+        ):
+            part = attachment_part(
+                stored_file.filename, stored_file.content_type, stored_file.data
+            )
+            _cache_part(("stored_file", stored_file.id), part)
+            legacy[stored_file.id] = part
+    parts = [legacy[file_id] for file_id in legacy_ids if legacy[file_id] is not None]
+
+    directory = attachments_dir()
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("stored_name"):
+            continue
+        stored_name = entry["stored_name"]
+        file_path = directory / stored_name
+        filename = entry.get("original_name") or entry.get("filename") or stored_name
+        content_type = entry.get("content_type") or "application/octet-stream"
+        try:
+            stat = file_path.stat()
+            key = ("file", stored_name, stat.st_mtime_ns, stat.st_size, filename, content_type)
+            part = _cached_part(key)
+            if part is None:
+                part = attachment_part(filename, content_type, file_path.read_bytes())
+                _cache_part(key, part)
+        except OSError:
+            current_app.logger.warning(
+                "Attachment file %s referenced in settings is missing", file_path,
+            )
+            continue
+        parts.append(part)
+    return parts
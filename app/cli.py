@@ -16,7 +16,7 @@ from .whatsapp_utils import (
     whatsapp_test_recipient,
     get_test_phone,
 )
-from .email_utils import send_email
+from .email_utils import send_bulk_email, send_email
 from .template_utils import render_template_string
 
 
@@ -163,6 +163,10 @@ def _send_reminders_impl():
     click.echo(f"\nSummary: {sent_count} sent, {failed_count} failed, {skipped_count} skipped")
 
 
+# Volunteers mailed per SMTP connection and per commit
+PHONE_REQUEST_BATCH_SIZE = 50
+
+
 @click.command('send-phone-requests')
 @click.option('--base-url', default='https://treningi.widzimyinaczej.org.pl', 
               help='Base URL for the application')
@@ -173,16 +177,17 @@ def send_phone_requests_command(base_url):
     Each volunteer receives this email only once (tracked by phone_request_sent flag).
     """
     # Znajdź wolontariuszy bez telefonu, którzy nie dostali jeszcze maila
-    volunteers = Volunteer.query.filter(
+    pending = Volunteer.query.filter(
         (Volunteer.phone_number.is_(None)) | (Volunteer.phone_number == ''),
         (Volunteer.phone_request_sent.is_(None)) | (Volunteer.phone_request_sent.is_(False)),
-    ).all()
+    ).order_by(Volunteer.id)
+    total = pending.count()
 
-    if not volunteers:
+    if not total:
         click.echo("No volunteers without phone numbers need to be contacted.")
         return
 
-    click.echo(f"Found {len(volunteers)} volunteers without phone numbers to contact.")
+    click.echo(f"Found {total} volunteers without phone numbers to contact.")
 
     # Pobierz szablon email
     setting = EmailSettings.query.first()
@@ -198,45 +203,52 @@ def send_phone_requests_command(base_url):
     # Logo URL
     logo_url = f"{base_url}/static/logo.png"
 
-    for volunteer in volunteers:
-        # Generuj unikalny token
-        token = secrets.token_urlsafe(32)
-        volunteer.phone_update_token = token
-        
-        # Przygotuj dane do szablonu
-        update_link = f"{base_url}/update-phone/{token}"
-        data = {
-            'first_name': volunteer.first_name,
-            'last_name': volunteer.last_name,
-            'email': volunteer.email,
-            'update_link': update_link,
-            'logo': logo_url,
-        }
-        
-        try:
-            html_body = render_template_string(template, data)
-            success, error = send_email(
-                "Dodaj numer telefonu - powiadomienia WhatsApp",
-                None,
-                [volunteer.email],
-                html_body=html_body,
-            )
-            
+    # Render each batch first and send it over one SMTP connection;
+    # committing per batch keeps an interrupted run from mailing anyone twice
+    last_id = 0
+    while volunteers := pending.filter(Volunteer.id > last_id).limit(PHONE_REQUEST_BATCH_SIZE).all():
+        last_id = volunteers[-1].id
+        batch = []
+        for volunteer in volunteers:
+            # Generuj unikalny token
+            token = secrets.token_urlsafe(32)
+
+            # Przygotuj dane do szablonu
+            update_link = f"{base_url}/update-phone/{token}"
+            data = {
+                'first_name': volunteer.first_name,
+                'last_name': volunteer.last_name,
+                'email': volunteer.email,
+                'update_link': update_link,
+                'logo': logo_url,
+            }
+            try:
+                html_body = render_template_string(template, data)
+            except Exception as e:
+                failed_count += 1
+                click.echo(f"✗ Error rendering email for {volunteer.email}: {str(e)}")
+                continue
+            batch.append((volunteer, token, html_body))
+
+        if not batch:
+            continue
+        results = send_bulk_email(
+            "Dodaj numer telefonu - powiadomienia WhatsApp",
+            [(volunteer.email, html_body) for volunteer, _token, html_body in batch],
+        )
+
+        for (volunteer, token, _html_body), (success, error) in zip(batch, results):
             if success:
                 # Oznacz że email został wysłany
+                volunteer.phone_update_token = token
                 volunteer.phone_request_sent = True
-                db.session.commit()
                 sent_count += 1
                 click.echo(f"✓ Email sent to {volunteer.first_name} {volunteer.last_name} ({volunteer.email})")
             else:
                 # W razie błędu, nie oznaczaj - spróbuj ponownie następnym razem
-                db.session.rollback()
                 failed_count += 1
                 click.echo(f"✗ Failed to send to {volunteer.email}: {error}")
-        except Exception as e:
-            db.session.rollback()
-            failed_count += 1
-            click.echo(f"✗ Error sending to {volunteer.email}: {str(e)}")
+        db.session.commit()
 
     click.echo(f"\nSummary: {sent_count} sent, {failed_count} failed")
 
@@ -425,7 +437,9 @@ def _send_coach_summary_impl(hours_before, window_minutes):
         message_lines.append("🎾 *Fundacja Widzimy Inaczej*\n_System zapisów Blind Tenis_")
         message = "\n".join(message_lines)
 
-        success, error = send_whatsapp_message(coach.phone_number, message)
+        success, error = send_whatsapp_message(
+            coach.phone_number, message, template="coach_summary"
+        )
         coach_name = f"{coach.first_name} {coach.last_name}"
 
         if success:
@@ -812,9 +826,79 @@ def _send_coordinator_summary(coordinator_email, coaches, month, year, month_nam
         click.echo(f"BŁĄD [Koordynator]: {error}")
 
 
+@click.command('migrate-stored-files')
+@click.option(
+    '--delete-rows',
+    is_flag=True,
+    default=False,
+    help='Delete the migrated rows from the stored_files table.',
+)
+@with_appcontext
+def migrate_stored_files_command(delete_rows):
+    """Copy legacy attachments from the database to instance/attachments (one-shot)."""
+    from sqlalchemy import inspect
+    from .attachments import attachments_dir, legacy_file_meta, materialize_stored_file
+    from .models import StoredFile
+
+    if not inspect(db.engine).has_table(StoredFile.__tablename__):
+        click.echo("Brak tabeli stored_files — nie ma czego migrować.")
+        return
+    settings = EmailSettings.query.first()
+    if not settings:
+        click.echo("Brak ustawień e-mail — nie ma czego migrować.")
+        return
+
+    directory = attachments_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    migrated = {}
+    missing = 0
+    for field in ('registration_files_adult', 'registration_files_minor'):
+        entries = []
+        for entry in getattr(settings, field) or []:
+            if not isinstance(entry, int):
+                entries.append(entry)
+                continue
+            stored_file = db.session.get(StoredFile, entry)
+            if stored_file is None:
+                click.echo(f"Pominięto: plik o id {entry} nie istnieje w bazie")
+                missing += 1
+                continue
+            path = materialize_stored_file(stored_file, directory)
+            migrated[entry] = stored_file
+            entries.append(legacy_file_meta(stored_file))
+            click.echo(f"OK {stored_file.filename} → {path.name}")
+        # A new list, so the JSON column is flagged as modified
+        setattr(settings, field, entries)
+    db.session.commit()
+
+    if delete_rows and migrated:
+        StoredFile.query.filter(StoredFile.id.in_(migrated)).delete(synchronize_session=False)
+        db.session.commit()
+    remaining = StoredFile.query.count()
+    click.echo(
+        f"\nPrzeniesiono: {len(migrated)}, brakujących: {missing}, "
+        f"pozostało w bazie: {remaining}"
+    )
+
+
+@click.command('send-pending-notifications')
+@with_appcontext
+def send_pending_notifications_command():
+    """Finish notification jobs whose background worker stopped (e.g. restart)."""
+    from .notifications import resume_stale_jobs
+
+    job_ids = resume_stale_jobs()
+    if job_ids:
+        click.echo(f"Dokończono zadania powiadomień: {', '.join(map(str, job_ids))}")
+    else:
+        click.echo("Brak przerwanych zadań powiadomień.")
+
+
 def init_app(app):
     """Register CLI commands with the app."""
     app.cli.add_command(send_reminders_command)
     app.cli.add_command(send_phone_requests_command)
     app.cli.add_command(send_coach_summary_command)
     app.cli.add_command(send_monthly_summary_command)
+    app.cli.add_command(migrate_stored_files_command)
+    app.cli.add_command(send_pending_notifications_command)
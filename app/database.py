@@ -0,0 +1,162 @@
+"""Engine setup per database backend.
+
+PostgreSQL is used through psycopg 3 with a per-process connection pool
+sized so that all gunicorn workers together stay within
+``DB_MAX_CONNECTIONS``; pre-ping and recycling drop connections the server
+or a proxy closed in the meantime.
+
+For SQLite every new DB-API connection gets a production profile built
+from the ``SQLITE_*`` settings: WAL journaling, so readers keep reading
+while a writer commits (web threads and the scheduler share one file),
+``synchronous=NORMAL`` (safe with WAL; only a power loss can drop the last
+commits), a busy timeout instead of an immediate "database is locked", a
+bigger page cache, memory-mapped reads and in-memory temp tables.
+
+On both backends the training capacity rule (``max_volunteers``) is
+enforced by a ``booking_limit`` trigger on ``bookings``, created with the
+table and by migration ``j0k1l2m3n4o5``.
+"""
+
+from sqlalchemy import event
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORE = {"DEFAULT", "FILE", "MEMORY"}
+
+
+def normalize_database_url(url: str) -> str:
+    """Select the psycopg (v3) driver for plain ``postgres[ql]://`` URLs."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def engine_options(config) -> dict:
+    """Return ``SQLALCHEMY_ENGINE_OPTIONS`` for the configured database."""
+    if not config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+        return {}
+    # One pooled connection per request thread plus one for timers/commands
+    pool_size = config["DB_POOL_SIZE"] or config["WEB_THREADS"] + 1
+    per_worker = config["DB_MAX_CONNECTIONS"] // max(config["WEB_CONCURRENCY"], 1)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max(per_worker - pool_size, 0),
+        "pool_pre_ping": True,
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+    }
+
+
+# Keep in sync with migration j0k1l2m3n4o5
+BOOKING_LIMIT_DDL = {
+    "sqlite": [
+        """
+        CREATE TRIGGER booking_limit_insert BEFORE INSERT ON bookings
+        WHEN (SELECT COUNT(*) FROM bookings WHERE training_id = NEW.training_id)
+             >= (SELECT max_volunteers FROM trainings WHERE id = NEW.training_id)
+        BEGIN
+            SELECT RAISE(ABORT, 'booking_limit: training is full');
+        END
+        """,
+        """
+        CREATE TRIGGER booking_limit_update BEFORE UPDATE OF training_id ON bookings
+        WHEN NEW.training_id IS NOT OLD.training_id
+             AND (SELECT COUNT(*) FROM bookings WHERE training_id = NEW.training_id)
+             >= (SELECT max_volunteers FROM trainings WHERE id = NEW.training_id)
+        BEGIN
+            SELECT RAISE(ABORT, 'booking_limit: training is full');
+        END
+        """,
+    ],
+    "postgresql": [
+        """
+        CREATE OR REPLACE FUNCTION enforce_booking_limit() RETURNS trigger AS $$
+        DECLARE
+            capacity integer;
+            taken integer;
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.training_id = OLD.training_id THEN
+                RETURN NEW;
+            END IF;
+            -- Lock the training so concurrent sign-ups are counted in turn
+            SELECT max_volunteers INTO capacity
+              FROM trainings WHERE id = NEW.training_id FOR UPDATE;
+            SELECT COUNT(*) INTO taken FROM bookings WHERE training_id = NEW.training_id;
+            IF taken >= capacity THEN
+                RAISE EXCEPTION USING
+                    MESSAGE = 'booking_limit: training ' || NEW.training_id || ' is full',
+                    ERRCODE = 'check_violation';
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER booking_limit BEFORE INSERT OR UPDATE OF training_id ON bookings
+        FOR EACH ROW EXECUTE FUNCTION enforce_booking_limit()
+        """,
+    ],
+}
+
+
+def create_booking_limit_trigger(target, connection, **kw) -> None:
+    """``after_create`` hook of the bookings table."""
+    for statement in BOOKING_LIMIT_DDL.get(connection.dialect.name, ()):
+        connection.exec_driver_sql(statement)
+
+
+def booking_conflict(exc) -> str | None:
+    """Classify an ``IntegrityError`` raised while saving a booking.
+
+    Returns ``"limit"`` for the ``booking_limit`` trigger, ``"duplicate"``
+    for the ``unique_booking`` constraint (the volunteer is already booked)
+    and ``None`` for anything else.
+    """
+    orig = getattr(exc, "orig", exc)
+    message = str(orig)
+    if "booking_limit:" in message:
+        return "limit"
+    diag = getattr(orig, "diag", None)
+    if (
+        getattr(diag, "constraint_name", None) == "unique_booking"
+        or "bookings.training_id, bookings.volunteer_id" in message
+    ):
+        return "duplicate"
+    return None
+
+
+def _choice(config, key: str, allowed: set[str]) -> str:
+    value = str(config[key]).upper()
+    if value not in allowed:
+        raise ValueError(f"{key} must be one of {', '.join(sorted(allowed))}, not {value!r}")
+    return value
+
+
+def sqlite_pragmas(config) -> list[tuple[str, object]]:
+    """Return the ``(pragma, value)`` pairs configured for SQLite connections."""
+    return [
+        ("journal_mode", _choice(config, "SQLITE_JOURNAL_MODE", _JOURNAL_MODES)),
+        ("synchronous", _choice(config, "SQLITE_SYNCHRONOUS", _SYNCHRONOUS)),
+        ("busy_timeout", int(config["SQLITE_BUSY_TIMEOUT_MS"])),
+        # Negative cache_size is in KiB rather than pages
+        ("cache_size", -int(config["SQLITE_CACHE_SIZE_KB"])),
+        ("mmap_size", int(config["SQLITE_MMAP_SIZE"])),
+        ("temp_store", _choice(config, "SQLITE_TEMP_STORE", _TEMP_STORE)),
+    ]
+
+
+def configure_engine(app, engine) -> None:
+    """Install the connection profile matching ``engine``'s dialect."""
+    if engine.dialect.name != "sqlite" or not app.config.get("SQLITE_PROFILE"):
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
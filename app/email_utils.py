@@ -1,18 +1,47 @@
 from flask import current_app
 from .models import EmailSettings
 from . import db
-import smtplib
-from email.message import EmailMessage
+from .instrumentation import track_http
+from .metrics import EMAILS
 import re
-from collections.abc import Iterable
+import secrets
+import smtplib
+from email.message import EmailMessage, MIMEPart
+from email.policy import SMTP
+from email.utils import getaddresses
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import NamedTuple
 
+Attachment = tuple[str, str, bytes] | MIMEPart
 
-def send_email(
-    subject: str,
-    body: str | None,
-    recipients: list[str],
-    *,
-    html_body: str | None = None,
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def attachment_part(filename: str, content_type: str, data: bytes) -> MIMEPart:
+    """Return a base64-encoded attachment part.
+
+    The part can be attached to any number of messages (see
+    ``send_email``), so the encoding is done once per file.
+    """
+    maintype, subtype = (content_type.split("/", 1) + [""])[:2]
+    if not subtype:
+        maintype, subtype = "application", "octet-stream"
+    part = MIMEPart()
+    part.set_content(data, maintype=maintype, subtype=subtype, filename=filename)
+    return part
+
+
+class _SmtpConfig(NamedTuple):
+    host: str | None
+    port: int
+    username: str | None
+    password: str | None
+    sender_header: str
+    encryption: str
+
+
+def _smtp_config(
     host: str | None = None,
     port: int | None = None,
     username: str | None = None,
@@ -20,13 +49,8 @@ def send_email(
     sender: str | None = None,
     encryption: str | None = None,
     use_tls: bool | None = None,
-    attachments: Iterable[tuple[str, str, bytes]] | None = None,
-) -> tuple[bool, str | None]:
-    """Send an email using stored SMTP settings.
-
-    Returns a tuple ``(success, error)`` where ``success`` is ``True`` when the
-    message was sent and ``error`` contains the exception message on failure.
-    """
+) -> _SmtpConfig:
+    """Resolve connection settings: arguments, then stored settings, then config."""
     settings = db.session.get(EmailSettings, 1)
     host = host or (
         settings.server
@@ -68,62 +92,243 @@ def send_email(
         else:
             encryption = "tls" if current_app.config.get("SMTP_USE_TLS", True) else "none"
 
-    if not host:
-        current_app.logger.warning("SMTP_HOST not configured; skipping email")
-        return True, None
-
     if display_name and ("@" in display_name or "<" in display_name):
         sender_header = display_name
     elif address:
         sender_header = f"{display_name} <{address}>" if display_name else address
     else:
         sender_header = display_name or ""
+    return _SmtpConfig(host, port, username, password, sender_header, encryption)
 
-    current_app.logger.info(
-        "Sending email via %s:%s from %s to %s",
-        host,
-        port,
-        sender_header,
-        ", ".join(recipients),
-    )
-    if username:
-        current_app.logger.debug("SMTP login: %s", username)
 
+@contextmanager
+def _smtp_connection(config: _SmtpConfig) -> Iterator[smtplib.SMTP]:
+    smtp_cls = smtplib.SMTP_SSL if config.encryption == "ssl" else smtplib.SMTP
+    with track_http("smtp"), smtp_cls(config.host, config.port) as smtp:
+        if config.encryption == "tls":
+            smtp.starttls()
+        if config.username and config.password:
+            smtp.login(config.username, config.password)
+        yield smtp
+
+
+def _html_to_text(html_body: str) -> str:
+    return _TAG_RE.sub("", html_body)
+
+
+def _build_message(
+    subject: str,
+    sender_header: str,
+    recipients: list[str],
+    body: str | None,
+    html_body: str | None,
+    parts: Iterable[MIMEPart] = (),
+) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = subject
     msg["From"] = sender_header
     msg["To"] = ", ".join(recipients)
 
     if not body and html_body:
-        body = re.sub(r"<[^>]+>", "", html_body)
+        body = _html_to_text(html_body)
 
     msg.set_content(body or "")
 
     if html_body:
         msg.add_alternative(html_body, subtype="html")
 
-    if attachments:
-        for filename, content_type, data in attachments:
-            maintype, subtype = (content_type.split("/", 1) + [""])[:2]
-            if not subtype:
-                maintype, subtype = "application", "octet-stream"
-            msg.add_attachment(
-                data,
-                maintype=maintype,
-                subtype=subtype,
-                filename=filename,
-            )
+    for part in parts:
+        if msg.get_content_type() != "multipart/mixed":
+            msg.make_mixed()
+        msg.attach(part)
+    return msg
+
+
+def _attachment_parts(attachments: Iterable[Attachment] | None) -> list[MIMEPart]:
+    return [
+        attachment if isinstance(attachment, MIMEPart) else attachment_part(*attachment)
+        for attachment in attachments or ()
+    ]
+
+
+def send_email(
+    subject: str,
+    body: str | None,
+    recipients: list[str],
+    *,
+    html_body: str | None = None,
+    host: str | None = None,
+    port: int | None = None,
+    username: str | None = None,
+    password: str | None = None,
+    sender: str | None = None,
+    encryption: str | None = None,
+    use_tls: bool | None = None,
+    attachments: Iterable[Attachment] | None = None,
+) -> tuple[bool, str | None]:
+    """Send an email using stored SMTP settings.
+
+    ``attachments`` holds ``(filename, content_type, data)`` tuples or parts
+    built by :func:`attachment_part`.
+
+    Returns a tuple ``(success, error)`` where ``success`` is ``True`` when the
+    message was sent and ``error`` contains the exception message on failure.
+    """
+    config = _smtp_config(host, port, username, password, sender, encryption, use_tls)
+
+    if not config.host:
+        current_app.logger.warning("SMTP_HOST not configured; skipping email")
+        EMAILS.labels("skipped").inc()
+        return True, None
+
+    current_app.logger.info(
+        "Sending email via %s:%s from %s to %s",
+        config.host,
+        config.port,
+        config.sender_header,
+        ", ".join(recipients),
+    )
+    if config.username:
+        current_app.logger.debug("SMTP login: %s", config.username)
+
+    msg = _build_message(
+        subject,
+        config.sender_header,
+        recipients,
+        body,
+        html_body,
+        _attachment_parts(attachments),
+    )
 
     try:
-        smtp_cls = smtplib.SMTP_SSL if encryption == "ssl" else smtplib.SMTP
-        with smtp_cls(host, port) as smtp:
-            if encryption == "tls":
-                smtp.starttls()
-            if username and password:
-                smtp.login(username, password)
+        with _smtp_connection(config) as smtp:
             smtp.send_message(msg)
         current_app.logger.info("Email sent successfully")
+        EMAILS.labels("sent").inc()
         return True, None
     except (smtplib.SMTPException, OSError) as exc:
         current_app.logger.exception("Email sending failed")
+        EMAILS.labels("failed").inc()
         return False, str(exc)
+
+
+class _BulkSkeleton:
+    """Wire format of a mailing whose messages differ only in ``To`` and body.
+
+    The shared attachments are serialized once; each message then only
+    serializes its headers and its text/HTML body around them.
+    """
+
+    def __init__(self, subject: str, sender_header: str, parts: list[MIMEPart]):
+        self.subject = subject
+        self.sender_header = sender_header
+        addresses = getaddresses([sender_header])
+        self.from_addr = addresses[0][1] if addresses else ""
+        self.boundary = "=" * 15 + secrets.token_hex(16)
+        self.has_parts = bool(parts)
+        self.head = b"".join(
+            _fold_header(name, value)
+            for name, value in (
+                ("Subject", subject),
+                ("From", sender_header),
+                ("MIME-Version", "1.0"),
+                ("Content-Type", f'multipart/mixed; boundary="{self.boundary}"'),
+            )
+        )
+        self.tail = b"".join(
+            b"--%s\r\n%s\r\n" % (self.boundary.encode(), part.as_bytes(policy=SMTP))
+            for part in parts
+        ) + b"--%s--\r\n" % self.boundary.encode()
+
+    def render(self, recipient: str, text: str, html_body: str | None) -> bytes:
+        if not self.has_parts:
+            msg = _build_message(self.subject, self.sender_header, [recipient], text, html_body)
+            return msg.as_bytes(policy=SMTP)
+        body = MIMEPart()
+        body.set_content(text)
+        if html_body:
+            body.add_alternative(html_body, subtype="html")
+        return b"%s%s\r\n--%s\r\n%s\r\n%s" % (
+            self.head,
+            _fold_header("To", recipient),
+            self.boundary.encode(),
+            body.as_bytes(policy=SMTP),
+            self.tail,
+        )
+
+
+def _fold_header(name: str, value: str) -> bytes:
+    return SMTP.fold_binary(*SMTP.header_store_parse(name, value))
+
+
+def send_bulk_email(
+    subject: str,
+    messages: Iterable[tuple[str, str]],
+    *,
+    attachments: Iterable[Attachment] | None = None,
+    **smtp_options,
+) -> list[tuple[bool, str | None]]:
+    """Send ``(recipient, html_body)`` messages, each to its own recipient.
+
+    Settings and the serialized attachments are prepared once, so each
+    message only adds its headers and body (see ``_BulkSkeleton``), and all
+    messages go through one SMTP connection (reopened once if the server
+    drops it). Identical bodies share their plain-text version.
+    ``smtp_options`` are the connection overrides of :func:`send_email`.
+
+    Returns one ``(success, error)`` tuple per message, in order.
+    """
+    messages = list(messages)
+    config = _smtp_config(**smtp_options)
+    if not config.host:
+        current_app.logger.warning("SMTP_HOST not configured; skipping %d emails", len(messages))
+        EMAILS.labels("skipped").inc(len(messages))
+        return [(True, None)] * len(messages)
+
+    current_app.logger.info(
+        "Sending %d emails via %s:%s from %s",
+        len(messages),
+        config.host,
+        config.port,
+        config.sender_header,
+    )
+    skeleton = _BulkSkeleton(subject, config.sender_header, _attachment_parts(attachments))
+    texts: dict[str, str] = {}
+    results: list[tuple[bool, str | None]] = []
+    reconnected = False
+
+    while len(results) < len(messages):
+        try:
+            with _smtp_connection(config) as smtp:
+                for recipient, html_body in messages[len(results):]:
+                    text = texts.get(html_body)
+                    if text is None:
+                        text = texts[html_body] = _html_to_text(html_body)
+                    data = skeleton.render(recipient, text, html_body)
+                    try:
+                        smtp.sendmail(skeleton.from_addr, [recipient], data)
+                    except smtplib.SMTPServerDisconnected:
+                        raise
+                    except smtplib.SMTPException as exc:
+                        # Refused recipient or data; the connection is still usable
+                        current_app.logger.warning("Email to %s failed: %s", recipient, exc)
+                        EMAILS.labels("failed").inc()
+                        results.append((False, str(exc)))
+                        continue
+                    EMAILS.labels("sent").inc()
+                    results.append((True, None))
+        except (smtplib.SMTPException, OSError) as exc:
+            if isinstance(exc, smtplib.SMTPServerDisconnected) and not reconnected:
+                reconnected = True
+                continue
+            current_app.logger.exception("Bulk email sending failed")
+            failed = len(messages) - len(results)
+            EMAILS.labels("failed").inc(failed)
+            results.extend([(False, str(exc))] * failed)
+
+    current_app.logger.info(
+        "Bulk email done: %d sent, %d failed",
+        sum(ok for ok, _ in results),
+        sum(not ok for ok, _ in results),
+    )
+    return results
@@ -1,4 +1,3 @@
-from datetime import timedelta
 import re
 import html
 
@@ -28,6 +27,13 @@ from wtforms import IntegerField
 from wtforms.fields import DateField
 from wtforms import SelectMultipleField, widgets
 
+from .recurrence import (
+    MAX_HORIZON_DAYS,
+    WEEKDAY_CHOICES,
+    expand_weekly,
+    parse_date_list,
+)
+
 
 def sanitize_input(text: str) -> str:
     """Sanitize user input to prevent XSS and injection attacks."""
@@ -143,6 +149,22 @@ class TrainingForm(FlaskForm):
         validators=[Optional()],
         render_kw={"placeholder": "rrrr-mm-dd"},
     )
+    repeat_weekdays = MultiCheckboxField(
+        'Dni tygodnia',
+        choices=WEEKDAY_CHOICES,
+        coerce=int,
+        validators=[Optional()],
+    )
+    repeat_count = IntegerField(
+        'Maks. liczba wystąpień',
+        validators=[Optional(), NumberRange(min=1, max=366)],
+    )
+    repeat_exceptions = StringField(
+        'Pomiń daty',
+        validators=[Optional(), Length(max=1000)],
+        render_kw={"placeholder": "rrrr-mm-dd, rrrr-mm-dd"},
+    )
+    skip_holidays = BooleanField('Pomijaj święta')
     submit = SubmitField('Zapisz')
 
     def validate(self, extra_validators=None):
@@ -160,15 +182,38 @@ class TrainingForm(FlaskForm):
                 )
                 repeat_ok = False
 
-            if not self.repeat_until.data:
+            if not self.repeat_until.data and not self.repeat_count.data:
                 self.repeat_until.errors.append('Podaj datę zakończenia powtórzeń.')
                 repeat_ok = False
-            elif self.date.data and self.repeat_until.data < self.date.data.date():
+            elif (
+                self.repeat_until.data
+                and self.date.data
+                and self.repeat_until.data < self.date.data.date()
+            ):
                 self.repeat_until.errors.append(
                     'Data zakończenia musi być późniejsza niż początek.'
                 )
                 repeat_ok = False
 
+            try:
+                parse_date_list(self.repeat_exceptions.data)
+            except ValueError:
+                self.repeat_exceptions.errors.append(
+                    'Podaj daty w formacie rrrr-mm-dd oddzielone przecinkami.'
+                )
+                repeat_ok = False
+
+            if repeat_ok and self.repeat_count.data and not self.repeat_until.data:
+                # Without an end date the rule stops at MAX_HORIZON_DAYS
+                fitting = len(self.iter_occurrences())
+                if fitting < self.repeat_count.data:
+                    self.repeat_count.errors.append(
+                        f'Bez daty zakończenia w ciągu {MAX_HORIZON_DAYS // 366} lat '
+                        f'zmieści się tylko {fitting} wystąpień. '
+                        'Podaj datę zakończenia albo zmniejsz liczbę wystąpień.'
+                    )
+                    repeat_ok = False
+
             return repeat_ok
 
         return True
@@ -179,27 +224,28 @@ class TrainingForm(FlaskForm):
         if not self.date.data:
             return []
 
-        occurrences = [self.date.data]
-
         if not (
             self.repeat.data
             and self.repeat_interval.data
             and self.repeat_interval.data > 0
-            and self.repeat_until.data
+            and (self.repeat_until.data or self.repeat_count.data)
         ):
-            return occurrences
-
-        interval = timedelta(weeks=self.repeat_interval.data)
-        current = self.date.data
-
-        while True:
-            next_date = current + interval
-            if next_date.date() > self.repeat_until.data:
-                break
-            occurrences.append(next_date)
-            current = next_date
-
-        return occurrences
+            return [self.date.data]
+
+        try:
+            exceptions = parse_date_list(self.repeat_exceptions.data)
+        except ValueError:
+            exceptions = []
+
+        return expand_weekly(
+            self.date.data,
+            interval_weeks=self.repeat_interval.data,
+            until=self.repeat_until.data,
+            weekdays=self.repeat_weekdays.data or None,
+            count=self.repeat_count.data,
+            exclude=exceptions,
+            skip_holidays=bool(self.skip_holidays.data),
+        )
 
     @property
     def occurrence_count(self):
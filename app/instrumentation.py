@@ -0,0 +1,292 @@
+"""Per-request performance instrumentation.
+
+``RequestProfiler`` is a Flask extension that measures, for every request,
+the wall time, the number and total duration of SQL statements (via
+SQLAlchemy cursor events) and the time spent in outbound HTTP/SMTP calls
+wrapped in :func:`track_http`. The numbers are sent back in a
+``Server-Timing`` header, aggregated per endpoint in memory and fed to the
+request latency histogram in :mod:`app.metrics`.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged with their parameters,
+the view or CLI command that ran them and the database's query plan,
+inside requests and CLI commands alike.
+
+``LazyLoadDetector`` is an opt-in N+1 check: when the same relationship is
+lazy-loaded more than ``NPLUSONE_THRESHOLD`` times within one request or
+CLI command it logs a warning, or raises :class:`NPlusOneError` when
+``NPLUSONE_MODE`` is ``"raise"`` (as in the test suite).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import click
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .metrics import REQUEST_LATENCY
+
+
+class RequestTimings:
+    """Counters collected for the current request (stored on ``g``)."""
+
+    __slots__ = ("started", "sql_count", "sql_ms", "http_ms")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.http_ms: dict[str, float] = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Return timings of the active request, or ``None`` outside one."""
+    if not has_app_context():
+        return None
+    return g.get("_request_timings")
+
+
+@contextmanager
+def track_http(service: str) -> Iterator[None]:
+    """Attribute the time spent in the block to outbound ``service``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings()
+        if timings is not None:
+            elapsed = (time.perf_counter() - started) * 1000
+            timings.http_ms[service] = timings.http_ms.get(service, 0.0) + elapsed
+
+
+# Plan prefixes per dialect; other databases are logged without a plan
+_EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+_EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+
+def _query_source() -> str:
+    """Describe what issued the current statement (view or CLI command)."""
+    if has_request_context():
+        return f"view {request.endpoint or request.path}"
+    ctx = click.get_current_context(silent=True)
+    if ctx is not None:
+        return f"command {ctx.command_path}"
+    return "app context"
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    prefix = _EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    # On PostgreSQL a failed statement aborts the whole transaction, and the
+    # EXPLAIN runs inside the caller's; a savepoint contains the failure
+    savepoint = conn.dialect.name == "postgresql"
+    try:
+        # Raw DB-API cursor, so the EXPLAIN does not re-enter these listeners
+        cursor = conn.connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute(f"SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception:
+                if savepoint:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+                raise
+            finally:
+                if savepoint:
+                    cursor.execute(f"RELEASE SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+        finally:
+            cursor.close()
+    except Exception as exc:
+        return f"<unavailable: {exc}>"
+    # SQLite puts the readable detail last, PostgreSQL returns one column
+    return " | ".join(str(row[-1]) for row in rows)
+
+
+def _log_slow_query(conn, statement, parameters, elapsed_ms: float) -> None:
+    params = repr(parameters)
+    if len(params) > 500:
+        params = params[:500] + "..."
+    current_app.logger.warning(
+        "Slow query (%.1f ms) in %s: %s | params=%s | plan: %s",
+        elapsed_ms,
+        _query_source(),
+        " ".join(statement.split()),
+        params,
+        _explain(conn, statement, parameters) or "n/a",
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["_query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("_query_started", None)
+    if started is None or not has_app_context():
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    timings = g.get("_request_timings")
+    if timings is not None:
+        timings.sql_count += 1
+        timings.sql_ms += elapsed_ms
+    threshold = current_app.config.get("SLOW_QUERY_MS")
+    if threshold and elapsed_ms >= threshold and not executemany:
+        _log_slow_query(conn, statement, parameters, elapsed_ms)
+
+
+_sql_listeners_lock = threading.Lock()
+_sql_listeners_installed = False
+
+
+def _install_sql_listeners() -> None:
+    # Listening on the Engine class covers engines Flask-SQLAlchemy creates
+    # lazily; statements outside a request are ignored by the handlers.
+    global _sql_listeners_installed
+    with _sql_listeners_lock:
+        if _sql_listeners_installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _sql_listeners_installed = True
+
+
+class RequestProfiler:
+    """Flask extension recording per-endpoint request costs."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault("REQUEST_PROFILING", True)
+        app.config.setdefault("SLOW_QUERY_MS", 0)
+        app.extensions["request_profiler"] = self
+        if app.config["REQUEST_PROFILING"] or app.config["SLOW_QUERY_MS"]:
+            _install_sql_listeners()
+        if not app.config["REQUEST_PROFILING"]:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _start_request(self) -> None:
+        g._request_timings = RequestTimings()
+
+    def _finish_request(self, response):
+        timings = g.pop("_request_timings", None)
+        if timings is None:
+            return response
+        total_ms = timings.elapsed_ms()
+        endpoint = request.endpoint or "<unmatched>"
+        self._record(endpoint, total_ms, timings)
+        REQUEST_LATENCY.labels(endpoint).observe(total_ms / 1000)
+
+        parts = [
+            f"app;dur={total_ms:.1f}",
+            f'sql;dur={timings.sql_ms:.1f};desc="{timings.sql_count} queries"',
+        ]
+        parts.extend(
+            f"{service};dur={ms:.1f}" for service, ms in sorted(timings.http_ms.items())
+        )
+        response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    def _record(self, endpoint: str, total_ms: float, timings: RequestTimings) -> None:
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = {
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "sql_count": 0,
+                    "sql_ms": 0.0,
+                    "http_ms": {},
+                }
+            stats["count"] += 1
+            stats["total_ms"] += total_ms
+            stats["max_ms"] = max(stats["max_ms"], total_ms)
+            stats["sql_count"] += timings.sql_count
+            stats["sql_ms"] += timings.sql_ms
+            for service, ms in timings.http_ms.items():
+                stats["http_ms"][service] = stats["http_ms"].get(service, 0.0) + ms
+
+    def snapshot(self) -> dict[str, dict]:
+        """Return a copy of the per-endpoint aggregates."""
+        with self._lock:
+            return {
+                endpoint: {**stats, "http_ms": dict(stats["http_ms"])}
+                for endpoint, stats in self._stats.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+profiler = RequestProfiler()
+
+
+class NPlusOneError(AssertionError):
+    """A relationship was lazy-loaded too often within one request/command."""
+
+
+def _on_orm_execute(orm_execute_state) -> None:
+    # Only SQL-emitting lazy loads; eager (selectin) loads have no parent state
+    if (
+        not orm_execute_state.is_select
+        or orm_execute_state.lazy_loaded_from is None
+        or not has_app_context()
+    ):
+        return
+    mode = current_app.config.get("NPLUSONE_MODE")
+    if not mode:
+        return
+    relationship = str(orm_execute_state.loader_strategy_path[-1])
+    counts = g.setdefault("_lazy_loads", {})
+    count = counts[relationship] = counts.get(relationship, 0) + 1
+    # Report once, when the threshold is first exceeded
+    if count != current_app.config.get("NPLUSONE_THRESHOLD", 10) + 1:
+        return
+    message = (
+        f"N+1 query: {relationship} lazy-loaded {count} times in {_query_source()}; "
+        f"use joinedload/selectinload"
+    )
+    if mode == "raise":
+        raise NPlusOneError(message)
+    current_app.logger.warning(message)
+
+
+_lazy_listener_lock = threading.Lock()
+_lazy_listener_installed = False
+
+
+class LazyLoadDetector:
+    """Flask extension flagging repeated lazy loads of one relationship."""
+
+    def init_app(self, app) -> None:
+        global _lazy_listener_installed
+        app.config.setdefault("NPLUSONE_MODE", "")
+        app.config.setdefault("NPLUSONE_THRESHOLD", 10)
+        app.extensions["lazy_load_detector"] = self
+        if not app.config["NPLUSONE_MODE"]:
+            return
+        with _lazy_listener_lock:
+            if not _lazy_listener_installed:
+                event.listen(Session, "do_orm_execute", _on_orm_execute)
+                _lazy_listener_installed = True
+
+
+lazy_load_detector = LazyLoadDetector()
@@ -0,0 +1,150 @@
+"""Log of outbound WhatsApp messages and their delivery acks.
+
+``send_whatsapp_message`` records every message it hands to WAHA with the
+request latency and WAHA's message id. ``message.ack`` webhooks then move
+the status forward (sent → delivered → read). Rows are written in a
+session of their own, so logging never commits or rolls back the
+caller's work.
+"""
+
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import MessageLog
+
+# WAHA ``ack`` values
+ACK_STATUSES = {
+    -1: "failed",
+    0: "pending",
+    1: "sent",
+    2: "delivered",
+    3: "read",
+    4: "played",
+}
+SENT = "sent"
+FAILED = "failed"
+# An error ack is ignored once the phone has received the message
+_DELIVERED_ACK = 2
+
+STATUS_LABELS = {
+    "pending": "Oczekuje",
+    "sent": "Wysłano",
+    "delivered": "Dostarczono",
+    "read": "Przeczytano",
+    "played": "Odtworzono",
+    "failed": "Błąd",
+}
+TEMPLATE_LABELS = {
+    "signup_confirmation": "Potwierdzenie zapisu",
+    "signup_confirmation_multi": "Potwierdzenie zapisu (kilka)",
+    "volunteer_reminder": "Przypomnienie",
+    "volunteer_reminder_multi": "Przypomnienie (kilka)",
+    "training_canceled": "Odwołanie treningu",
+    "time_changed": "Zmiana godziny",
+    "training_changed": "Zmiany w treningach",
+    "coach_volunteer_canceled": "Rezygnacja — trener",
+    "coach_summary": "Podsumowanie dla trenera",
+    "reply": "Odpowiedź bota",
+}
+
+
+def waha_message_id(body) -> str | None:
+    """Return the serialized message id of a WAHA message object.
+
+    Depending on the engine WAHA gives the id as a string or as an object
+    with ``_serialized``.
+    """
+    if not isinstance(body, dict):
+        return None
+    msg_id = body.get("id")
+    if isinstance(msg_id, dict):
+        msg_id = msg_id.get("_serialized")
+    return msg_id if isinstance(msg_id, str) and msg_id else None
+
+
+def record_message(
+    recipient: str,
+    template: str | None,
+    status: str,
+    *,
+    latency_ms: int | None = None,
+    waha_id: str | None = None,
+    ack: int | None = None,
+    error: str | None = None,
+) -> None:
+    """Store one outbound message; failures are only logged."""
+    try:
+        with Session(db.engine) as session:
+            session.add(
+                MessageLog(
+                    recipient=recipient,
+                    template=template,
+                    status=status,
+                    latency_ms=latency_ms,
+                    waha_id=waha_id,
+                    ack=ack,
+                    error=error,
+                )
+            )
+            session.commit()
+    except SQLAlchemyError as exc:
+        current_app.logger.warning("Failed to log WhatsApp message to %s: %s", recipient, exc)
+
+
+def record_ack(waha_id: str, ack: int) -> bool:
+    """Apply a WAHA ack to the message ``waha_id``.
+
+    Acks can arrive out of order, so the status only moves forward.
+    Returns ``True`` when a logged message was updated.
+    """
+    status = ACK_STATUSES.get(ack)
+    if status is None:
+        return False
+    newer = _DELIVERED_ACK if ack < 0 else ack
+    result = db.session.execute(
+        update(MessageLog)
+        .where(
+            MessageLog.waha_id == waha_id,
+            or_(MessageLog.ack.is_(None), MessageLog.ack < newer),
+        )
+        .values(ack=ack, status=status, acked_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def summary(filters) -> dict:
+    """Return counts by status, failure rate, latency and throughput of
+    the messages matching ``filters`` (SQL expressions on ``MessageLog``)."""
+    by_status = dict(
+        db.session.query(MessageLog.status, func.count())
+        .filter(*filters)
+        .group_by(MessageLog.status)
+        .all()
+    )
+    first, last, avg_latency, max_latency = (
+        db.session.query(
+            func.min(MessageLog.created_at),
+            func.max(MessageLog.created_at),
+            func.avg(MessageLog.latency_ms),
+            func.max(MessageLog.latency_ms),
+        )
+        .filter(*filters)
+        .one()
+    )
+    total = sum(by_status.values())
+    hours = (last - first).total_seconds() / 3600 if first and last else 0
+    return {
+        "total": total,
+        "by_status": by_status,
+        "failure_rate": 100 * by_status.get(FAILED, 0) / total if total else 0,
+        "avg_latency_ms": round(avg_latency) if avg_latency is not None else None,
+        "max_latency_ms": max_latency,
+        "per_hour": total / hours if hours else None,
+    }
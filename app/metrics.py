@@ -0,0 +1,300 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A deliberately small registry (counters, gauges, histograms with labels) so
+the app needs no extra dependency and tests can read metric values
+directly. Values live in memory per process; ``/metrics`` exposes the
+registry of the process that serves the request.
+"""
+
+import hmac
+import math
+import threading
+from typing import Callable, Iterable, Optional
+
+from flask import Blueprint, Response, current_app, redirect, request, session, url_for
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: dict[str, "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Zero all values (used by tests)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple[str, ...], object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    def _peek(self, labels) -> float:
+        with self._lock:
+            child = self._children.get(tuple(str(value) for value in labels))
+        return child.value if child is not None else 0.0
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._children.clear()
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = float(value)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count; ``name`` should end with ``_total``."""
+
+    kind = "counter"
+    _new_child = _Value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def value(self, *labels) -> float:
+        return self._peek(labels)
+
+    def samples(self):
+        for key, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback."""
+
+    kind = "gauge"
+    _new_child = _Value
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the (unlabelled) value from ``function`` at render time."""
+        self._function = function
+
+    def value(self, *labels) -> float:
+        if self._function is not None and not labels:
+            return float(self._function())
+        return self._peek(labels)
+
+    def samples(self):
+        if self._function is not None:
+            yield f"{self.name} {_format_value(self._function())}"
+            return
+        for key, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "bucket_counts", "sum", "count", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.bucket_counts = [0] * len(upper_bounds)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.upper_bounds):
+                if value <= bound:
+                    self.bucket_counts[index] += 1
+                    break
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative ``le`` buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upper_bounds = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_child(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def samples(self):
+        for key, child in self._items():
+            cumulative = 0
+            for bound, count in zip(child.upper_bounds, child.bucket_counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {_format_value(child.count)}"
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request wall time per endpoint.",
+    ["endpoint"],
+)
+WHATSAPP_MESSAGES = Counter(
+    "whatsapp_messages_total",
+    "Outbound WhatsApp messages by result.",
+    ["result"],
+)
+WHATSAPP_THROTTLE_WAIT = Histogram(
+    "whatsapp_throttle_wait_seconds",
+    "Time outbound WhatsApp messages waited for the rate limiter.",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+EMAILS = Counter(
+    "emails_total",
+    "Outbound emails by result.",
+    ["result"],
+)
+WEBHOOK_INTENTS = Counter(
+    "webhook_intents_total",
+    "Intents detected in inbound WhatsApp messages.",
+    ["intent"],
+)
+GEMINI_CALLS = Counter(
+    "gemini_calls_total",
+    "Gemini assistant requests by outcome.",
+    ["result"],
+)
+PENDING_SIGNUPS = Gauge(
+    "pending_signup_notifications",
+    "Signup confirmations waiting for their grace period to end.",
+)
+
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def _authorized() -> bool:
+    if session.get("admin_logged_in"):
+        return True
+    # Scrapers cannot log in; they may present METRICS_TOKEN instead
+    token = current_app.config.get("METRICS_TOKEN")
+    supplied = request.headers.get("Authorization", "")
+    # Bytes: compare_digest rejects non-ASCII str, and headers may hold any latin-1
+    return bool(token) and hmac.compare_digest(
+        supplied.encode(), f"Bearer {token}".encode()
+    )
+
+
+@metrics_bp.route("/metrics")
+def metrics():
+    """Expose the registry in the Prometheus text format."""
+    if not _authorized():
+        if request.headers.get("Authorization"):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return redirect(url_for("admin.login"))
+    return Response(
+        REGISTRY.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,7 +1,9 @@
 from . import db
+from .database import create_booking_limit_trigger
 from datetime import datetime, timezone
-from sqlalchemy import CheckConstraint, event
+from sqlalchemy import event, func, select
 from sqlalchemy import LargeBinary
+from sqlalchemy.orm import deferred
 
 
 class Coach(db.Model):
@@ -25,6 +27,18 @@ class Location(db.Model):
         return f"<Location {self.name}>"
 
 
+def build_series_key(date, coach_id, location_id):
+    """Return the key grouping recurring trainings by weekday, time and venue.
+
+    The format (``"<weekday>-<HHMM>-c<coach>-l<location>"``) is used in the
+    admin series URLs and stored on :class:`Training` so series can be
+    resolved with an indexed lookup.
+    """
+    if date is None or coach_id is None or location_id is None:
+        return None
+    return f"{date.weekday()}-{date.strftime('%H%M')}-c{coach_id}-l{location_id}"
+
+
 class TrainingSeries(db.Model):
     __tablename__ = 'training_series'
 
@@ -69,6 +83,11 @@ class Training(db.Model):
         db.ForeignKey('training_series.id'),
         nullable=True,
     )
+    series_key = db.Column(
+        db.String(32),
+        nullable=True,
+        index=True,
+    )
     is_canceled = db.Column(
         db.Boolean,
         nullable=False,
@@ -86,14 +105,6 @@ class Training(db.Model):
         server_default="2",
     )
 
-    __table_args__ = (
-        CheckConstraint(
-            "(SELECT COUNT(*) FROM bookings WHERE bookings.training_id = id) <= max_volunteers",
-            name="booking_limit",
-            info={"skip_sqlite": True},
-        ),
-    )
-
     coach = db.relationship(
         'Coach',
         backref=db.backref('trainings', lazy=True),
@@ -207,14 +218,31 @@ class EmailSettings(db.Model):
 
 
 class StoredFile(db.Model):
-    """Binary file stored in the database for email attachments."""
+    """Binary file stored in the database for email attachments.
+
+    Legacy storage; attachments now live on disk (see ``app.attachments``).
+    ``data`` is deferred so that listing or checking rows never loads the
+    blob; use :meth:`iter_data` to read it in chunks.
+    """
 
     __tablename__ = "stored_files"
 
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(256), nullable=False)
     content_type = db.Column(db.String(128), nullable=False)
-    data = db.Column(LargeBinary, nullable=False)
+    data = deferred(db.Column(LargeBinary, nullable=False))
+
+    def iter_data(self, chunk_size=256 * 1024):
+        """Yield the blob in ``chunk_size`` pieces without loading it whole."""
+        size = db.session.execute(
+            select(func.length(StoredFile.data)).where(StoredFile.id == self.id)
+        ).scalar()
+        for offset in range(0, size or 0, chunk_size):
+            yield db.session.execute(
+                select(func.substr(StoredFile.data, offset + 1, chunk_size)).where(
+                    StoredFile.id == self.id
+                )
+            ).scalar()
 
 
 class WhatsAppTemplate(db.Model):
@@ -235,13 +263,144 @@ class WhatsAppTemplate(db.Model):
         return f"<WhatsAppTemplate {self.key}>"
 
 
-@event.listens_for(Training.__table__, "before_create")
-def _skip_sqlite_check(table, connection, **kw):
-    if connection.dialect.name == "sqlite":
-        to_remove = [
-            c
-            for c in list(table.constraints)
-            if isinstance(c, CheckConstraint) and c.info.get("skip_sqlite")
-        ]
-        for c in to_remove:
-            table.constraints.remove(c)
+class WhatsAppLidMapping(db.Model):
+    """Resolved WhatsApp ``@lid`` chat ID to phone number."""
+
+    __tablename__ = "whatsapp_lid_mappings"
+
+    lid = db.Column(db.String(64), primary_key=True)
+    phone = db.Column(db.String(20), nullable=False)
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self):
+        return f"<WhatsAppLidMapping {self.lid} -> {self.phone}>"
+
+
+class NotificationJob(db.Model):
+    """Batch of volunteer notifications sent in the background.
+
+    Created by an admin action (e.g. cancelling trainings) and processed by
+    ``app.notifications``; ``heartbeat_at`` is refreshed by the worker
+    running it, so a job whose worker died can be picked up again.
+    """
+
+    __tablename__ = "notification_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    title = db.Column(db.String(256), nullable=False)
+    subject = db.Column(db.String(256), nullable=True)
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+    heartbeat_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    deliveries = db.relationship(
+        "NotificationDelivery",
+        back_populates="job",
+        cascade="all, delete-orphan",
+        order_by="NotificationDelivery.id",
+        lazy=True,
+    )
+
+    def __repr__(self):
+        return f"<NotificationJob {self.id} {self.kind}>"
+
+
+class NotificationDelivery(db.Model):
+    """One email or WhatsApp message of a :class:`NotificationJob`."""
+
+    __tablename__ = "notification_deliveries"
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(
+        db.Integer,
+        db.ForeignKey("notification_jobs.id"),
+        nullable=False,
+    )
+    channel = db.Column(db.String(16), nullable=False)  # "email" or "whatsapp"
+    recipient = db.Column(db.String(256), nullable=False)
+    recipient_name = db.Column(db.String(256), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    error = db.Column(db.Text, nullable=True)
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    job = db.relationship("NotificationJob", back_populates="deliveries")
+
+    __table_args__ = (
+        db.Index("ix_notification_deliveries_job_status", "job_id", "status"),
+    )
+
+    def __repr__(self):
+        return f"<NotificationDelivery {self.channel} to {self.recipient}: {self.status}>"
+
+
+class MessageLog(db.Model):
+    """One outbound WhatsApp message and its delivery status.
+
+    Written by ``send_whatsapp_message``; ``status`` and ``ack`` are then
+    advanced by WAHA ``message.ack`` webhooks (see ``app.message_log``).
+    """
+
+    __tablename__ = "message_log"
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+    recipient = db.Column(db.String(64), nullable=False)  # WAHA chatId
+    template = db.Column(db.String(32), nullable=True)
+    waha_id = db.Column(db.String(128), nullable=True, unique=True)
+    status = db.Column(db.String(16), nullable=False)
+    ack = db.Column(db.SmallInteger, nullable=True)
+    latency_ms = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    acked_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_message_log_created_at", "created_at"),
+        db.Index("ix_message_log_status_created_at", "status", "created_at"),
+        db.Index("ix_message_log_template_created_at", "template", "created_at"),
+        db.Index("ix_message_log_recipient_created_at", "recipient", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<MessageLog {self.id} to {self.recipient}: {self.status}>"
+
+
+class WhatsAppRateLimit(db.Model):
+    """Pacing state of one outbound WhatsApp rate limit (see ``app.throttle``).
+
+    ``tat`` is the theoretical arrival time, in epoch seconds, of the next
+    message allowed without waiting.
+    """
+
+    __tablename__ = "whatsapp_rate_limits"
+
+    key = db.Column(db.String(96), primary_key=True)
+    tat = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<WhatsAppRateLimit {self.key} {self.tat}>"
+
+
+@event.listens_for(Training, "before_insert")
+@event.listens_for(Training, "before_update")
+def _refresh_series_key(mapper, connection, target):
+    target.series_key = build_series_key(
+        target.date, target.coach_id, target.location_id
+    )
+
+
+# Capacity rule (max_volunteers) as a trigger; see app/database.py
+event.listen(Booking.__table__, "after_create", create_booking_limit_trigger)
@@ -0,0 +1,363 @@
+"""Background delivery of volunteer notifications.
+
+An admin action creates a :class:`~app.models.NotificationJob` holding one
+already rendered :class:`~app.models.NotificationDelivery` per message and
+returns at once. A worker thread then sends the emails in batches over one
+SMTP connection (``send_bulk_email``) and the WhatsApp messages one by one,
+recording the outcome of each. Progress lives in the database, so any web
+worker can show it, and ``flask send-pending-notifications`` picks up jobs
+whose worker died.
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from flask import current_app, url_for
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import db, email_utils
+from .models import (
+    Booking,
+    EmailSettings,
+    NotificationDelivery,
+    NotificationJob,
+    Training,
+    Volunteer,
+)
+from .template_utils import render_template_string
+from .whatsapp_utils import (
+    send_whatsapp_message,
+    training_canceled_message,
+    training_changes_message,
+    training_time_changed_message,
+)
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+EMAIL_BATCH_SIZE = 50
+# A running worker refreshes the heartbeat after every batch or message
+STALE_AFTER = timedelta(minutes=10)
+
+
+class TrainingChange(NamedTuple):
+    """A training's date and location name from before an edit."""
+
+    training_id: int
+    old_date: datetime
+    old_location: str
+
+
+def _trainings(training_ids) -> list[Training]:
+    return (
+        Training.query.options(
+            joinedload(Training.location),
+            selectinload(Training.bookings).joinedload(Booking.volunteer),
+        )
+        .filter(Training.id.in_(training_ids))
+        .order_by(Training.date)
+        .all()
+    )
+
+
+def _add_deliveries(
+    job: NotificationJob, volunteer: Volunteer, html_body: str, whatsapp_body: str
+) -> None:
+    """Queue an email and a WhatsApp message for ``volunteer``, where
+    they have an address and a phone number."""
+    name = f"{volunteer.first_name} {volunteer.last_name}"
+    if volunteer.email:
+        job.deliveries.append(
+            NotificationDelivery(
+                channel="email", recipient=volunteer.email, recipient_name=name, body=html_body
+            )
+        )
+    if volunteer.phone_number:
+        job.deliveries.append(
+            NotificationDelivery(
+                channel="whatsapp",
+                recipient=volunteer.phone_number,
+                recipient_name=name,
+                body=whatsapp_body,
+            )
+        )
+
+
+def training_cancellation_job(training_ids: list[int]) -> NotificationJob:
+    """Queue an email and a WhatsApp per booking of the given trainings.
+
+    Each volunteer gets a personal message (``{first_name}``,
+    ``{last_name}``, ``{date}``, ``{location}`` and ``{logo}`` in the
+    cancellation template). The job is added to the session, not committed.
+    """
+    trainings = _trainings(training_ids)
+    settings = db.session.get(EmailSettings, 1)
+    template = settings.cancellation_template if settings else None
+    logo = url_for("static", filename="logo.png", _external=True)
+
+    if len(trainings) == 1:
+        training = trainings[0]
+        title = (
+            f"Odwołanie treningu {training.date.strftime('%Y-%m-%d %H:%M')} "
+            f"({training.location.name})"
+        )
+    else:
+        title = f"Odwołanie {len(trainings)} treningów"
+    job = NotificationJob(kind="training_canceled", title=title, subject="Trening odwołany")
+
+    for training in trainings:
+        date = training.date.strftime("%Y-%m-%d %H:%M")
+        location = training.location.name
+        for booking in training.bookings:
+            volunteer = booking.volunteer
+            data = {
+                "first_name": volunteer.first_name,
+                "last_name": volunteer.last_name,
+                "date": date,
+                "location": location,
+                "logo": logo,
+            }
+            html_body = (
+                render_template_string(template, data)
+                if template
+                else f"Trening {date} w {location} został odwołany."
+            )
+            name = f"{volunteer.first_name} {volunteer.last_name}"
+            _add_deliveries(
+                job, volunteer, html_body, training_canceled_message(name, date, location)
+            )
+    db.session.add(job)
+    return job
+
+
+def training_change_job(changes: list[TrainingChange]) -> NotificationJob:
+    """Queue one message per volunteer about the changed trainings.
+
+    A volunteer booked on several of them gets a single message listing
+    every change. A lone time change uses the ``time_changed`` template,
+    which asks for confirmation, so the booking is flagged to skip the
+    evening reminder. Trainings whose date and location are unchanged are
+    ignored. The job is added to the session, not committed.
+    """
+    before = {change.training_id: change for change in changes}
+    changed: list[dict] = []
+    affected: dict[int, tuple[Volunteer, list[tuple[Booking, dict]]]] = {}
+    for training in _trainings(before):
+        old = before[training.id]
+        change = {
+            "date": training.date.strftime("%Y-%m-%d %H:%M"),
+            "location": training.location.name,
+        }
+        old_date = old.old_date.strftime("%Y-%m-%d %H:%M")
+        if old_date != change["date"]:
+            change["old_date"] = old_date
+        if old.old_location != change["location"]:
+            change["old_location"] = old.old_location
+        if len(change) == 2 or not training.bookings:
+            continue
+        changed.append(change)
+        for booking in training.bookings:
+            affected.setdefault(booking.volunteer_id, (booking.volunteer, []))[1].append(
+                (booking, change)
+            )
+
+    if len(changed) == 1:
+        (change,) = changed
+        title = f"Zmiana treningu {change['date']} ({change['location']})"
+    else:
+        title = f"Zmiana {len(changed)} treningów"
+    time_only = all(_is_time_change(change) for change in changed)
+    job = NotificationJob(
+        kind="training_changed",
+        title=title,
+        subject="Zmiana godziny treningu" if time_only else "Zmiany w treningach",
+    )
+
+    for volunteer, items in affected.values():
+        name = f"{volunteer.first_name} {volunteer.last_name}"
+        (booking, change), *rest = items
+        if not rest and _is_time_change(change):
+            booking.time_change_notified = True
+            day, new_time = change["date"].split()
+            old_time = change["old_date"].split()[1]
+            html_body = (
+                f"<p>Cześć {volunteer.first_name}!</p>"
+                f"<p>Informujemy, że godzina Twojego treningu została zmieniona:</p>"
+                f"<p>📅 Data: <strong>{day}</strong><br>"
+                f"❌ Stara godzina: <strong>{old_time}</strong><br>"
+                f"✅ Nowa godzina: <strong>{new_time}</strong><br>"
+                f"📍 Miejsce: <strong>{change['location']}</strong></p>"
+                f"<p>Jeśli nie możesz uczestniczyć o nowej godzinie, "
+                f"prosimy o wypisanie się z treningu.</p>"
+                f"<p>Pozdrawiamy,<br>Fundacja Widzimy Inaczej</p>"
+            )
+            whatsapp_body = training_time_changed_message(
+                name, old_time, new_time, day, change["location"]
+            )
+        else:
+            changes_for_volunteer = [change for _, change in items]
+            html_body = _changes_email(volunteer.first_name, changes_for_volunteer)
+            whatsapp_body = training_changes_message(name, changes_for_volunteer)
+        _add_deliveries(job, volunteer, html_body, whatsapp_body)
+    db.session.add(job)
+    return job
+
+
+def _is_time_change(change: dict) -> bool:
+    """Whether only the hour changed, on the same day and in the same place."""
+    return (
+        "old_location" not in change
+        and change["old_date"].split()[0] == change["date"].split()[0]
+    )
+
+
+def _changes_email(first_name: str, changes: list[dict]) -> str:
+    items = []
+    for change in changes:
+        item = f"📅 <strong>{change['date']}</strong>"
+        if "old_date" in change:
+            item += f" (było: {change['old_date']})"
+        item += f"<br>📍 <strong>{change['location']}</strong>"
+        if "old_location" in change:
+            item += f" (było: {change['old_location']})"
+        items.append(f"<li>{item}</li>")
+    return (
+        f"<p>Cześć {first_name}!</p>"
+        f"<p>Zmieniły się szczegóły treningów, na które jesteś zapisany:</p>"
+        f"<ul>{''.join(items)}</ul>"
+        f"<p>Jeśli któryś termin Ci nie pasuje, prosimy o wypisanie się z treningu.</p>"
+        f"<p>Pozdrawiamy,<br>Fundacja Widzimy Inaczej</p>"
+    )
+
+
+def start_job(job_id: int) -> threading.Thread | None:
+    """Process ``job_id`` in a background thread (inline when
+    ``NOTIFICATIONS_ASYNC`` is off)."""
+    app = current_app._get_current_object()
+    if not app.config.get("NOTIFICATIONS_ASYNC", True):
+        run_job(job_id)
+        return None
+    thread = threading.Thread(
+        target=_run_in_app, args=(app, job_id), name=f"notifications-{job_id}", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _run_in_app(app, job_id: int) -> None:
+    with app.app_context():
+        try:
+            run_job(job_id)
+        except Exception:
+            app.logger.exception("Notification job %s failed", job_id)
+
+
+def _claim(job_id: int) -> bool:
+    """Take over ``job_id`` unless another worker is running it."""
+    now = datetime.now(timezone.utc)
+    result = db.session.execute(
+        update(NotificationJob)
+        .where(
+            NotificationJob.id == job_id,
+            NotificationJob.finished_at.is_(None),
+            or_(
+                NotificationJob.heartbeat_at.is_(None),
+                NotificationJob.heartbeat_at < now - STALE_AFTER,
+            ),
+        )
+        .values(heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _pending(job_id: int, channel: str, limit: int) -> list[NotificationDelivery]:
+    return (
+        NotificationDelivery.query.filter_by(job_id=job_id, channel=channel, status=PENDING)
+        .order_by(NotificationDelivery.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def _record(delivery: NotificationDelivery, success: bool, error: str | None) -> None:
+    now = datetime.now(timezone.utc)
+    delivery.status = SENT if success else FAILED
+    delivery.error = error
+    delivery.sent_at = now if success else None
+    delivery.job.heartbeat_at = now
+
+
+def run_job(job_id: int) -> bool:
+    """Send the pending deliveries of ``job_id``.
+
+    Returns ``False`` when the job is finished or another worker holds it.
+    """
+    if not _claim(job_id):
+        return False
+    job = db.session.get(NotificationJob, job_id)
+
+    while batch := _pending(job_id, "email", EMAIL_BATCH_SIZE):
+        results = email_utils.send_bulk_email(
+            job.subject, [(d.recipient, d.body) for d in batch]
+        )
+        for delivery, (success, error) in zip(batch, results):
+            _record(delivery, success, error)
+        db.session.commit()
+
+    while batch := _pending(job_id, "whatsapp", 1):
+        delivery = batch[0]
+        success, error = send_whatsapp_message(
+            delivery.recipient, delivery.body, template=job.kind
+        )
+        if not success:
+            current_app.logger.warning(
+                "WhatsApp notification to %s failed: %s", delivery.recipient_name, error
+            )
+        _record(delivery, success, error)
+        db.session.commit()
+
+    job.finished_at = datetime.now(timezone.utc)
+    db.session.commit()
+    progress = job_progress(job_id)
+    current_app.logger.info(
+        "Notification job %s done: %d sent, %d failed",
+        job_id,
+        progress[SENT],
+        progress[FAILED],
+    )
+    return True
+
+
+def job_progress(job_id: int) -> dict[str, int]:
+    """Return delivery counts of ``job_id`` by status, plus ``total``."""
+    counts = dict(
+        db.session.query(NotificationDelivery.status, func.count())
+        .filter(NotificationDelivery.job_id == job_id)
+        .group_by(NotificationDelivery.status)
+        .all()
+    )
+    progress = {status: counts.get(status, 0) for status in (PENDING, SENT, FAILED)}
+    progress["total"] = sum(counts.values())
+    return progress
+
+
+def resume_stale_jobs() -> list[int]:
+    """Run unfinished jobs whose worker stopped; return their ids."""
+    cutoff = datetime.now(timezone.utc) - STALE_AFTER
+    job_ids = db.session.scalars(
+        db.select(NotificationJob.id)
+        .where(
+            NotificationJob.finished_at.is_(None),
+            or_(
+                NotificationJob.heartbeat_at.is_(None),
+                NotificationJob.heartbeat_at < cutoff,
+            ),
+        )
+        .order_by(NotificationJob.id)
+    ).all()
+    return [job_id for job_id in job_ids if run_job(job_id)]
@@ -0,0 +1,132 @@
+"""Weekly recurrence rules for training schedules.
+
+Occurrences are generated with arithmetic on day ordinals (one ``range``
+per selected weekday) instead of stepping through the calendar week by
+week, so expanding a whole season is a handful of integer operations.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+
+WEEKDAY_CHOICES = [
+    (0, "Pn"),
+    (1, "Wt"),
+    (2, "Śr"),
+    (3, "Cz"),
+    (4, "Pt"),
+    (5, "So"),
+    (6, "Nd"),
+]
+
+# Upper bound used when a rule has a count limit but no end date
+MAX_HORIZON_DAYS = 2 * 366
+
+
+def easter_sunday(year: int) -> date:
+    """Return the date of Easter Sunday (Gregorian calendar)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    q = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * q) // 451
+    month, day = divmod(h + q - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def polish_public_holidays(year: int) -> set[date]:
+    """Return statutory public holidays in Poland for ``year``."""
+    easter = easter_sunday(year)
+    holidays = {
+        date(year, 1, 1),
+        date(year, 1, 6),
+        date(year, 5, 1),
+        date(year, 5, 3),
+        date(year, 8, 15),
+        date(year, 11, 1),
+        date(year, 11, 11),
+        date(year, 12, 25),
+        date(year, 12, 26),
+        easter,
+        easter + timedelta(days=1),
+        easter + timedelta(days=49),
+        easter + timedelta(days=60),
+    }
+    if year >= 2025:
+        holidays.add(date(year, 12, 24))
+    return holidays
+
+
+def parse_date_list(text: str | None) -> list[date]:
+    """Parse ``"2025-01-06, 2025-02-10"`` into a list of dates.
+
+    Raises ``ValueError`` when any entry is not a ``YYYY-MM-DD`` date.
+    """
+    dates = []
+    for token in re.split(r"[\s,;]+", text or ""):
+        if token:
+            dates.append(datetime.strptime(token, "%Y-%m-%d").date())
+    return dates
+
+
+def expand_weekly(
+    start: datetime,
+    *,
+    interval_weeks: int = 1,
+    until: date | None = None,
+    weekdays=None,
+    count: int | None = None,
+    exclude=(),
+    skip_holidays: bool = False,
+) -> list[datetime]:
+    """Return datetimes for a weekly rule starting at ``start``.
+
+    Mirrors ``RRULE:FREQ=WEEKLY`` with ``INTERVAL``, ``BYDAY``, ``UNTIL``
+    and ``COUNT``: every ``interval_weeks`` weeks (counted from the week of
+    ``start``) on each of ``weekdays`` (0 = Monday, defaults to the weekday
+    of ``start``), never before ``start`` and not after ``until``. Dates in
+    ``exclude`` and, with ``skip_holidays``, Polish public holidays are
+    dropped before ``count`` is applied. Every occurrence keeps the time of
+    day (and tzinfo) of ``start``.
+    """
+    if interval_weeks < 1:
+        raise ValueError("interval_weeks must be positive")
+
+    start_ord = start.toordinal()
+    if until is not None:
+        end_ord = until.toordinal()
+    else:
+        end_ord = start_ord + MAX_HORIZON_DAYS
+    if end_ord < start_ord:
+        return []
+
+    days = sorted(set(weekdays)) if weekdays else [start.weekday()]
+    week_start = start_ord - start.weekday()
+    step = 7 * interval_weeks
+
+    ordinals = sorted(
+        ordinal
+        for weekday in days
+        for ordinal in range(week_start + weekday, end_ord + 1, step)
+        if ordinal >= start_ord
+    )
+
+    excluded = {value.toordinal() for value in exclude}
+    if skip_holidays:
+        last_year = date.fromordinal(end_ord).year
+        for year in range(start.year, last_year + 1):
+            excluded.update(d.toordinal() for d in polish_public_holidays(year))
+    if excluded:
+        ordinals = [ordinal for ordinal in ordinals if ordinal not in excluded]
+    if count is not None:
+        ordinals = ordinals[:count]
+
+    time_of_day = start.timetz()
+    return [
+        datetime.combine(date.fromordinal(ordinal), time_of_day)
+        for ordinal in ordinals
+    ]
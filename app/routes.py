@@ -9,9 +9,12 @@ from flask import (
     abort,
 )
 from datetime import datetime, date, timezone
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from .models import Training, Booking, Volunteer, EmailSettings
 from .forms import VolunteerForm, CancelForm, PhoneUpdateForm
 from . import db
+from .database import booking_conflict
 from .email_utils import send_email
 from .template_utils import render_template_string
 from .whatsapp_utils import (
@@ -95,7 +98,24 @@ def index():
             volunteer_id=existing_volunteer.id,
         )
         db.session.add(booking)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as exc:
+            db.session.rollback()
+            conflict = booking_conflict(exc)
+            if conflict == "limit":
+                # booking_limit trigger: someone else took the last place meanwhile
+                flash(
+                    "Na ten trening nie można się już zapisać. "
+                    "Limit wolontariuszy został osiągnięty.",
+                    "danger",
+                )
+            elif conflict == "duplicate":
+                # unique_booking: the same form was submitted twice
+                flash("Jesteś już zapisany na ten trening.", "warning")
+            else:
+                raise
+            return redirect(url_for("routes.index"))
 
         # Schedule deferred signup notification (WA + email consolidated).
         # Both WhatsApp and email are sent together after a grace period
@@ -123,7 +143,12 @@ def index():
 
     # Pogrupuj treningi według miesiąca
     trainings = (
-        Training.query.filter_by(is_deleted=False)
+        Training.query.options(
+            joinedload(Training.coach),
+            joinedload(Training.location),
+            selectinload(Training.bookings).joinedload(Booking.volunteer),
+        )
+        .filter_by(is_deleted=False)
         .filter(Training.date >= datetime.now(timezone.utc))
         .order_by(Training.date)
         .all()
@@ -0,0 +1,304 @@
+"""Process-safe pacing of outbound WhatsApp messages.
+
+WAHA accounts get throttled or banned when they send too fast, and
+reminders, notification jobs and webhook replies can run at the same time
+in the web and scheduler containers. Before each message
+``send_whatsapp_message`` books a slot in the shared database with
+:func:`book_turn`. Background senders wait for it with :func:`hold`; a
+web request hands a message that has to wait to a timer thread instead.
+
+Each limit is a token bucket in its GCRA form: one row per key holds the
+time (``tat``) from which the next message would go out with an empty
+bucket. Booking a slot is a single atomic ``UPDATE ... RETURNING``, so
+concurrent senders in any process always get distinct slots. There is a
+global limit of ``WHATSAPP_RATE_PER_MINUTE`` with bursts of
+``WHATSAPP_RATE_BURST``, and ``WHATSAPP_RECIPIENT_SPACING`` seconds
+between two messages to the same chat.
+
+Inbound webhook messages are limited per chat by :func:`inbound_limited`
+to ``WEBHOOK_RATE_LIMIT`` per ``WEBHOOK_RATE_WINDOW`` seconds. Each worker
+keeps the buckets of its ``WEBHOOK_RATE_CACHE_SIZE`` most recent chats in
+memory. The first message of a quiet chat and messages over the limit are
+decided there without touching the database. Messages that arrive while a
+chat's bucket is still filling are counted in the same table, so all
+gunicorn workers share one budget for a busy chat. Drained per-chat rows,
+outbound and inbound, are swept in batches every ``SWEEP_INTERVAL``
+seconds; a missing row is an empty bucket.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import case, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import db
+from .metrics import WHATSAPP_THROTTLE_WAIT
+from .models import WhatsAppRateLimit
+
+GLOBAL_KEY = "global"
+INBOUND_PREFIX = "inbound:"
+# Absorbs float rounding when a burst fills the window exactly
+_EPSILON = 1e-6
+# Drained rows are deleted at most this often per process, in batches
+SWEEP_INTERVAL = 300.0
+SWEEP_BATCH = 500
+
+# Last sweep in this process (epoch seconds)
+_swept_at = 0.0
+
+
+CHAT_PREFIX = "chat:"
+
+
+def _chat_key(chat_id: str) -> str:
+    return f"{CHAT_PREFIX}{chat_id}"
+
+
+def _reserve(session: Session, key: str, interval: float, burst: int, not_before: float) -> float:
+    """Book the next slot of ``key`` at or after ``not_before``; return its start."""
+    tat = case(
+        (WhatsAppRateLimit.tat > not_before, WhatsAppRateLimit.tat), else_=not_before
+    )
+    stmt = (
+        update(WhatsAppRateLimit)
+        .where(WhatsAppRateLimit.key == key)
+        .values(tat=tat + interval)
+        .returning(WhatsAppRateLimit.tat)
+        .execution_options(synchronize_session=False)
+    )
+    new_tat = session.execute(stmt).scalar_one_or_none()
+    if new_tat is None:
+        new_tat = not_before + interval
+        try:
+            session.execute(insert(WhatsAppRateLimit).values(key=key, tat=new_tat))
+        except IntegrityError:
+            # Another sender created the row first
+            session.rollback()
+            new_tat = session.execute(stmt).scalar_one()
+    session.commit()
+    return max(not_before, new_tat - interval * burst)
+
+
+def _push(session: Session, key: str, tat: float) -> None:
+    """Move ``key``'s next free slot to at least ``tat``."""
+    session.execute(
+        update(WhatsAppRateLimit)
+        .where(WhatsAppRateLimit.key == key, WhatsAppRateLimit.tat < tat)
+        .values(tat=tat)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+
+def reserve_slot(chat_id: str, now: float | None = None) -> float:
+    """Book the next moment (epoch seconds) a message to ``chat_id`` may go out."""
+    config = current_app.config
+    per_minute = config["WHATSAPP_RATE_PER_MINUTE"]
+    burst = max(1, config["WHATSAPP_RATE_BURST"])
+    spacing = config["WHATSAPP_RECIPIENT_SPACING"]
+    start = time.time() if now is None else now
+    with Session(db.engine) as session:
+        if spacing > 0:
+            start = _reserve(session, _chat_key(chat_id), spacing, 1, start)
+        if per_minute > 0:
+            slot = _reserve(session, GLOBAL_KEY, 60 / per_minute, burst, start)
+            if spacing > 0 and slot > start:
+                # The global limit delayed the message; space the next one from then
+                _push(session, _chat_key(chat_id), slot + spacing)
+            start = slot
+    _maybe_sweep(time.time() if now is None else now)
+    return start
+
+
+def book_turn(chat_id: str) -> float:
+    """Book the next slot for a message to ``chat_id``; return the seconds
+    until it starts.
+
+    If the limiter's table is unavailable the message is not held back.
+    """
+    config = current_app.config
+    if config["WHATSAPP_RATE_PER_MINUTE"] <= 0 and config["WHATSAPP_RECIPIENT_SPACING"] <= 0:
+        return 0.0
+    try:
+        start = reserve_slot(chat_id)
+    except SQLAlchemyError as exc:
+        current_app.logger.warning("WhatsApp rate limiter unavailable: %s", exc)
+        return 0.0
+    wait = max(0.0, start - time.time())
+    WHATSAPP_THROTTLE_WAIT.observe(wait)
+    return wait
+
+
+def hold(chat_id: str, wait: float) -> None:
+    """Sleep through a slot booked with :func:`book_turn`."""
+    if wait:
+        if wait >= 1:
+            current_app.logger.info("Waiting %.1fs before WhatsApp to %s", wait, chat_id)
+        time.sleep(wait)
+
+
+def wait_turn(chat_id: str) -> float:
+    """Sleep until a message to ``chat_id`` is within the limits; return the
+    seconds waited."""
+    wait = book_turn(chat_id)
+    hold(chat_id, wait)
+    return wait
+
+
+def _consume(session: Session, key: str, interval: float, window: float, now: float,
+             pending: int = 0) -> tuple[bool, float]:
+    """Add ``pending`` already accepted messages to ``key``'s bucket, then
+    take one more token if the backlog stays within ``window``.
+
+    Returns whether the token was taken and the bucket's resulting ``tat``.
+    """
+    if pending:
+        _reserve(session, key, interval * pending, 1, now)
+    tat = case((WhatsAppRateLimit.tat > now, WhatsAppRateLimit.tat), else_=now)
+    stmt = (
+        update(WhatsAppRateLimit)
+        .where(WhatsAppRateLimit.key == key, tat + interval <= now + window + _EPSILON)
+        .values(tat=tat + interval)
+        .returning(WhatsAppRateLimit.tat)
+        .execution_options(synchronize_session=False)
+    )
+    new_tat = session.execute(stmt).scalar_one_or_none()
+    if new_tat is None:
+        try:
+            session.execute(insert(WhatsAppRateLimit).values(key=key, tat=now + interval))
+            new_tat = now + interval
+        except IntegrityError:
+            # The row exists, so the bucket is full; or another worker just
+            # created it, in which case the update decides
+            session.rollback()
+            new_tat = session.execute(stmt).scalar_one_or_none()
+    allowed = new_tat is not None
+    if not allowed:
+        new_tat = session.scalar(
+            select(WhatsAppRateLimit.tat).where(WhatsAppRateLimit.key == key)
+        )
+    session.commit()
+    return allowed, new_tat
+
+
+def sweep(now: float | None = None) -> int:
+    """Delete drained buckets in batches; return the number of rows removed.
+
+    Runs in its own transactions, so callers never wait on a long delete.
+    """
+    now = time.time() if now is None else now
+    drained = (
+        select(WhatsAppRateLimit.key)
+        .where(
+            or_(
+                WhatsAppRateLimit.key.startswith(CHAT_PREFIX),
+                WhatsAppRateLimit.key.startswith(INBOUND_PREFIX),
+            ),
+            WhatsAppRateLimit.tat <= now,
+        )
+        .limit(SWEEP_BATCH)
+    )
+    removed = 0
+    with Session(db.engine) as session:
+        while True:
+            result = session.execute(
+                delete(WhatsAppRateLimit)
+                .where(WhatsAppRateLimit.key.in_(drained.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            removed += result.rowcount
+            if result.rowcount < SWEEP_BATCH:
+                return removed
+
+
+def _maybe_sweep(now: float) -> None:
+    global _swept_at
+    if now - _swept_at < SWEEP_INTERVAL:
+        return
+    _swept_at = now
+    try:
+        sweep(now)
+    except SQLAlchemyError as exc:
+        current_app.logger.warning("Rate limit sweep failed: %s", exc)
+
+
+class _InboundCache:
+    """Per-process LRU of inbound buckets: chat id -> ``[tat, pending]``.
+
+    ``pending`` counts messages accepted locally that the shared row does
+    not include yet.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.buckets: OrderedDict[str, list] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, chat_id: str) -> list:
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.buckets[chat_id] = [0.0, 0]
+            while len(self.buckets) > self.max_entries:
+                # An evicted chat loses at most its one unsynced message
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(chat_id)
+        return bucket
+
+
+def _inbound_cache() -> _InboundCache:
+    cache = current_app.extensions.get("inbound_rate_limits")
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            "inbound_rate_limits",
+            _InboundCache(max(1, current_app.config["WEBHOOK_RATE_CACHE_SIZE"])),
+        )
+    return cache
+
+
+def inbound_limited(chat_id: str, now: float | None = None) -> bool:
+    """Count one webhook message from ``chat_id``; ``True`` if over the limit.
+
+    Rejected messages do not use up the budget. If the limiter's table is
+    unavailable the worker's own count decides.
+    """
+    config = current_app.config
+    limit = config["WEBHOOK_RATE_LIMIT"]
+    window = config["WEBHOOK_RATE_WINDOW"]
+    if limit <= 0 or window <= 0:
+        return False
+    now = time.time() if now is None else now
+    interval = window / limit
+    cache = _inbound_cache()
+    with cache.lock:
+        bucket = cache.get(chat_id)
+        tat = max(bucket[0], now)
+        if tat + interval > now + window + _EPSILON:
+            # The shared bucket holds at least what this worker has seen
+            return True
+        if bucket[0] <= now:
+            # Quiet chat: a single message cannot break the limit
+            bucket[:] = [now + interval, 1]
+            return False
+        pending, bucket[1] = bucket[1], 0
+
+    try:
+        with Session(db.engine) as session:
+            allowed, shared_tat = _consume(
+                session, INBOUND_PREFIX + chat_id, interval, window, now, pending
+            )
+    except SQLAlchemyError as exc:
+        current_app.logger.warning("Webhook rate limiter unavailable: %s", exc)
+        with cache.lock:
+            bucket[0] = max(bucket[0], tat + interval)
+            bucket[1] += pending + 1
+        return False
+    with cache.lock:
+        bucket[0] = max(bucket[0], shared_tat)
+    _maybe_sweep(now)
+    return not allowed
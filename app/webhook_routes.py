@@ -3,15 +3,29 @@
 import re
 import html
 import json
+import logging
+import threading
+import time
 import urllib.request
 import urllib.parse
+from collections import OrderedDict
 from flask import Blueprint, request, jsonify, current_app
 from datetime import datetime, timezone, timedelta
 
-from . import db
+from . import db, throttle
 from .models import Volunteer, Booking, Training, Coach
-from .whatsapp_utils import send_whatsapp_message, normalize_phone_number, notify_coach_volunteer_canceled, format_phone_display
+from .whatsapp_utils import (
+    send_whatsapp_message,
+    normalize_phone_number,
+    notify_coach_volunteer_canceled,
+    format_phone_display,
+    lookup_lid_phone,
+    remember_lid_phones,
+)
 from .ai_assistant import ask_gemini
+from .message_log import record_ack, waha_message_id
+from .instrumentation import track_http
+from .metrics import WEBHOOK_INTENTS
 
 webhook_bp = Blueprint('webhook', __name__)
 
@@ -40,12 +54,17 @@ def _find_person_by_name(name: str) -> tuple[Volunteer | None, Coach | None]:
 
 
 def _extract_phone_from_lid(lid_id: str) -> str | None:
-    """Resolve @lid chat ID to phone number via WAHA chat endpoint.
+    """Resolve @lid chat ID to phone number.
 
-    WAHA stores the phone number (e.g. '+48 519 179 904') in the chat
-    ``name`` field even when the chat ID uses the @lid format.
-    Uses single-chat endpoint instead of listing all chats.
+    Known mappings come from the in-process cache or the
+    ``whatsapp_lid_mappings`` table; only unknown IDs hit WAHA. WAHA stores
+    the phone number (e.g. '+48 519 179 904') in the chat ``name`` field
+    even when the chat ID uses the @lid format.
     """
+    known = lookup_lid_phone(lid_id)
+    if known:
+        return known
+
     waha_url = current_app.config.get('WHATSAPP_API_URL') or 'http://waha:3000'
     waha_key = current_app.config.get('WHATSAPP_API_KEY') or ''
     session = current_app.config.get('WHATSAPP_SESSION') or 'default'
@@ -57,38 +76,45 @@ def _extract_phone_from_lid(lid_id: str) -> str | None:
             f'{waha_url}/api/{session}/chats/{encoded_lid}',
             headers={'X-Api-Key': waha_key},
         )
-        chat = json.loads(urllib.request.urlopen(req, timeout=5).read())
+        with track_http('waha'):
+            chat = json.loads(urllib.request.urlopen(req, timeout=5).read())
         name = chat.get('name', '')
         digits = re.sub(r'\D', '', name)
         if len(digits) >= 9:
             current_app.logger.info(
                 f'Resolved @lid {lid_id} to phone {digits} via chat name "{name}"'
             )
+            remember_lid_phones({lid_id: digits})
             return digits
     except Exception:
         pass  # Fall through to full list
 
-    # Fallback: scan all chats (in case single-chat endpoint not available)
+    # Fallback: scan all chats (in case single-chat endpoint not available).
+    # Every @lid chat named with a phone number is remembered, so the full
+    # list is downloaded at most once per contact.
     try:
         req = urllib.request.Request(
             f'{waha_url}/api/{session}/chats',
             headers={'X-Api-Key': waha_key},
         )
-        chats = json.loads(urllib.request.urlopen(req, timeout=10).read())
+        with track_http('waha'):
+            chats = json.loads(urllib.request.urlopen(req, timeout=10).read())
+        resolved = {}
         for chat in chats:
             cid = chat.get('id', '')
             if isinstance(cid, dict):
                 serialized = cid.get('_serialized', '')
             else:
                 serialized = str(cid)
-            if serialized == lid_id:
-                name = chat.get('name', '')
-                digits = re.sub(r'\D', '', name)
-                if len(digits) >= 9:
-                    current_app.logger.info(
-                        f'Resolved @lid {lid_id} to phone {digits} via chat name "{name}"'
-                    )
-                    return digits
+            digits = re.sub(r'\D', '', chat.get('name', ''))
+            if serialized.endswith('@lid') and len(digits) >= 9:
+                resolved[serialized] = digits
+        remember_lid_phones(resolved)
+        if lid_id in resolved:
+            current_app.logger.info(
+                f'Resolved @lid {lid_id} to phone {resolved[lid_id]} via chat list'
+            )
+            return resolved[lid_id]
     except Exception as exc:
         current_app.logger.warning(f'Failed to resolve @lid via WAHA chats: {exc}')
     return None
@@ -97,30 +123,11 @@ def _extract_phone_from_lid(lid_id: str) -> str | None:
 # Security: Max message length to process
 MAX_MESSAGE_LENGTH = 500
 
-# Security: Rate limiting (simple in-memory, per phone)
-_rate_limit_cache: dict[str, list[datetime]] = {}
-RATE_LIMIT_WINDOW = 60  # seconds
-RATE_LIMIT_MAX_REQUESTS = 10
-
 
+# Security: Rate limiting (per chat, in the shared whatsapp_rate_limits table)
 def is_rate_limited(phone: str) -> bool:
-    """Check if phone number has exceeded rate limit."""
-    now = datetime.now(timezone.utc)
-    window_start = now - timedelta(seconds=RATE_LIMIT_WINDOW)
-    
-    if phone not in _rate_limit_cache:
-        _rate_limit_cache[phone] = []
-    
-    # Clean old entries
-    _rate_limit_cache[phone] = [
-        ts for ts in _rate_limit_cache[phone] if ts > window_start
-    ]
-    
-    if len(_rate_limit_cache[phone]) >= RATE_LIMIT_MAX_REQUESTS:
-        return True
-    
-    _rate_limit_cache[phone].append(now)
-    return False
+    """Check if phone number has exceeded rate limit (shared by all workers)."""
+    return throttle.inbound_limited(phone)
 
 
 def sanitize_message(text: str) -> str:
@@ -156,17 +163,38 @@ CANCEL_PATTERNS = [
 ]
 
 
+_ACCENT_TABLE = str.maketrans('ąćęłńóśźż', 'acelnoszz')
+
+# Intent rules in priority order: the first rule that matches anywhere in the
+# message wins, exactly as if each pattern were tried in turn.
+_INTENT_RULES = [
+    ('confirm_num', r'potwierdzam\s+(?P<confirm_no>\d+)'),
+    ('cancel_num', r'rezygnuje?\s+z?\s*(?P<cancel_no>\d+)'),
+    ('confirm_all', r'potwierdzam\s+(?:oba|obydwa|wszystk)'),
+    *(('confirm', pattern) for pattern in CONFIRM_PATTERNS),
+    *(('cancel', pattern) for pattern in CANCEL_PATTERNS),
+    ('bare_num', r'^(?P<bare_no>\d+)$'),
+]
+
+
+def _build_intent_regex() -> re.Pattern:
+    # Every rule sits in a lookahead, so finditer() tries all rules at every
+    # position without consuming text; alternation order gives the first
+    # (highest-priority) rule matching at that position.
+    alternatives = [
+        f'(?P<r{rank}>{pattern.translate(_ACCENT_TABLE)})'
+        for rank, (_, pattern) in enumerate(_INTENT_RULES)
+    ]
+    return re.compile('(?=' + '|'.join(alternatives) + ')')
+
+
 def normalize_text(text: str) -> str:
     """Normalize text for pattern matching."""
     # Remove accents for easier matching
-    replacements = {
-        'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n',
-        'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
-    }
-    text = text.lower().strip()
-    for pl, en in replacements.items():
-        text = text.replace(pl, en)
-    return text
+    return text.lower().strip().translate(_ACCENT_TABLE)
+
+
+_INTENT_RE = _build_intent_regex()
 
 
 def detect_intent(message: str) -> str | None:
@@ -179,41 +207,26 @@ def detect_intent(message: str) -> str | None:
         'cancel_N'         – cancel training number N
         None               – unknown intent
     """
-    normalized = normalize_text(message)
-    original_lower = message.lower().strip()
-
-    # --- Specific training number: "potwierdzam 1", "potwierdzam 2" ---
-    num_confirm = re.search(r'potwierdzam\s+(\d+)', normalized) or re.search(r'potwierdzam\s+(\d+)', original_lower)
-    if num_confirm:
-        return f'confirm_{num_confirm.group(1)}'
-
-    num_cancel = (
-        re.search(r'rezygnuje?\s+z?\s*(\d+)', normalized)
-        or re.search(r'rezygnuj[eę]\s+z?\s*(\d+)', original_lower)
-    )
-    if num_cancel:
-        return f'cancel_{num_cancel.group(1)}'
-
-    # --- "potwierdzam oba / wszystkie" → confirm all ---
-    if re.search(r'potwierdzam\s+(oba|obydwa|wszystk)', normalized) or re.search(r'potwierdzam\s+(oba|obydwa|wszystk)', original_lower):
-        return 'confirm'
-
-    # --- Generic confirm ---
-    for pattern in CONFIRM_PATTERNS:
-        if re.search(pattern, normalized) or re.search(pattern, original_lower):
-            return 'confirm'
-
-    # --- Generic cancel ---
-    for pattern in CANCEL_PATTERNS:
-        if re.search(pattern, normalized) or re.search(pattern, original_lower):
-            return 'cancel'
-
-    # --- Bare number → confirm that training (e.g. user replies "1" or "2") ---
-    bare_num = re.match(r'^(\d+)$', normalized)
-    if bare_num:
-        return f'confirm_{bare_num.group(1)}'
+    best = None
+    for match in _INTENT_RE.finditer(normalize_text(message)):
+        rank = int(match.lastgroup[1:])
+        if best is None or rank < int(best.lastgroup[1:]):
+            best = match
+            if rank == 0:
+                break
+    if best is None:
+        return None
 
-    return None
+    rule = _INTENT_RULES[int(best.lastgroup[1:])][0]
+    if rule == 'confirm_num':
+        return f"confirm_{best.group('confirm_no')}"
+    if rule == 'cancel_num':
+        return f"cancel_{best.group('cancel_no')}"
+    if rule == 'bare_num':
+        return f"confirm_{best.group('bare_no')}"
+    if rule == 'cancel':
+        return 'cancel'
+    return 'confirm'
 
 
 def _find_by_phone(model, phone: str):
@@ -310,7 +323,7 @@ def send_confirmation_response(chat_id: str, booking: Booking | list[Booking]) -
             )
         message = "\n".join(lines)
 
-    send_whatsapp_message('', message, chat_id=chat_id)
+    send_whatsapp_message('', message, chat_id=chat_id, template='reply')
 
 
 def send_cancellation_response(chat_id: str, booking: Booking) -> None:
@@ -323,7 +336,7 @@ def send_cancellation_response(chat_id: str, booking: Booking) -> None:
         f"Mamy nadzieję, że zobaczysz się z nami innym razem!\n"
         f"Fundacja Widzimy Inaczej"
     )
-    send_whatsapp_message('', message, chat_id=chat_id)
+    send_whatsapp_message('', message, chat_id=chat_id, template='reply')
 
 
 def send_selection_prompt(chat_id: str, bookings: list[Booking], *, cancel_mode: bool = False) -> None:
@@ -346,7 +359,7 @@ def send_selection_prompt(chat_id: str, bookings: list[Booking], *, cancel_mode:
         lines.append("\n✅ Odpisz numer (np. 1) aby potwierdzić")
         lines.append("❌ Odpisz 'rezygnuję z X' aby zrezygnować")
     
-    send_whatsapp_message('', "\n".join(lines), chat_id=chat_id)
+    send_whatsapp_message('', "\n".join(lines), chat_id=chat_id, template='reply')
 
 
 def send_unknown_response(
@@ -361,11 +374,11 @@ def send_unknown_response(
     static help message when the AI is unavailable.
     """
     if message:
-        print(f"[WEBHOOK] Calling ask_gemini with message={message[:50]}", flush=True)
+        current_app.logger.debug("[WEBHOOK] Calling ask_gemini with message=%s", message[:50])
         ai_reply = ask_gemini(message, volunteer=volunteer, coach=coach)
-        print(f"[WEBHOOK] AI reply: {str(ai_reply)[:100] if ai_reply else 'None'}", flush=True)
+        current_app.logger.debug("[WEBHOOK] AI reply: %.100s", ai_reply)
         if ai_reply:
-            send_whatsapp_message('', ai_reply, chat_id=chat_id)
+            send_whatsapp_message('', ai_reply, chat_id=chat_id, template='reply')
             return
 
     if coach and not volunteer:
@@ -380,7 +393,7 @@ def send_unknown_response(
             "❌ REZYGNUJĘ - zrezygnuj z treningu\n\n"
             "Jeśli potrzebujesz pomocy, napisz do nas: treningi@widzimyinaczej.org.pl"
         )
-    send_whatsapp_message('', fallback, chat_id=chat_id)
+    send_whatsapp_message('', fallback, chat_id=chat_id, template='reply')
 
 
 def send_no_booking_response(chat_id: str, *, intent: str | None = None) -> None:
@@ -395,199 +408,261 @@ def send_no_booking_response(chat_id: str, *, intent: str | None = None) -> None
             "ℹ️ Nie znaleziono żadnego treningu do potwierdzenia na jutro.\n\n"
             "Jeśli uważasz, że to błąd, skontaktuj się z nami."
         )
-    send_whatsapp_message('', message, chat_id=chat_id)
+    send_whatsapp_message('', message, chat_id=chat_id, template='reply')
 
 
 # Store for multi-step conversations (selection)
 _pending_selections: dict[str, list[Booking]] = {}
 
-# Deduplication: track recently processed message IDs
-_processed_msg_ids: dict[str, float] = {}
+# Deduplication: recently processed message IDs, oldest first
+_processed_msg_ids: OrderedDict[str, float] = OrderedDict()
+_processed_lock = threading.Lock()
 DEDUP_WINDOW = 30  # seconds
+DEDUP_MAX_IDS = 10_000
+
+
+def _seen_recently(msg_id: str, now: float) -> bool:
+    """Remember ``msg_id``; return ``True`` if it was already processed
+    within ``DEDUP_WINDOW`` seconds."""
+    with _processed_lock:
+        while _processed_msg_ids:
+            if now - next(iter(_processed_msg_ids.values())) < DEDUP_WINDOW:
+                break
+            _processed_msg_ids.popitem(last=False)
+        if msg_id in _processed_msg_ids:
+            return True
+        _processed_msg_ids[msg_id] = now
+        if len(_processed_msg_ids) > DEDUP_MAX_IDS:
+            _processed_msg_ids.popitem(last=False)
+        return False
+
+
+def _count_intent(intent: str | None) -> None:
+    # confirm_3 / cancel_2 are folded so the label set stays bounded
+    label = re.sub(r'_\d+$', '_n', intent) if intent else 'none'
+    WEBHOOK_INTENTS.labels(label).inc()
+
+
+class _WebhookTrace:
+    """Per-stage timings and summary fields for one webhook call.
+
+    The handler calls :meth:`mark` after each stage; :meth:`emit` writes a
+    single JSON log record, and only when INFO logging is enabled.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages: dict[str, float] = {}
+        self.fields: dict = {}
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = round((now - self._last) * 1000, 3)
+        self._last = now
+
+    def emit(self, logger, http_status: int, result: dict) -> None:
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        record = {
+            'event': 'whatsapp_webhook',
+            'http_status': http_status,
+            **{k: result[k] for k in ('status', 'action', 'reason') if k in result},
+            **self.fields,
+            'stages_ms': self.stages,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
 
 
 @webhook_bp.route('/whatsapp', methods=['POST'])
 def whatsapp_webhook():
     """Handle incoming WhatsApp messages from WAHA."""
+    log = current_app.logger
+    trace = _WebhookTrace()
     try:
-        import sys, json as _json
-        print(f"[WEBHOOK] Request received", flush=True)
-        data = request.get_json(force=True, silent=True)
-        
-        if not data:
-            print("[WEBHOOK] No JSON data!", flush=True)
-            return jsonify({'status': 'no data'}), 200
-        
-        event_type = data.get('event')
-        print(f"[WEBHOOK] event={event_type}", flush=True)
-        
-        if event_type != 'message':
-            print(f"[WEBHOOK] Ignoring non-message event: {event_type}", flush=True)
-            return jsonify({'status': 'ignored', 'reason': 'not a message event'}), 200
-        
-        payload = data.get('payload', {})
-        from_me = payload.get('fromMe')
-        from_field = payload.get('from', '')
-        message_body = sanitize_message(payload.get('body', ''))
-        msg_id = payload.get('id', '')
-        
-        # --- Deduplication: WAHA often sends the same message twice ---
-        import time
-        now_ts = time.time()
-        # Clean old entries
-        _processed_msg_ids.update({k: v for k, v in _processed_msg_ids.items() if now_ts - v < DEDUP_WINDOW})
-        if msg_id and msg_id in _processed_msg_ids:
-            print(f"[WEBHOOK] Duplicate msg_id={msg_id}, skipping", flush=True)
-            return jsonify({'status': 'ignored', 'reason': 'duplicate'}), 200
-        if msg_id:
-            _processed_msg_ids[msg_id] = now_ts
-        
+        result, http_status = _handle_webhook(trace, log)
+    except Exception as e:
+        log.exception("Error processing WhatsApp webhook: %s", e)
+        result, http_status = {'status': 'error', 'message': str(e)}, 500
+    trace.mark('handle')
+    trace.emit(log, http_status, result)
+    return jsonify(result), http_status
+
+
+def _handle_ack(payload: dict, log) -> tuple[dict, int]:
+    """Update the message log from a WAHA ``message.ack`` event."""
+    waha_id = waha_message_id(payload)
+    ack = payload.get('ack')
+    # Acks of incoming messages are not logged
+    if not payload.get('fromMe') or not waha_id or not isinstance(ack, int):
+        return {'status': 'ignored', 'reason': 'not an outbound ack'}, 200
+    if not record_ack(waha_id, ack):
+        log.debug("[WEBHOOK] Ack %s for unknown or newer message %s", ack, waha_id)
+        return {'status': 'ignored', 'reason': 'stale ack'}, 200
+    return {'status': 'ok', 'action': 'ack'}, 200
+
+
+def _handle_webhook(trace: _WebhookTrace, log) -> tuple[dict, int]:
+    """Process one WAHA webhook call; returns the JSON body and status."""
+    debug = log.isEnabledFor(logging.DEBUG)
+    data = request.get_json(force=True, silent=True)
+    trace.mark('parse')
+
+    if not data:
+        log.debug("[WEBHOOK] No JSON data")
+        return {'status': 'no data'}, 200
+
+    event_type = data.get('event')
+    trace.fields['waha_event'] = event_type
+
+    if event_type == 'message.ack':
+        return _handle_ack(data.get('payload') or {}, log)
+
+    if event_type != 'message':
+        log.debug("[WEBHOOK] Ignoring non-message event: %s", event_type)
+        return {'status': 'ignored', 'reason': 'not a message event'}, 200
+
+    payload = data.get('payload', {})
+    from_me = payload.get('fromMe')
+    from_field = payload.get('from', '')
+    message_body = sanitize_message(payload.get('body', ''))
+    msg_id = payload.get('id', '')
+    
+    trace.fields['msg_id'] = msg_id
+
+    # --- Deduplication: WAHA often sends the same message twice ---
+    if msg_id and _seen_recently(msg_id, time.monotonic()):
+        log.debug("[WEBHOOK] Duplicate msg_id=%s, skipping", msg_id)
+        return {'status': 'ignored', 'reason': 'duplicate'}, 200
+    trace.mark('dedup')
+
+    _data = payload.get('_data', {})
+    if debug:
         # Dump full payload keys for debugging
-        print(f"[WEBHOOK] fromMe={from_me}, from={from_field}, body={message_body[:80]}, id={msg_id}", flush=True)
-        print(f"[WEBHOOK] payload keys: {list(payload.keys())}", flush=True)
-        _data = payload.get('_data', {})
+        log.debug(
+            "[WEBHOOK] fromMe=%s, from=%s, body=%.80s, id=%s, payload keys=%s",
+            from_me, from_field, message_body, msg_id, list(payload),
+        )
         if _data:
-            print(f"[WEBHOOK] _data keys: {list(_data.keys())}", flush=True)
-            print(f"[WEBHOOK] _data.notifyName={_data.get('notifyName')}, author={_data.get('author')}, participant={_data.get('participant')}", flush=True)
-        
-        # Skip messages we sent ourselves
-        if from_me:
-            print(f"[WEBHOOK] Skipping own message", flush=True)
-            return jsonify({'status': 'ignored', 'reason': 'own message'}), 200
-
-        ignored_raw = current_app.config.get('IGNORED_PHONES') or ''
-        ignored_phones = set(re.sub(r'\D', '', p) for p in ignored_raw.split(',') if p.strip())
-        from_digits = re.sub(r'\D', '', from_field.split('@')[0])
-        if ignored_phones and from_digits and any(
-            from_digits.endswith(p[-9:]) for p in ignored_phones if len(p) >= 9
-        ):
-            print(f"[WEBHOOK] Ignoring message from ignored phone: {from_field}", flush=True)
-            return jsonify({'status': 'ignored', 'reason': 'ignored phone'}), 200
-
-        # Skip empty messages (e.g. user just opened the chat)
-        if not message_body:
-            print(f"[WEBHOOK] Skipping empty message", flush=True)
-            return jsonify({'status': 'ignored', 'reason': 'empty message'}), 200
-        
-        # chat_id is the raw 'from' field – we'll use it to reply
-        chat_id = from_field
-        volunteer = None
-        coach = None
-
-        # --- Identify volunteer or coach ---
-        if '@c.us' in from_field:
-            phone_match = re.match(r'^(\d{9,15})@c\.us$', from_field)
-            if phone_match:
-                phone_number = phone_match.group(1)
-                print(f"[WEBHOOK] Phone from @c.us: {phone_number}", flush=True)
-                volunteer, coach = find_person_by_phone(phone_number)
-        elif '@lid' in from_field:
-            print(f"[WEBHOOK] @lid detected, resolving person...", flush=True)
-            notify_name = _data.get('notifyName', '') or payload.get('notifyName', '')
-            print(f"[WEBHOOK] notifyName={notify_name}", flush=True)
-            if notify_name:
-                volunteer, coach = _find_person_by_name(notify_name)
-                print(f"[WEBHOOK] Person by name: vol={volunteer}, coach={coach}", flush=True)
-            if not volunteer and not coach:
-                phone_number = _extract_phone_from_lid(from_field)
-                if phone_number:
-                    print(f"[WEBHOOK] Phone from lid lookup: {phone_number}", flush=True)
-                    volunteer, coach = find_person_by_phone(phone_number)
-        else:
-            print(f"[WEBHOOK] Unknown from format: {from_field}", flush=True)
-            return jsonify({'status': 'error', 'reason': 'unknown from format'}), 200
-
-        print(f"[WEBHOOK] Resolved: volunteer={volunteer}, coach={coach}", flush=True)
+            log.debug(
+                "[WEBHOOK] _data keys=%s, notifyName=%s, author=%s, participant=%s",
+                list(_data), _data.get('notifyName'), _data.get('author'),
+                _data.get('participant'),
+            )
 
+    # Skip messages we sent ourselves
+    if from_me:
+        log.debug("[WEBHOOK] Skipping own message")
+        return {'status': 'ignored', 'reason': 'own message'}, 200
+
+    ignored_raw = current_app.config.get('IGNORED_PHONES') or ''
+    ignored_phones = set(re.sub(r'\D', '', p) for p in ignored_raw.split(',') if p.strip())
+    from_digits = re.sub(r'\D', '', from_field.split('@')[0])
+    if ignored_phones and from_digits and any(
+        from_digits.endswith(p[-9:]) for p in ignored_phones if len(p) >= 9
+    ):
+        log.debug("[WEBHOOK] Ignoring message from ignored phone: %s", from_field)
+        return {'status': 'ignored', 'reason': 'ignored phone'}, 200
+
+    # Skip empty messages (e.g. user just opened the chat)
+    if not message_body:
+        log.debug("[WEBHOOK] Skipping empty message")
+        return {'status': 'ignored', 'reason': 'empty message'}, 200
+    
+    # chat_id is the raw 'from' field – we'll use it to reply
+    chat_id = from_field
+    volunteer = None
+    coach = None
+
+    # --- Identify volunteer or coach ---
+    if '@c.us' in from_field:
+        phone_match = re.match(r'^(\d{9,15})@c\.us$', from_field)
+        if phone_match:
+            phone_number = phone_match.group(1)
+            log.debug("[WEBHOOK] Phone from @c.us: %s", phone_number)
+            volunteer, coach = find_person_by_phone(phone_number)
+    elif '@lid' in from_field:
+        notify_name = _data.get('notifyName', '') or payload.get('notifyName', '')
+        log.debug("[WEBHOOK] @lid sender, notifyName=%s", notify_name)
+        if notify_name:
+            volunteer, coach = _find_person_by_name(notify_name)
+            log.debug("[WEBHOOK] Person by name: vol=%s, coach=%s", volunteer, coach)
         if not volunteer and not coach:
-            print(f"[WEBHOOK] Unknown sender, ignoring: {from_field}", flush=True)
-            return jsonify({'status': 'ignored', 'reason': 'unknown sender'}), 200
+            phone_number = _extract_phone_from_lid(from_field)
+            if phone_number:
+                log.debug("[WEBHOOK] Phone from lid lookup: %s", phone_number)
+                volunteer, coach = find_person_by_phone(phone_number)
+    else:
+        log.warning("[WEBHOOK] Unknown from format: %s", from_field)
+        return {'status': 'error', 'reason': 'unknown from format'}, 200
 
-        # Rate limiting (use chat_id as key)
-        if is_rate_limited(chat_id):
-            print(f"[WEBHOOK] Rate limited: {chat_id}", flush=True)
-            return jsonify({'status': 'rate_limited'}), 429
-        
-        person_label = (
-            f"vol={volunteer.first_name} {volunteer.last_name}"
-            if volunteer
-            else f"coach={coach.first_name} {coach.last_name}"
+    trace.mark('identify')
+    trace.fields['sender'] = 'volunteer' if volunteer else ('coach' if coach else None)
+
+    if not volunteer and not coach:
+        log.debug("[WEBHOOK] Unknown sender, ignoring: %s", from_field)
+        return {'status': 'ignored', 'reason': 'unknown sender'}, 200
+
+    # Rate limiting (use chat_id as key)
+    if is_rate_limited(chat_id):
+        log.warning("[WEBHOOK] Rate limited: %s", chat_id)
+        return {'status': 'rate_limited'}, 429
+    
+    if debug:
+        person = volunteer or coach
+        log.debug(
+            "[WEBHOOK] Processing: %s %s, msg=%.50s",
+            person.first_name, person.last_name, message_body,
         )
-        print(f"[WEBHOOK] Processing: {person_label}, msg={message_body[:50]}", flush=True)
-
-        # Coaches only get AI/help — no booking confirm/cancel flow
-        if coach and not volunteer:
-            intent = detect_intent(message_body)
-            if intent:
-                send_whatsapp_message(
-                    '',
-                    "Ten bot służy wolontariuszom do potwierdzania udziału w treningach "
-                    "(POTWIERDZAM / REZYGNUJĘ).\n\n"
-                    "Jeśli potrzebujesz pomocy, napisz: treningi@widzimyinaczej.org.pl",
-                    chat_id=chat_id,
-                )
-                return jsonify({'status': 'ok', 'action': 'coach_command_hint'}), 200
-            send_unknown_response(chat_id, message_body, coach=coach)
-            return jsonify({'status': 'ok', 'action': 'coach_ai'}), 200
-
-        # Check if we're waiting for a selection from this user
-        if chat_id in _pending_selections:
-            bookings = _pending_selections[chat_id]
-            
-            # Try to parse number
+
+    # Coaches only get AI/help — no booking confirm/cancel flow
+    if coach and not volunteer:
+        intent = detect_intent(message_body)
+        trace.mark('intent')
+        trace.fields['intent'] = intent
+        _count_intent(intent)
+        if intent:
+            send_whatsapp_message(
+                '',
+                "Ten bot służy wolontariuszom do potwierdzania udziału w treningach "
+                "(POTWIERDZAM / REZYGNUJĘ).\n\n"
+                "Jeśli potrzebujesz pomocy, napisz: treningi@widzimyinaczej.org.pl",
+                chat_id=chat_id,
+                template='reply',
+            )
+            return {'status': 'ok', 'action': 'coach_command_hint'}, 200
+        send_unknown_response(chat_id, message_body, coach=coach)
+        return {'status': 'ok', 'action': 'coach_ai'}, 200
+
+    # Check if we're waiting for a selection from this user
+    if chat_id in _pending_selections:
+        bookings = _pending_selections[chat_id]
+        
+        # Try to parse number
+        try:
+            selection = int(message_body.strip())
+            if 1 <= selection <= len(bookings):
+                booking = bookings[selection - 1]
+                booking.is_confirmed = True
+                db.session.commit()
+                send_confirmation_response(chat_id, booking)
+                del _pending_selections[chat_id]
+                return {'status': 'ok', 'action': 'confirmed_selection'}, 200
+        except ValueError:
+            pass
+        
+        # Check for cancel with number
+        cancel_match = re.search(r'rezygnuj\w*\s+z?\s*(\d+)', message_body.lower())
+        if cancel_match:
             try:
-                selection = int(message_body.strip())
+                selection = int(cancel_match.group(1))
                 if 1 <= selection <= len(bookings):
                     booking = bookings[selection - 1]
-                    booking.is_confirmed = True
-                    db.session.commit()
-                    send_confirmation_response(chat_id, booking)
-                    del _pending_selections[chat_id]
-                    return jsonify({'status': 'ok', 'action': 'confirmed_selection'}), 200
-            except ValueError:
-                pass
-            
-            # Check for cancel with number
-            cancel_match = re.search(r'rezygnuj\w*\s+z?\s*(\d+)', message_body.lower())
-            if cancel_match:
-                try:
-                    selection = int(cancel_match.group(1))
-                    if 1 <= selection <= len(bookings):
-                        booking = bookings[selection - 1]
-                        training = booking.training
-                        was_confirmed = booking.is_confirmed is True
-                        vol_name = f"{volunteer.first_name} {volunteer.last_name}"
-                        # Capture coach info before delete
-                        coach_info = None
-                        if was_confirmed and training.coach and training.coach.phone_number:
-                            coach_info = {
-                                'phone': training.coach.phone_number,
-                                'name': f"{training.coach.first_name} {training.coach.last_name}",
-                                'date': training.date.strftime('%Y-%m-%d %H:%M'),
-                                'location': training.location.name,
-                            }
-                        send_cancellation_response(chat_id, booking)
-                        db.session.delete(booking)
-                        db.session.commit()
-                        if coach_info:
-                            notify_coach_volunteer_canceled(
-                                coach_phone=coach_info['phone'],
-                                coach_name=coach_info['name'],
-                                volunteer_name=vol_name,
-                                training_date=coach_info['date'],
-                                training_location=coach_info['location'],
-                            )
-                        del _pending_selections[chat_id]
-                        return jsonify({'status': 'ok', 'action': 'cancelled_selection'}), 200
-                except ValueError:
-                    pass
-            
-            # Check for "rezygnuję ze wszystkich" — cancel ALL pending bookings
-            if re.search(r'rezygnuj\w*\s+ze\s+wszystk|cancel|rezygnuj[eę]', message_body.lower()):
-                vol_name = f"{volunteer.first_name} {volunteer.last_name}"
-                for bk in bookings:
-                    training = bk.training
-                    was_confirmed = bk.is_confirmed is True
+                    training = booking.training
+                    was_confirmed = booking.is_confirmed is True
+                    vol_name = f"{volunteer.first_name} {volunteer.last_name}"
+                    # Capture coach info before delete
                     coach_info = None
                     if was_confirmed and training.coach and training.coach.phone_number:
                         coach_info = {
@@ -596,8 +671,8 @@ def whatsapp_webhook():
                             'date': training.date.strftime('%Y-%m-%d %H:%M'),
                             'location': training.location.name,
                         }
-                    send_cancellation_response(chat_id, bk)
-                    db.session.delete(bk)
+                    send_cancellation_response(chat_id, booking)
+                    db.session.delete(booking)
                     db.session.commit()
                     if coach_info:
                         notify_coach_volunteer_canceled(
@@ -607,162 +682,185 @@ def whatsapp_webhook():
                             training_date=coach_info['date'],
                             training_location=coach_info['location'],
                         )
-                del _pending_selections[chat_id]
-                return jsonify({'status': 'ok', 'action': 'cancelled_all_selection'}), 200
-            
-            # Didn't understand, repeat the selection prompt
-            send_selection_prompt(chat_id, bookings)
-            return jsonify({'status': 'ok', 'action': 'selection_repeated'}), 200
+                    del _pending_selections[chat_id]
+                    return {'status': 'ok', 'action': 'cancelled_selection'}, 200
+            except ValueError:
+                pass
         
-        # Detect intent
-        intent = detect_intent(message_body)
-        print(f"[WEBHOOK] Intent: {intent}", flush=True)
+        # Check for "rezygnuję ze wszystkich" — cancel ALL pending bookings
+        if re.search(r'rezygnuj\w*\s+ze\s+wszystk|cancel|rezygnuj[eę]', message_body.lower()):
+            vol_name = f"{volunteer.first_name} {volunteer.last_name}"
+            for bk in bookings:
+                training = bk.training
+                was_confirmed = bk.is_confirmed is True
+                coach_info = None
+                if was_confirmed and training.coach and training.coach.phone_number:
+                    coach_info = {
+                        'phone': training.coach.phone_number,
+                        'name': f"{training.coach.first_name} {training.coach.last_name}",
+                        'date': training.date.strftime('%Y-%m-%d %H:%M'),
+                        'location': training.location.name,
+                    }
+                send_cancellation_response(chat_id, bk)
+                db.session.delete(bk)
+                db.session.commit()
+                if coach_info:
+                    notify_coach_volunteer_canceled(
+                        coach_phone=coach_info['phone'],
+                        coach_name=coach_info['name'],
+                        volunteer_name=vol_name,
+                        training_date=coach_info['date'],
+                        training_location=coach_info['location'],
+                    )
+            del _pending_selections[chat_id]
+            return {'status': 'ok', 'action': 'cancelled_all_selection'}, 200
         
-        if not intent:
-            print(f"[WEBHOOK] No intent detected, calling AI...", flush=True)
-            send_unknown_response(chat_id, message_body, volunteer)
-            print(f"[WEBHOOK] AI response sent", flush=True)
-            return jsonify({'status': 'ok', 'action': 'unknown'}), 200
+        # Didn't understand, repeat the selection prompt
+        send_selection_prompt(chat_id, bookings)
+        return {'status': 'ok', 'action': 'selection_repeated'}, 200
+    
+    # Detect intent
+    intent = detect_intent(message_body)
+    trace.mark('intent')
+    trace.fields['intent'] = intent
+    _count_intent(intent)
+    
+    if not intent:
+        send_unknown_response(chat_id, message_body, volunteer)
+        return {'status': 'ok', 'action': 'unknown'}, 200
+    
+    # --- Helper: delete booking + optionally notify coach ---
+    def _cancel_booking(bk: Booking):
+        """Delete a booking. Notify coach only if volunteer had confirmed."""
+        training = bk.training
+        was_confirmed = bk.is_confirmed is True
+        vol_name = f"{volunteer.first_name} {volunteer.last_name}"
         
-        # --- Helper: delete booking + optionally notify coach ---
-        def _cancel_booking(bk: Booking):
-            """Delete a booking. Notify coach only if volunteer had confirmed."""
-            training = bk.training
-            was_confirmed = bk.is_confirmed is True
-            vol_name = f"{volunteer.first_name} {volunteer.last_name}"
-            
-            # Capture info for coach notification BEFORE deleting
-            coach_info = None
-            if was_confirmed and training.coach and training.coach.phone_number:
-                coach_info = {
-                    'phone': training.coach.phone_number,
-                    'name': f"{training.coach.first_name} {training.coach.last_name}",
-                    'date': training.date.strftime('%Y-%m-%d %H:%M'),
-                    'location': training.location.name,
-                }
-            
-            # Send cancellation WA message BEFORE delete (needs relationships)
-            send_cancellation_response(chat_id, bk)
-            
-            db.session.delete(bk)
-            db.session.commit()
-            
-            # Notify coach only if volunteer had already confirmed
-            if coach_info:
-                notify_coach_volunteer_canceled(
-                    coach_phone=coach_info['phone'],
-                    coach_name=coach_info['name'],
-                    volunteer_name=vol_name,
-                    training_date=coach_info['date'],
-                    training_location=coach_info['location'],
-                )
+        # Capture info for coach notification BEFORE deleting
+        coach_info = None
+        if was_confirmed and training.coach and training.coach.phone_number:
+            coach_info = {
+                'phone': training.coach.phone_number,
+                'name': f"{training.coach.first_name} {training.coach.last_name}",
+                'date': training.date.strftime('%Y-%m-%d %H:%M'),
+                'location': training.location.name,
+            }
+        
+        # Send cancellation WA message BEFORE delete (needs relationships)
+        send_cancellation_response(chat_id, bk)
         
-        # --- Cancel flow: use ALL future bookings ---------------------
-        is_cancel = intent and ('cancel' in intent)
+        db.session.delete(bk)
+        db.session.commit()
         
-        if is_cancel:
-            cancel_bookings = get_pending_bookings(volunteer, for_cancel=True)
-            if not cancel_bookings:
-                send_no_booking_response(chat_id, intent='cancel')
-                return jsonify({'status': 'ok', 'action': 'no_booking'}), 200
-            
-            # cancel_N — specific booking
-            num_match = re.match(r'cancel_(\d+)', intent)
-            if num_match:
-                idx = int(num_match.group(1))
-                if 1 <= idx <= len(cancel_bookings):
-                    _cancel_booking(cancel_bookings[idx - 1])
-                    return jsonify({'status': 'ok', 'action': f'cancel_{idx}'}), 200
-                _pending_selections[chat_id] = cancel_bookings
-                send_selection_prompt(chat_id, cancel_bookings, cancel_mode=True)
-                return jsonify({'status': 'ok', 'action': 'bad_number'}), 200
-            
-            # Single booking — cancel immediately
-            if len(cancel_bookings) == 1:
-                _cancel_booking(cancel_bookings[0])
-                return jsonify({'status': 'ok', 'action': 'cancelled'}), 200
-            
-            # Multiple bookings — ask which one
+        # Notify coach only if volunteer had already confirmed
+        if coach_info:
+            notify_coach_volunteer_canceled(
+                coach_phone=coach_info['phone'],
+                coach_name=coach_info['name'],
+                volunteer_name=vol_name,
+                training_date=coach_info['date'],
+                training_location=coach_info['location'],
+            )
+    
+    # --- Cancel flow: use ALL future bookings ---------------------
+    is_cancel = intent and ('cancel' in intent)
+    
+    if is_cancel:
+        cancel_bookings = get_pending_bookings(volunteer, for_cancel=True)
+        if not cancel_bookings:
+            send_no_booking_response(chat_id, intent='cancel')
+            return {'status': 'ok', 'action': 'no_booking'}, 200
+        
+        # cancel_N — specific booking
+        num_match = re.match(r'cancel_(\d+)', intent)
+        if num_match:
+            idx = int(num_match.group(1))
+            if 1 <= idx <= len(cancel_bookings):
+                _cancel_booking(cancel_bookings[idx - 1])
+                return {'status': 'ok', 'action': f'cancel_{idx}'}, 200
             _pending_selections[chat_id] = cancel_bookings
             send_selection_prompt(chat_id, cancel_bookings, cancel_mode=True)
-            return jsonify({'status': 'ok', 'action': 'selection_requested'}), 200
+            return {'status': 'ok', 'action': 'bad_number'}, 200
         
-        # --- Confirm flow: today + tomorrow only ----------------------
-        pending_bookings = get_pending_bookings(volunteer)
+        # Single booking — cancel immediately
+        if len(cancel_bookings) == 1:
+            _cancel_booking(cancel_bookings[0])
+            return {'status': 'ok', 'action': 'cancelled'}, 200
         
-        if not pending_bookings:
-            # Check if volunteer has already-confirmed upcoming bookings
-            now_utc = datetime.now(timezone.utc)
-            tomorrow_end = datetime.combine((now_utc.date() + timedelta(days=1)), datetime.max.time()).replace(tzinfo=timezone.utc)
-            already_confirmed = Booking.query.join(Training).filter(
-                Booking.volunteer_id == volunteer.id,
-                Booking.is_confirmed.is_(True),
-                Training.date >= now_utc,
-                Training.date <= tomorrow_end,
-                Training.is_canceled.is_(False),
-                Training.is_deleted.is_(False),
-            ).order_by(Training.date).all()
-            if already_confirmed:
-                # Build a friendly "already confirmed" message
-                if len(already_confirmed) == 1:
-                    t = already_confirmed[0].training
-                    today_date = now_utc.date()
+        # Multiple bookings — ask which one
+        _pending_selections[chat_id] = cancel_bookings
+        send_selection_prompt(chat_id, cancel_bookings, cancel_mode=True)
+        return {'status': 'ok', 'action': 'selection_requested'}, 200
+    
+    # --- Confirm flow: today + tomorrow only ----------------------
+    pending_bookings = get_pending_bookings(volunteer)
+    
+    if not pending_bookings:
+        # Check if volunteer has already-confirmed upcoming bookings
+        now_utc = datetime.now(timezone.utc)
+        tomorrow_end = datetime.combine((now_utc.date() + timedelta(days=1)), datetime.max.time()).replace(tzinfo=timezone.utc)
+        already_confirmed = Booking.query.join(Training).filter(
+            Booking.volunteer_id == volunteer.id,
+            Booking.is_confirmed.is_(True),
+            Training.date >= now_utc,
+            Training.date <= tomorrow_end,
+            Training.is_canceled.is_(False),
+            Training.is_deleted.is_(False),
+        ).order_by(Training.date).all()
+        if already_confirmed:
+            # Build a friendly "already confirmed" message
+            if len(already_confirmed) == 1:
+                t = already_confirmed[0].training
+                today_date = now_utc.date()
+                training_date = t.date.date() if hasattr(t.date, 'date') else t.date
+                day_word = "dzisiaj" if training_date == today_date else "jutro"
+                msg = (
+                    f"✅ Jesteś już potwierdzony/a na trening {day_word} o {t.date.strftime('%H:%M')}!\n"
+                    f"📍 {t.location.name}\n"
+                    f"👨\u200d🏫 Trener: {t.coach.first_name} {t.coach.last_name}"
+                )
+            else:
+                lines = ["✅ Jesteś już potwierdzony/a na:\n"]
+                today_date = now_utc.date()
+                for bk in already_confirmed:
+                    t = bk.training
                     training_date = t.date.date() if hasattr(t.date, 'date') else t.date
                     day_word = "dzisiaj" if training_date == today_date else "jutro"
-                    msg = (
-                        f"✅ Jesteś już potwierdzony/a na trening {day_word} o {t.date.strftime('%H:%M')}!\n"
-                        f"📍 {t.location.name}\n"
-                        f"👨\u200d🏫 Trener: {t.coach.first_name} {t.coach.last_name}"
-                    )
-                else:
-                    lines = ["✅ Jesteś już potwierdzony/a na:\n"]
-                    today_date = now_utc.date()
-                    for bk in already_confirmed:
-                        t = bk.training
-                        training_date = t.date.date() if hasattr(t.date, 'date') else t.date
-                        day_word = "dzisiaj" if training_date == today_date else "jutro"
-                        lines.append(f"🕐 {day_word} {t.date.strftime('%H:%M')} — {t.location.name}")
-                    msg = "\n".join(lines)
-                send_whatsapp_message('', msg, chat_id=chat_id)
-                return jsonify({'status': 'ok', 'action': 'already_confirmed'}), 200
-            send_no_booking_response(chat_id)
-            return jsonify({'status': 'ok', 'action': 'no_booking'}), 200
-        
-        # confirm_N — specific booking
-        num_match = re.match(r'confirm_(\d+)', intent or '')
-        if num_match:
-            idx = int(num_match.group(1))
-            if 1 <= idx <= len(pending_bookings):
-                bk = pending_bookings[idx - 1]
-                bk.is_confirmed = True
-                db.session.commit()
-                send_confirmation_response(chat_id, bk)
-                return jsonify({'status': 'ok', 'action': f'confirm_{idx}'}), 200
-            _pending_selections[chat_id] = pending_bookings
-            send_selection_prompt(chat_id, pending_bookings)
-            return jsonify({'status': 'ok', 'action': 'bad_number'}), 200
-
-        # Handle single booking
-        if len(pending_bookings) == 1:
-            booking = pending_bookings[0]
-            booking.is_confirmed = True
+                    lines.append(f"🕐 {day_word} {t.date.strftime('%H:%M')} — {t.location.name}")
+                msg = "\n".join(lines)
+            send_whatsapp_message('', msg, chat_id=chat_id, template='reply')
+            return {'status': 'ok', 'action': 'already_confirmed'}, 200
+        send_no_booking_response(chat_id)
+        return {'status': 'ok', 'action': 'no_booking'}, 200
+    
+    # confirm_N — specific booking
+    num_match = re.match(r'confirm_(\d+)', intent or '')
+    if num_match:
+        idx = int(num_match.group(1))
+        if 1 <= idx <= len(pending_bookings):
+            bk = pending_bookings[idx - 1]
+            bk.is_confirmed = True
             db.session.commit()
-            send_confirmation_response(chat_id, booking)
-            return jsonify({'status': 'ok', 'action': 'confirmed'}), 200
-        
-        # Multiple bookings — confirm all
-        for booking in pending_bookings:
-            booking.is_confirmed = True
+            send_confirmation_response(chat_id, bk)
+            return {'status': 'ok', 'action': f'confirm_{idx}'}, 200
+        _pending_selections[chat_id] = pending_bookings
+        send_selection_prompt(chat_id, pending_bookings)
+        return {'status': 'ok', 'action': 'bad_number'}, 200
+
+    # Handle single booking
+    if len(pending_bookings) == 1:
+        booking = pending_bookings[0]
+        booking.is_confirmed = True
         db.session.commit()
-        send_confirmation_response(chat_id, pending_bookings)
-        return jsonify({'status': 'ok', 'action': 'confirmed_all'}), 200
-        
-    except Exception as e:
-        import traceback
-        print(f"[WEBHOOK] EXCEPTION: {e}", flush=True)
-        traceback.print_exc()
-        current_app.logger.exception(f"Error processing WhatsApp webhook: {e}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        send_confirmation_response(chat_id, booking)
+        return {'status': 'ok', 'action': 'confirmed'}, 200
+    
+    # Multiple bookings — confirm all
+    for booking in pending_bookings:
+        booking.is_confirmed = True
+    db.session.commit()
+    send_confirmation_response(chat_id, pending_bookings)
+    return {'status': 'ok', 'action': 'confirmed_all'}, 200
 
 
 @webhook_bp.route('/whatsapp', methods=['GET'])
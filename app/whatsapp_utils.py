@@ -11,14 +11,18 @@ Configuration environment variables:
 
 import re
 import threading
+import time
 from collections import OrderedDict
 from contextlib import contextmanager
 from contextvars import ContextVar
-from datetime import datetime as _dt
-from flask import current_app
+from datetime import datetime as _dt, timezone
+from flask import current_app, has_request_context
 import requests
 from typing import Iterator, Optional
 
+from .instrumentation import track_http
+from .metrics import PENDING_SIGNUPS, WHATSAPP_MESSAGES
+
 
 # Max length for user-provided text in WhatsApp messages
 MAX_NAME_LENGTH = 100
@@ -70,6 +74,7 @@ MILESTONE_COUNTS = [5, 10, 15, 20, 25, 30, 40, 50, 75, 100]
 # In-memory pending signups: volunteer_id -> {timer, trainings: [...], app_context_data}
 _pending_signups: dict[int, dict] = {}
 _pending_lock = threading.Lock()
+PENDING_SIGNUPS.set_function(lambda: len(_pending_signups))
 
 # ── Message footer ───────────────────────────────────────────────
 _FOOTER = "🎾 *Fundacja Widzimy Inaczej*\n_System zapisów Blind Tenis_"
@@ -186,6 +191,78 @@ def get_waha_config() -> dict:
     }
 
 
+# @lid -> phone cache in front of the whatsapp_lid_mappings table
+LID_CACHE_TTL_SECONDS = 6 * 60 * 60
+LID_CACHE_MAX_ENTRIES = 2048
+_lid_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+_lid_lock = threading.Lock()
+
+
+def clear_lid_cache() -> None:
+    """Drop in-process @lid mappings (the DB table is left intact)."""
+    with _lid_lock:
+        _lid_cache.clear()
+
+
+def _lid_cache_put(lid: str, phone: str) -> None:
+    with _lid_lock:
+        _lid_cache[lid] = (time.monotonic() + LID_CACHE_TTL_SECONDS, phone)
+        _lid_cache.move_to_end(lid)
+        while len(_lid_cache) > LID_CACHE_MAX_ENTRIES:
+            _lid_cache.popitem(last=False)
+
+
+def lookup_lid_phone(lid: str) -> Optional[str]:
+    """Return the known phone (digits) for ``lid`` without calling WAHA."""
+    with _lid_lock:
+        entry = _lid_cache.get(lid)
+        if entry is not None:
+            expires_at, phone = entry
+            if expires_at > time.monotonic():
+                _lid_cache.move_to_end(lid)
+                return phone
+            del _lid_cache[lid]
+
+    from . import db
+    from .models import WhatsAppLidMapping
+
+    mapping = db.session.get(WhatsAppLidMapping, lid)
+    if mapping is None:
+        return None
+    _lid_cache_put(lid, mapping.phone)
+    return mapping.phone
+
+
+def remember_lid_phones(mappings: dict[str, str]) -> None:
+    """Store ``{lid: phone digits}`` in the cache and the DB (upsert)."""
+    if not mappings:
+        return
+    from . import db
+    from .models import WhatsAppLidMapping
+
+    now = _dt.now(timezone.utc)
+    try:
+        existing = {
+            row.lid: row
+            for row in WhatsAppLidMapping.query.filter(
+                WhatsAppLidMapping.lid.in_(list(mappings))
+            )
+        }
+        for lid, phone in mappings.items():
+            row = existing.get(lid)
+            if row is None:
+                db.session.add(WhatsAppLidMapping(lid=lid, phone=phone, updated_at=now))
+            elif row.phone != phone:
+                row.phone = phone
+                row.updated_at = now
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.warning("Failed to store @lid mappings: %s", exc)
+    for lid, phone in mappings.items():
+        _lid_cache_put(lid, phone)
+
+
 def send_whatsapp_message(
     phone: str,
     message: str,
@@ -194,6 +271,7 @@ def send_whatsapp_message(
     api_url: Optional[str] = None,
     session: Optional[str] = None,
     api_key: Optional[str] = None,
+    template: Optional[str] = None,
 ) -> tuple[bool, Optional[str]]:
     """Send a WhatsApp message using WAHA API.
     
@@ -204,9 +282,12 @@ def send_whatsapp_message(
         api_url: Override WAHA API URL
         session: Override WAHA session name
         api_key: Override WAHA API key
+        template: Template key stored in the message log
         
     Returns:
-        Tuple of (success, error_message)
+        Tuple of (success, error_message). Within a web request a message
+        that has to wait for the rate limit is handed to a timer thread and
+        counts as a success.
     """
     config = get_waha_config()
     api_url = api_url or config['api_url']
@@ -215,6 +296,7 @@ def send_whatsapp_message(
     
     if not api_url:
         current_app.logger.warning("WHATSAPP_API_URL not configured; skipping WhatsApp message")
+        WHATSAPP_MESSAGES.labels("skipped").inc()
         return True, None
 
     # Diagnostic / CLI --test: never message real volunteers by mistake
@@ -228,10 +310,15 @@ def send_whatsapp_message(
         phone = test_phone
         chat_id = None
 
+    from . import throttle
+    from .message_log import FAILED, record_message
+
     # Use provided chat_id (e.g. @lid) or build one from phone
     if not chat_id:
         normalized_phone = normalize_phone_number(phone)
         if not normalized_phone:
+            WHATSAPP_MESSAGES.labels("failed").inc()
+            record_message(phone or "", template, FAILED, error="Invalid phone number")
             return False, "Invalid phone number"
         # WAHA expects phone without + prefix for chatId
         chat_id = normalized_phone.lstrip('+') + '@c.us'
@@ -245,6 +332,39 @@ def send_whatsapp_message(
         'text': message,
         'session': session,
     }
+
+    wait = throttle.book_turn(chat_id)
+    if wait and has_request_context() and current_app.config.get("NOTIFICATIONS_ASYNC", True):
+        # Keep the web worker free; the message goes out when its slot starts
+        timer = threading.Timer(
+            wait,
+            _send_later,
+            args=[current_app._get_current_object(), api_url, headers, payload, template],
+        )
+        timer.daemon = True
+        timer.start()
+        current_app.logger.info("WhatsApp to %s deferred %.1fs by the rate limit", chat_id, wait)
+        return True, None
+    throttle.hold(chat_id, wait)
+    return _post_text(api_url, headers, payload, template)
+
+
+def _send_later(app, api_url: str, headers: dict, payload: dict, template: Optional[str]) -> None:
+    """Timer callback for a message whose rate-limit slot has started."""
+    with app.app_context():
+        try:
+            _post_text(api_url, headers, payload, template)
+        except Exception:
+            app.logger.exception("Deferred WhatsApp to %s failed", payload['chatId'])
+
+
+def _post_text(
+    api_url: str, headers: dict, payload: dict, template: Optional[str]
+) -> tuple[bool, Optional[str]]:
+    """POST ``payload`` to WAHA's sendText and record the outcome."""
+    from .message_log import FAILED, SENT, record_message, waha_message_id
+
+    chat_id = payload['chatId']
     
     try:
         current_app.logger.info(
@@ -253,24 +373,51 @@ def send_whatsapp_message(
             api_url,
         )
         
-        response = requests.post(
-            f'{api_url}/api/sendText',
-            json=payload,
-            headers=headers,
-            timeout=30,
-        )
+        started = time.perf_counter()
+        with track_http("waha"):
+            response = requests.post(
+                f'{api_url}/api/sendText',
+                json=payload,
+                headers=headers,
+                timeout=30,
+            )
+        latency_ms = round((time.perf_counter() - started) * 1000)
         
         if response.status_code in (200, 201):
             current_app.logger.info("WhatsApp message sent successfully")
+            WHATSAPP_MESSAGES.labels("sent").inc()
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            ack = body.get("ack") if isinstance(body, dict) else None
+            record_message(
+                chat_id,
+                template,
+                SENT,
+                latency_ms=latency_ms,
+                waha_id=waha_message_id(body),
+                ack=ack if isinstance(ack, int) else None,
+            )
             return True, None
         else:
             error_msg = f"WAHA API error: {response.status_code} - {response.text}"
             current_app.logger.error(error_msg)
+            WHATSAPP_MESSAGES.labels("failed").inc()
+            record_message(chat_id, template, FAILED, latency_ms=latency_ms, error=error_msg)
             return False, error_msg
             
     except requests.RequestException as exc:
         error_msg = f"WhatsApp sending failed: {exc}"
         current_app.logger.exception(error_msg)
+        WHATSAPP_MESSAGES.labels("failed").inc()
+        record_message(
+            chat_id,
+            template,
+            FAILED,
+            latency_ms=round((time.perf_counter() - started) * 1000),
+            error=error_msg,
+        )
         return False, error_msg
 
 
@@ -326,7 +473,7 @@ def notify_coach_volunteer_canceled(
         .replace("{data}", _polish_date(training_date))
         .replace("{miejsce}", training_location)
     )
-    return send_whatsapp_message(coach_phone, message)
+    return send_whatsapp_message(coach_phone, message, template="coach_volunteer_canceled")
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -369,7 +516,7 @@ def notify_volunteer_reminder(
         .replace("{trener}", coach_name)
         .replace("{telefon}", formatted_coach_phone)
     )
-    return send_whatsapp_message(volunteer_phone, message)
+    return send_whatsapp_message(volunteer_phone, message, template="volunteer_reminder")
 
 
 def notify_volunteer_reminder_multi(
@@ -409,7 +556,9 @@ def notify_volunteer_reminder_multi(
         lines.append("❌ REZYGNUJĘ — nie mogę")
     lines.append(f"\n{_FOOTER}")
 
-    return send_whatsapp_message(volunteer_phone, "\n".join(lines))
+    return send_whatsapp_message(
+        volunteer_phone, "\n".join(lines), template="volunteer_reminder_multi"
+    )
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -423,6 +572,16 @@ def notify_volunteer_training_canceled(
     training_location: str,
 ) -> tuple[bool, Optional[str]]:
     """Notify a volunteer that their training has been canceled."""
+    message = training_canceled_message(volunteer_name, training_date, training_location)
+    return send_whatsapp_message(volunteer_phone, message, template="training_canceled")
+
+
+def training_canceled_message(
+    volunteer_name: str,
+    training_date: str,
+    training_location: str,
+) -> str:
+    """Render the ``training_canceled`` WhatsApp template."""
     volunteer_name = sanitize_for_whatsapp(volunteer_name, MAX_NAME_LENGTH)
     training_location = sanitize_for_whatsapp(training_location, MAX_LOCATION_LENGTH)
 
@@ -436,13 +595,12 @@ def notify_volunteer_training_canceled(
         + _FOOTER
     )
     body = _get_template_body("training_canceled", default)
-    message = (
+    return (
         body
         .replace("{imię}", volunteer_name)
         .replace("{data}", _polish_date(training_date))
         .replace("{miejsce}", training_location)
     )
-    return send_whatsapp_message(volunteer_phone, message)
 
 
 def notify_volunteer_training_time_changed(
@@ -454,6 +612,24 @@ def notify_volunteer_training_time_changed(
     training_location: str,
 ) -> tuple[bool, Optional[str]]:
     """Notify a volunteer that their training time has been changed."""
+    message = training_time_changed_message(
+        volunteer_name,
+        training_old_time,
+        training_new_time,
+        training_date,
+        training_location,
+    )
+    return send_whatsapp_message(volunteer_phone, message, template="time_changed")
+
+
+def training_time_changed_message(
+    volunteer_name: str,
+    training_old_time: str,
+    training_new_time: str,
+    training_date: str,
+    training_location: str,
+) -> str:
+    """Render the ``time_changed`` WhatsApp template."""
     volunteer_name = sanitize_for_whatsapp(volunteer_name, MAX_NAME_LENGTH)
     training_location = sanitize_for_whatsapp(training_location, MAX_LOCATION_LENGTH)
 
@@ -471,7 +647,7 @@ def notify_volunteer_training_time_changed(
         + _FOOTER
     )
     body = _get_template_body("time_changed", default)
-    message = (
+    return (
         body
         .replace("{imię}", volunteer_name)
         .replace("{data}", _polish_date(training_date))
@@ -479,7 +655,37 @@ def notify_volunteer_training_time_changed(
         .replace("{nowa_godzina}", training_new_time)
         .replace("{miejsce}", training_location)
     )
-    return send_whatsapp_message(volunteer_phone, message)
+
+
+def training_changes_message(volunteer_name: str, changes: list[dict]) -> str:
+    """Render one message listing changes to several trainings.
+
+    Each entry in *changes* has ``date`` (``'YYYY-MM-DD HH:MM'``, after the
+    change) and ``location``, plus ``old_date`` and/or ``old_location``
+    when that field changed.
+    """
+    volunteer_name = sanitize_for_whatsapp(volunteer_name, MAX_NAME_LENGTH)
+
+    lines = [
+        "📝 *Zmiany w Twoich treningach*\n",
+        f"Cześć {volunteer_name}! 👋\n",
+        "Zmieniły się szczegóły treningów, na które jesteś zapisany:\n",
+    ]
+    for i, change in enumerate(changes, 1):
+        date_line = f"*{i}.* 📅 {_polish_date(change['date'])}"
+        if change.get('old_date'):
+            date_line += f" (było: {_polish_date(change['old_date'])})"
+        loc = sanitize_for_whatsapp(change['location'], MAX_LOCATION_LENGTH)
+        location_line = f"   📍 {loc}"
+        if change.get('old_location'):
+            old_loc = sanitize_for_whatsapp(change['old_location'], MAX_LOCATION_LENGTH)
+            location_line += f" (było: {old_loc})"
+        lines.append(f"{date_line}\n{location_line}")
+
+    lines.append("")
+    lines.append("Jeśli któryś termin Ci nie pasuje, wypisz się z niego na stronie zapisów.")
+    lines.append(f"\n{_FOOTER}")
+    return "\n".join(lines)
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -532,7 +738,7 @@ def notify_volunteer_signup_confirmation(
         .replace("{powracajacy}", returning_line)
         .replace("{kamien_milowy}", milestone)
     )
-    return send_whatsapp_message(volunteer_phone, message)
+    return send_whatsapp_message(volunteer_phone, message, template="signup_confirmation")
 
 
 def notify_volunteer_signup_confirmation_multi(
@@ -600,7 +806,9 @@ def notify_volunteer_signup_confirmation_multi(
     lines.append("\n📧 Sprawdź e-mail — wysłaliśmy szczegóły i dokumenty.")
     lines.append(f"\nDo zobaczenia! 👋\n\n{_FOOTER}")
 
-    return send_whatsapp_message(volunteer_phone, "\n".join(lines))
+    return send_whatsapp_message(
+        volunteer_phone, "\n".join(lines), template="signup_confirmation_multi"
+    )
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -701,10 +909,10 @@ def _send_signup_email(
 
     Must be called within an app context.
     """
-    from .models import EmailSettings, StoredFile
+    from .models import EmailSettings
     from . import email_utils
+    from .attachments import registration_attachments
     from .template_utils import render_template_string
-    from pathlib import Path
 
     settings = EmailSettings.query.first()
     if not settings or not settings.registration_template:
@@ -734,40 +942,12 @@ def _send_signup_email(
 
     html_body = render_template_string(settings.registration_template, data)
 
-    # Load attachments (once, regardless of how many trainings)
-    attachments: list[tuple[str, str, bytes]] = []
+    # Encoded parts come from the attachment cache (once per file, not per email)
     attachments_meta = (
         settings.registration_files_adult if is_adult
         else settings.registration_files_minor
     ) or []
-
-    legacy_ids = [entry for entry in attachments_meta if isinstance(entry, int)]
-    if legacy_ids:
-        stored_files = StoredFile.query.filter(StoredFile.id.in_(legacy_ids)).all()
-        stored_by_id = {f.id: f for f in stored_files}
-        for file_id in legacy_ids:
-            sf = stored_by_id.get(file_id)
-            if sf:
-                attachments.append((sf.filename, sf.content_type, sf.data))
-
-    attachments_dir = Path(current_app.instance_path) / "attachments"
-    for entry in attachments_meta:
-        if not isinstance(entry, dict):
-            continue
-        stored_name = entry.get("stored_name")
-        if not stored_name:
-            continue
-        file_path = attachments_dir / stored_name
-        try:
-            file_data = file_path.read_bytes()
-        except OSError:
-            current_app.logger.warning(
-                "Attachment file %s referenced in settings is missing", file_path,
-            )
-            continue
-        filename = entry.get("original_name") or entry.get("filename") or stored_name
-        content_type = entry.get("content_type") or "application/octet-stream"
-        attachments.append((filename, content_type, file_data))
+    attachments = registration_attachments(attachments_meta)
 
     success, error = email_utils.send_email(
         "Potwierdzenie zgłoszenia",
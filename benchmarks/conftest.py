@@ -0,0 +1,213 @@
+"""Fixtures for the benchmark suite.
+
+Run with ``python -m pytest benchmarks``. Benchmarks use the
+``benchmark`` fixture from pytest-benchmark when it is installed; otherwise
+a small built-in replacement with the same call style is used, and results
+are compared against ``benchmarks/baseline.json`` (``--bench-save`` rewrites
+it). Nothing leaves the machine: WAHA and SMTP are served by the local
+fakes in :mod:`benchmarks.fakes` and Gemini is not configured.
+"""
+
+import json
+import platform
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+
+from app import create_app, db
+
+from .datagen import Scale, populate
+from .fakes import FakeSmtp, FakeWaha
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+try:
+    import pytest_benchmark  # noqa: F401
+    HAVE_PYTEST_BENCHMARK = True
+except ImportError:
+    HAVE_PYTEST_BENCHMARK = False
+
+_results: dict[str, dict] = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench", "treningi benchmarks")
+    group.addoption("--bench-scale", type=float, default=1.0,
+                    help="Multiply the synthetic dataset size (default 1.0).")
+    group.addoption("--bench-rounds", type=int, default=5,
+                    help="Timed rounds per benchmark (built-in runner).")
+    group.addoption("--bench-save", action="store_true",
+                    help="Write results to benchmarks/baseline.json.")
+    group.addoption("--bench-tolerance", type=float, default=1.5,
+                    help="Slowdown ratio against the baseline reported as a regression.")
+    group.addoption("--bench-fail", action="store_true",
+                    help="Exit non-zero when a regression is found.")
+
+
+@pytest.fixture(scope="session")
+def bench_scale(pytestconfig) -> Scale:
+    return Scale().scaled(pytestconfig.getoption("--bench-scale"))
+
+
+@pytest.fixture(scope="session")
+def fake_waha():
+    with FakeWaha() as waha:
+        yield waha
+
+
+@pytest.fixture(scope="session")
+def fake_smtp():
+    with FakeSmtp() as smtp:
+        yield smtp
+
+
+@pytest.fixture(scope="session")
+def bench_app(tmp_path_factory, bench_scale, fake_waha, fake_smtp):
+    mp = pytest.MonkeyPatch()
+    db_path = tmp_path_factory.mktemp("bench") / "bench.sqlite3"
+    # Integrations point at local fakes, so the full send path is measured
+    waha, smtp = fake_waha, fake_smtp
+    mp.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{db_path}")
+    mp.setenv("ADMIN_PASSWORD", "secret")
+    mp.setenv("SLOW_QUERY_MS", "0")
+    mp.setenv("WHATSAPP_API_URL", waha.url)
+    # The fake WAHA cannot ban anyone; measure the send path, not the pacing
+    mp.setenv("WHATSAPP_RATE_PER_MINUTE", "0")
+    mp.setenv("WHATSAPP_RECIPIENT_SPACING", "0")
+    mp.setenv("SMTP_HOST", smtp.host)
+    mp.setenv("SMTP_PORT", str(smtp.port))
+    mp.setenv("SMTP_ENCRYPTION", "none")
+    for name in ("WHATSAPP_API_KEY", "SMTP_USERNAME", "SMTP_PASSWORD",
+                 "GEMINI_API_KEY", "NPLUSONE_MODE", "LOG_LEVEL"):
+        mp.delenv(name, raising=False)
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        app.config["BENCH_COUNTS"] = populate(bench_scale)
+    yield app
+    mp.undo()
+
+
+@pytest.fixture
+def admin_client(bench_app):
+    client = bench_app.test_client()
+    client.post("/admin/login", data={"password": "secret"})
+    return client
+
+
+class _Benchmark:
+    """Minimal stand-in for pytest-benchmark's ``benchmark`` fixture."""
+
+    def __init__(self, name: str, rounds: int):
+        self.name = name
+        self.rounds = rounds
+        self.stats: dict | None = None
+
+    def _record(self, timings: list[float]) -> None:
+        self.stats = {
+            "rounds": len(timings),
+            "min_ms": min(timings) * 1000,
+            "median_ms": statistics.median(timings) * 1000,
+            "mean_ms": statistics.fmean(timings) * 1000,
+        }
+        _results[self.name] = self.stats
+
+    def __call__(self, target, *args, **kwargs):
+        result = target(*args, **kwargs)  # warm-up
+        timings = []
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            result = target(*args, **kwargs)
+            timings.append(time.perf_counter() - started)
+        self._record(timings)
+        return result
+
+    def pedantic(self, target, args=(), kwargs=None, setup=None, rounds=1,
+                 warmup_rounds=0, iterations=1):
+        timings = []
+        result = None
+        for index in range(warmup_rounds + rounds):
+            call_args, call_kwargs = args, kwargs or {}
+            if setup is not None:
+                prepared = setup()
+                if prepared is not None:
+                    call_args, call_kwargs = prepared
+            started = time.perf_counter()
+            for _ in range(iterations):
+                result = target(*call_args, **call_kwargs)
+            if index >= warmup_rounds:
+                timings.append((time.perf_counter() - started) / iterations)
+        self._record(timings)
+        return result
+
+
+if not HAVE_PYTEST_BENCHMARK:
+
+    @pytest.fixture
+    def benchmark(request, pytestconfig):
+        return _Benchmark(request.node.name, pytestconfig.getoption("--bench-rounds"))
+
+
+def _load_baseline() -> dict:
+    if not BASELINE_PATH.exists():
+        return {}
+    return json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not _results:
+        return
+    scale = config.getoption("--bench-scale")
+    tolerance = config.getoption("--bench-tolerance")
+    baseline = _load_baseline()
+    comparable = baseline.get("scale") == scale
+    reference = baseline.get("results", {}) if comparable else {}
+
+    lines = []
+    if baseline and not comparable:
+        lines.append(f"baseline was recorded at scale {baseline.get('scale')}; not comparing")
+    regressions = []
+    for name in sorted(_results):
+        median = _results[name]["median_ms"]
+        line = f"{name:<55} {median:10.2f}"
+        previous = reference.get(name, {}).get("median_ms")
+        if previous:
+            ratio = median / previous
+            line += f"   baseline {previous:10.2f}   x{ratio:.2f}"
+            if ratio > tolerance:
+                line += "   REGRESSION"
+                regressions.append(name)
+        lines.append(line)
+
+    if config.getoption("--bench-save"):
+        BASELINE_PATH.write_text(
+            json.dumps(
+                {
+                    "scale": scale,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": {name: _results[name] for name in sorted(_results)},
+                },
+                indent=2,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        lines.append(f"baseline written to {BASELINE_PATH}")
+    config._bench_summary = lines
+    if regressions and config.getoption("--bench-fail"):
+        session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    lines = getattr(config, "_bench_summary", None)
+    if not lines:
+        return
+    terminalreporter.section("benchmarks (median ms)")
+    for line in lines:
+        terminalreporter.write_line(line)
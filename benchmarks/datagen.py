@@ -0,0 +1,199 @@
+"""Synthetic data for benchmarks.
+
+``populate`` fills the current app's database with a deterministic dataset
+of the requested size using bulk inserts, so even large datasets take a
+few seconds to build. Must be called inside an app context.
+"""
+
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+
+from app import db
+from app.models import (
+    Booking,
+    Coach,
+    EmailSettings,
+    Location,
+    Training,
+    TrainingSeries,
+    Volunteer,
+    build_series_key,
+)
+
+FIRST_NAMES = ["Anna", "Jan", "Ewa", "Piotr", "Kasia", "Marek", "Ola", "Tomek", "Ula", "Adam"]
+LAST_NAMES = ["Nowak", "Kowalska", "Wiśniewski", "Wójcik", "Lewandowska", "Zieliński"]
+
+# Replies as volunteers actually type them: accents, typos, numbers, chatter
+REPLY_CORPUS = [
+    "TAK", "tak", "Tak!", "potwierdzam", "Potwierdzam obecność", "będę", "bede",
+    "ok będę na pewno", "tak 2", "potwierdzam 1", "wszystkie", "tak wszystkie",
+    "REZYGNUJĘ", "rezygnuje", "nie", "Nie dam rady", "nie mogę przyjść",
+    "rezygnuję 2", "odwołuję", "2", "1", "Dzień dobry, o której jutro?",
+    "Czy trening się odbędzie?", "Dziękuję!", "👍", "Gdzie jest hala?",
+    "Spóźnię się 10 minut", "A jak dojechać?", "może", "no raczej tak",
+]
+
+
+@dataclass
+class Scale:
+    coaches: int = 20
+    locations: int = 8
+    series: int = 40
+    trainings: int = 3000
+    volunteers: int = 800
+    bookings: int = 5000
+
+    def scaled(self, factor: float) -> "Scale":
+        return Scale(**{k: max(1, int(v * factor)) for k, v in asdict(self).items()})
+
+
+def _name(rng: random.Random) -> tuple[str, str]:
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def populate(scale: Scale, *, seed: int = 2024, now: datetime | None = None) -> dict[str, int]:
+    """Insert ``scale`` rows of each kind; returns the row counts created.
+
+    Trainings are spread from one year in the past to half a year ahead, so
+    both the public schedule and the history view have work to do. Roughly
+    half of them belong to weekly series.
+    """
+    rng = random.Random(seed)
+    now = (now or datetime.now(timezone.utc)).replace(minute=0, second=0, microsecond=0)
+
+    db.session.execute(
+        db.insert(Coach),
+        [
+            {
+                "first_name": first,
+                "last_name": f"{last}{i}",
+                "phone_number": f"5{i:08d}",
+                "email": f"coach{i}@example.com",
+            }
+            for i, (first, last) in enumerate(_name(rng) for _ in range(scale.coaches))
+        ],
+    )
+    db.session.execute(
+        db.insert(Location),
+        [{"name": f"Hala {i}"} for i in range(scale.locations)],
+    )
+    coach_ids = [row.id for row in db.session.execute(db.select(Coach.id))]
+    location_ids = [row.id for row in db.session.execute(db.select(Location.id))]
+
+    start = now - timedelta(days=365)
+    series_rows = []
+    for _ in range(scale.series):
+        series_start = start + timedelta(days=rng.randrange(7), hours=rng.randrange(8, 20))
+        series_rows.append(
+            {
+                "start_date": series_start,
+                "repeat": True,
+                "repeat_interval_weeks": 1,
+                "repeat_until": (now + timedelta(days=180)).date(),
+                "planned_count": 0,
+                "created_count": 0,
+                "skipped_dates": [],
+                "coach_id": rng.choice(coach_ids),
+                "location_id": rng.choice(location_ids),
+                "max_volunteers": 3,
+            }
+        )
+    if series_rows:
+        db.session.execute(db.insert(TrainingSeries), series_rows)
+    series = list(
+        db.session.execute(
+            db.select(
+                TrainingSeries.id,
+                TrainingSeries.start_date,
+                TrainingSeries.coach_id,
+                TrainingSeries.location_id,
+            )
+        )
+    )
+
+    training_rows = []
+    for index in range(scale.trainings):
+        if series and index % 2 == 0:
+            s = series[index // 2 % len(series)]
+            date = s.start_date.replace(tzinfo=timezone.utc) + timedelta(
+                weeks=index // 2 // len(series)
+            )
+            coach_id, location_id, series_id = s.coach_id, s.location_id, s.id
+        else:
+            date = start + timedelta(
+                days=rng.randrange(545), hours=rng.randrange(8, 20)
+            )
+            coach_id = rng.choice(coach_ids)
+            location_id = rng.choice(location_ids)
+            series_id = None
+        training_rows.append(
+            {
+                "date": date,
+                "coach_id": coach_id,
+                "location_id": location_id,
+                "series_id": series_id,
+                # Bulk inserts skip mapper events, so set the key here
+                "series_key": build_series_key(date, coach_id, location_id),
+                "max_volunteers": 3,
+                "is_canceled": rng.random() < 0.03,
+                "is_deleted": False,
+            }
+        )
+    db.session.execute(db.insert(Training), training_rows)
+
+    db.session.execute(
+        db.insert(Volunteer),
+        [
+            {
+                "first_name": first,
+                "last_name": last,
+                "email": f"volunteer{i}@example.com",
+                "phone_number": f"6{i:08d}" if i % 5 else None,
+                "is_adult": i % 7 != 0,
+            }
+            for i, (first, last) in enumerate(_name(rng) for _ in range(scale.volunteers))
+        ],
+    )
+    training_ids = [row.id for row in db.session.execute(db.select(Training.id))]
+    volunteer_ids = [row.id for row in db.session.execute(db.select(Volunteer.id))]
+
+    taken: dict[int, set[int]] = {}
+    booking_rows = []
+    capacity = len(training_ids) * min(3, len(volunteer_ids))
+    while len(booking_rows) < min(scale.bookings, capacity):
+        training_id = rng.choice(training_ids)
+        volunteer_id = rng.choice(volunteer_ids)
+        booked = taken.setdefault(training_id, set())
+        if len(booked) >= 3 or volunteer_id in booked:
+            continue
+        booked.add(volunteer_id)
+        booking_rows.append(
+            {
+                "training_id": training_id,
+                "volunteer_id": volunteer_id,
+                "is_confirmed": rng.choice([None, True]),
+                "time_change_notified": False,
+            }
+        )
+    db.session.execute(db.insert(Booking), booking_rows)
+    db.session.add(
+        EmailSettings(
+            registration_template="<p>Cześć {first_name}, zapisano Cię na {training}.</p>",
+            cancellation_template="<p>Trening {training} został odwołany.</p>",
+            phone_request_template=(
+                "<p>Cześć {first_name}, dodaj numer telefonu: "
+                '<a href="{update_link}">{update_link}</a></p>'
+            ),
+        )
+    )
+    db.session.commit()
+
+    return {
+        "coaches": len(coach_ids),
+        "locations": len(location_ids),
+        "series": len(series),
+        "trainings": len(training_ids),
+        "volunteers": len(volunteer_ids),
+        "bookings": len(booking_rows),
+    }
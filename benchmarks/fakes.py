@@ -0,0 +1,279 @@
+"""Local stand-ins for WAHA and the SMTP relay.
+
+Both servers bind to 127.0.0.1 on a free port, record what they receive
+and can add latency and random failures, so the notification pipeline can
+be load-tested without touching real phones or mailboxes::
+
+    with FakeWaha(latency=0.05, error_rate=0.02) as waha, FakeSmtp() as smtp:
+        app.config["WHATSAPP_API_URL"] = waha.url
+        ...
+        print(len(waha.sent), len(smtp.messages))
+
+Only the parts of the protocols the app uses are implemented: WAHA's
+``/api/sendText`` and the chat/message listing endpoints, and plain SMTP
+without STARTTLS or AUTH (point the app at it with ``SMTP_ENCRYPTION=none``).
+"""
+
+import email
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+def _address(command: str) -> str:
+    """Return the address of a ``MAIL FROM:<..>`` / ``RCPT TO:<..>`` line."""
+    match = re.search(r"<([^>]*)>", command)
+    return match.group(1) if match else command.split(":", 1)[-1].strip()
+
+
+class _FakeServer:
+    """Run a socketserver in a daemon thread; usable as a context manager."""
+
+    def __init__(self, *, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _make_server(self):
+        raise NotImplementedError
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._server = self._make_server()
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _delay(self) -> None:
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+
+class FakeWaha(_FakeServer):
+    """Minimal WAHA HTTP API.
+
+    ``chats`` maps chat ids (e.g. ``"123@lid"``) to chat objects returned by
+    the chat endpoints; ``sent`` lists every accepted ``sendText`` payload.
+    """
+
+    def __init__(self, *, chats: dict[str, dict] | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.chats = dict(chats or {})
+        self.sent: list[dict] = []
+        self.failed = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def messages_for(self, chat_id: str) -> list[dict]:
+        with self._lock:
+            return [m for m in self.sent if m.get("chatId") == chat_id]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.sent.clear()
+            self.failed = 0
+
+    def _make_server(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _fail_maybe(self) -> bool:
+                fake._delay()
+                if fake._should_fail():
+                    with fake._lock:
+                        fake.failed += 1
+                    self._reply(500, {"error": "injected failure"})
+                    return True
+                return False
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                if urlsplit(self.path).path != "/api/sendText":
+                    self._reply(404, {"error": "not found"})
+                    return
+                if self._fail_maybe():
+                    return
+                try:
+                    payload = json.loads(raw or b"{}")
+                except ValueError:
+                    self._reply(400, {"error": "invalid json"})
+                    return
+                if not payload.get("chatId") or "text" not in payload:
+                    self._reply(400, {"error": "chatId and text are required"})
+                    return
+                with fake._lock:
+                    message_id = f"true_{payload['chatId']}_{len(fake.sent)}"
+                    fake.sent.append({**payload, "id": message_id, "timestamp": int(time.time())})
+                self._reply(201, {"id": message_id})
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                # /api/{session}/chats[/{chatId}[/messages]]
+                segments = [unquote(s) for s in parts.path.strip("/").split("/")]
+                if len(segments) < 3 or segments[0] != "api" or segments[2] != "chats":
+                    self._reply(404, {"error": "not found"})
+                    return
+                if self._fail_maybe():
+                    return
+                if len(segments) == 3:
+                    self._reply(200, list(fake.chats.values()))
+                elif len(segments) == 4:
+                    chat = fake.chats.get(segments[3])
+                    self._reply(200 if chat else 404, chat or {"error": "chat not found"})
+                elif len(segments) == 5 and segments[4] == "messages":
+                    limit = int(parse_qs(parts.query).get("limit", ["50"])[0])
+                    messages = [
+                        {
+                            "id": m["id"],
+                            "from": m["chatId"],
+                            "fromMe": True,
+                            "body": m["text"],
+                            "timestamp": m["timestamp"],
+                        }
+                        for m in fake.messages_for(segments[3])
+                    ]
+                    self._reply(200, messages[-limit:])
+                else:
+                    self._reply(404, {"error": "not found"})
+
+        return ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+
+class FakeSmtp(_FakeServer):
+    """SMTP sink keeping every delivered message in ``messages``.
+
+    ``error_rate`` rejects that share of messages at ``DATA`` with a 451,
+    which ``smtplib`` raises as ``SMTPDataError``.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.messages: list[email.message.Message] = []
+        self.envelopes: list[tuple[str, list[str]]] = []
+        self.failed = 0
+
+    @property
+    def host(self) -> str:
+        return "127.0.0.1"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.messages.clear()
+            self.envelopes.clear()
+            self.failed = 0
+
+    def _make_server(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            # Replies are written line by line; avoid Nagle/delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def _send(self, line: str) -> None:
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self):
+                self._send("220 fake-smtp ready")
+                sender, recipients = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode("utf-8", "replace").strip()
+                    verb = command[:4].upper()
+                    if verb == "EHLO":
+                        self._send("250-fake-smtp")
+                        self._send("250 8BITMIME")
+                    elif verb == "HELO":
+                        self._send("250 fake-smtp")
+                    elif verb == "MAIL":
+                        sender, recipients = _address(command), []
+                        self._send("250 OK")
+                    elif verb == "RCPT":
+                        recipients.append(_address(command))
+                        self._send("250 OK")
+                    elif verb == "DATA":
+                        self._send("354 End data with <CR><LF>.<CR><LF>")
+                        self._receive(sender, recipients)
+                        sender, recipients = None, []
+                    elif verb == "RSET":
+                        sender, recipients = None, []
+                        self._send("250 OK")
+                    elif verb == "NOOP":
+                        self._send("250 OK")
+                    elif verb == "QUIT":
+                        self._send("221 Bye")
+                        return
+                    else:
+                        self._send("502 Command not implemented")
+
+            def _receive(self, sender, recipients) -> None:
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    # Undo dot-stuffing
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                fake._delay()
+                if fake._should_fail():
+                    with fake._lock:
+                        fake.failed += 1
+                    self._send("451 Injected failure")
+                    return
+                message = email.message_from_bytes(b"".join(lines))
+                with fake._lock:
+                    fake.messages.append(message)
+                    fake.envelopes.append((sender, recipients))
+                self._send("250 OK: queued")
+
+        return socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
@@ -0,0 +1,308 @@
+"""Replay signup and webhook traffic against a locally served app.
+
+Starts :class:`~benchmarks.fakes.FakeWaha` and :class:`~benchmarks.fakes.FakeSmtp`,
+builds a synthetic database, serves the app with Werkzeug's threaded server
+and fires public signups and inbound WhatsApp webhooks at it from a thread
+pool. Signup notifications keep their production path (timer threads after
+the grace period, ``--grace`` seconds), and the run waits for them to drain
+before reporting::
+
+    python -m benchmarks.loadtest --signups 200 --webhooks 500 --concurrency 8 \\
+        --waha-latency 0.08 --waha-error-rate 0.02 --smtp-latency 0.05
+
+Every integration points at 127.0.0.1; no real message can be sent.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+from werkzeug.serving import make_server
+
+from .datagen import REPLY_CORPUS, Scale, populate
+from .fakes import FakeSmtp, FakeWaha
+
+
+@dataclass
+class LoadConfig:
+    signups: int = 100
+    webhooks: int = 300
+    concurrency: int = 8
+    scale: float = 0.2
+    grace: float = 0.0
+    waha_latency: float = 0.0
+    waha_error_rate: float = 0.0
+    smtp_latency: float = 0.0
+    smtp_error_rate: float = 0.0
+    drain_timeout: float = 120.0
+    seed: int = 2024
+
+
+@dataclass
+class _Sample:
+    kind: str
+    status: int
+    ms: float
+
+
+@dataclass
+class LoadReport:
+    config: dict
+    duration_s: float
+    drain_s: float
+    requests: dict = field(default_factory=dict)
+    waha: dict = field(default_factory=dict)
+    smtp: dict = field(default_factory=dict)
+
+    def format(self) -> str:
+        lines = [
+            f"traffic: {self.duration_s:.2f}s, notifications drained after {self.drain_s:.2f}s",
+        ]
+        for kind, stats in self.requests.items():
+            statuses = ", ".join(f"{code}×{n}" for code, n in sorted(stats["statuses"].items()))
+            lines.append(
+                f"{kind:<8} {stats['count']:5d} req  {stats['rps']:7.1f} req/s  "
+                f"p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms  "
+                f"max {stats['max_ms']:7.1f} ms  [{statuses}]"
+            )
+        lines.append(f"waha     {self.waha['sent']} sent, {self.waha['failed']} failed")
+        lines.append(f"smtp     {self.smtp['delivered']} delivered, {self.smtp['failed']} failed")
+        return "\n".join(lines)
+
+
+@contextmanager
+def _environment(values: dict[str, str | None]):
+    previous = {name: os.environ.get(name) for name in values}
+    try:
+        for name, value in values.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def _summarize(samples: list[_Sample], duration: float) -> dict:
+    summary = {}
+    for kind in sorted({s.kind for s in samples}):
+        timings = [s.ms for s in samples if s.kind == kind]
+        statuses: dict[int, int] = {}
+        for s in samples:
+            if s.kind == kind:
+                statuses[s.status] = statuses.get(s.status, 0) + 1
+        summary[kind] = {
+            "count": len(timings),
+            "rps": len(timings) / duration if duration else 0.0,
+            "p50_ms": statistics.median(timings),
+            "p95_ms": _percentile(timings, 95),
+            "max_ms": max(timings),
+            "statuses": statuses,
+        }
+    return summary
+
+
+class _Client:
+    """One HTTP/1.1 connection per worker thread; redirects are not followed."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: bytes, content_type: str) -> int:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers={"Content-Type": content_type})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            return 0
+
+
+def _plan(config: LoadConfig, app) -> list[tuple[str, str, bytes, str]]:
+    """Build the shuffled request list: ``(kind, path, body, content type)``."""
+    from app import db
+    from app.models import Training, Volunteer
+
+    rng = random.Random(config.seed)
+    with app.app_context():
+        training_ids = list(
+            db.session.scalars(
+                db.select(Training.id).where(
+                    Training.date >= datetime.now(timezone.utc),
+                    Training.is_canceled.is_(False),
+                    Training.is_deleted.is_(False),
+                )
+            )
+        )
+        phones = [
+            phone
+            for phone in db.session.scalars(
+                db.select(Volunteer.phone_number).where(Volunteer.phone_number.is_not(None))
+            )
+        ]
+
+    requests = []
+    for i in range(config.signups):
+        form = {
+            "training_id": rng.choice(training_ids),
+            "first_name": "Load",
+            "last_name": f"Test{i}",
+            "email": f"load{i}@example.com",
+            "phone_number": f"7{i:08d}",
+            "is_adult": "true",
+            "privacy_consent": "y",
+        }
+        requests.append(
+            ("signup", "/", urlencode(form).encode(), "application/x-www-form-urlencoded")
+        )
+    msg_ids = itertools.count()
+    for _ in range(config.webhooks):
+        payload = {
+            "event": "message",
+            "payload": {
+                "fromMe": False,
+                "from": f"48{rng.choice(phones).lstrip('+').removeprefix('48')}@c.us",
+                "body": rng.choice(REPLY_CORPUS),
+                "id": f"load-{next(msg_ids)}",
+            },
+        }
+        requests.append(
+            ("webhook", "/webhook/whatsapp", json.dumps(payload).encode(), "application/json")
+        )
+    rng.shuffle(requests)
+    return requests
+
+
+def _drain(timeout: float) -> float:
+    from app import whatsapp_utils
+
+    started = time.perf_counter()
+    while whatsapp_utils._pending_signups and time.perf_counter() - started < timeout:
+        time.sleep(0.05)
+    # Timers pop their entry before sending; wait for those threads as well
+    for thread in threading.enumerate():
+        if isinstance(thread, threading.Timer):
+            thread.join(max(0.0, timeout - (time.perf_counter() - started)))
+    return time.perf_counter() - started
+
+
+def run(config: LoadConfig) -> LoadReport:
+    """Run one load test and return its report."""
+    from app import create_app, db, whatsapp_utils
+
+    waha = FakeWaha(
+        latency=config.waha_latency, error_rate=config.waha_error_rate, seed=config.seed
+    )
+    smtp = FakeSmtp(
+        latency=config.smtp_latency, error_rate=config.smtp_error_rate, seed=config.seed
+    )
+    with tempfile.TemporaryDirectory() as tmp, waha, smtp:
+        env = {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{Path(tmp) / 'load.sqlite3'}",
+            "WHATSAPP_API_URL": waha.url,
+            "WHATSAPP_API_KEY": None,
+            # No outbound pacing against the fake WAHA
+            "WHATSAPP_RATE_PER_MINUTE": "0",
+            "WHATSAPP_RECIPIENT_SPACING": "0",
+            "SMTP_HOST": smtp.host,
+            "SMTP_PORT": str(smtp.port),
+            "SMTP_ENCRYPTION": "none",
+            "SMTP_USERNAME": None,
+            "SMTP_PASSWORD": None,
+            "GEMINI_API_KEY": None,
+            "NPLUSONE_MODE": None,
+            "LOG_LEVEL": "WARNING",
+        }
+        grace = whatsapp_utils.SIGNUP_GRACE_PERIOD_SECONDS
+        with _environment(env):
+            app = create_app()
+            # A load generator cannot carry the per-session CSRF token
+            app.config["WTF_CSRF_ENABLED"] = False
+            with app.app_context():
+                db.create_all()
+                populate(Scale().scaled(config.scale), seed=config.seed)
+            plan = _plan(config, app)
+
+            server = make_server("127.0.0.1", 0, app, threaded=True)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            whatsapp_utils.SIGNUP_GRACE_PERIOD_SECONDS = config.grace
+            try:
+                client = _Client(server.server_port)
+
+                def fire(item):
+                    kind, path, body, content_type = item
+                    started = time.perf_counter()
+                    status = client.request("POST", path, body, content_type)
+                    return _Sample(kind, status, (time.perf_counter() - started) * 1000)
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=config.concurrency) as pool:
+                    samples = list(pool.map(fire, plan))
+                duration = time.perf_counter() - started
+                drain = _drain(config.drain_timeout)
+            finally:
+                whatsapp_utils.SIGNUP_GRACE_PERIOD_SECONDS = grace
+                server.shutdown()
+                thread.join()
+            with app.app_context():
+                db.engine.dispose()
+
+        return LoadReport(
+            config=asdict(config),
+            duration_s=duration,
+            drain_s=drain,
+            requests=_summarize(samples, duration),
+            waha={"sent": len(waha.sent), "failed": waha.failed},
+            smtp={"delivered": len(smtp.messages), "failed": smtp.failed},
+        )
+
+
+def main(argv=None) -> None:
+    defaults = LoadConfig()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    for name, value in asdict(defaults).items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=type(value), default=value
+        )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = vars(parser.parse_args(argv))
+    as_json = args.pop("json")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    report = run(LoadConfig(**args))
+    print(json.dumps(asdict(report), indent=2) if as_json else report.format())
+
+
+if __name__ == "__main__":
+    main()
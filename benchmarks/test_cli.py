@@ -0,0 +1,35 @@
+"""Scheduled CLI commands over the synthetic dataset."""
+
+import pytest
+
+from app import db
+from app.models import Volunteer
+
+
+def _reset_phone_requests():
+    # The command marks everyone it emailed; undo that so each round does work
+    db.session.execute(db.update(Volunteer).values(phone_request_sent=False))
+    db.session.commit()
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["send-reminders"],
+        ["send-phone-requests"],
+        ["send-coach-summary"],
+        ["send-monthly-summary", "--coordinator-email", "koordynator@example.com"],
+    ],
+    ids=lambda args: args[0],
+)
+def test_command(benchmark, bench_app, args):
+    runner = bench_app.test_cli_runner()
+
+    def setup():
+        if args[0] == "send-phone-requests":
+            with bench_app.app_context():
+                _reset_phone_requests()
+        return ((), {"args": args})
+
+    result = benchmark.pedantic(runner.invoke, setup=setup, rounds=5, warmup_rounds=1)
+    assert result.exit_code == 0, result.output
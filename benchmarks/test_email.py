@@ -0,0 +1,57 @@
+"""Bulk mailing to 1000 recipients through the fake SMTP server."""
+
+import os
+
+import pytest
+
+from app import email_utils
+from app.template_utils import render_template_string
+
+RECIPIENTS = 1000
+TEMPLATE = (
+    "<p>Cześć {first_name}!</p>"
+    "<p>Trening {date} w {location} został odwołany.</p>"
+    "<p>Pozdrawiamy,<br>Fundacja Widzimy Inaczej</p>"
+)
+
+
+@pytest.fixture(scope="module")
+def mailing():
+    messages = [
+        (
+            f"wolontariusz{i}@example.com",
+            render_template_string(
+                TEMPLATE,
+                {"first_name": f"Imię{i}", "date": "2026-11-05 18:00", "location": "Hala"},
+            ),
+        )
+        for i in range(RECIPIENTS)
+    ]
+    # A typical registration PDF
+    attachments = [("regulamin.pdf", "application/pdf", os.urandom(64 * 1024))]
+    return messages, attachments
+
+
+def _one_by_one(messages, attachments):
+    return [
+        email_utils.send_email("Trening odwołany", None, [to], html_body=html, attachments=attachments)
+        for to, html in messages
+    ]
+
+
+def _bulk(messages, attachments):
+    return email_utils.send_bulk_email("Trening odwołany", messages, attachments=attachments)
+
+
+@pytest.mark.parametrize("sender", [_one_by_one, _bulk], ids=["send_email", "send_bulk_email"])
+def test_mailing(benchmark, bench_app, fake_smtp, mailing, sender):
+    messages, attachments = mailing
+
+    def run():
+        fake_smtp.reset()
+        with bench_app.app_context():
+            return sender(messages, attachments)
+
+    results = benchmark.pedantic(run, rounds=3, warmup_rounds=0)
+    assert results == [(True, None)] * RECIPIENTS
+    assert len(fake_smtp.messages) == RECIPIENTS
@@ -0,0 +1,15 @@
+"""Smoke test for the fakes and the load-test driver."""
+
+from .loadtest import LoadConfig, run
+
+
+def test_load_replay_reaches_fakes():
+    report = run(
+        LoadConfig(signups=12, webhooks=30, concurrency=4, scale=0.05, waha_error_rate=0.1)
+    )
+
+    for kind in ("signup", "webhook"):
+        assert set(report.requests[kind]["statuses"]) <= {200, 302, 429}
+    assert report.waha["sent"] > 0
+    assert report.waha["failed"] > 0
+    assert report.smtp["delivered"] > 0
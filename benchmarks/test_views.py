@@ -0,0 +1,49 @@
+"""Public and admin views over the synthetic dataset."""
+
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from openpyxl import Workbook
+
+IMPORT_ROWS = 200
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/", "/admin/trainings", "/admin/volunteers", "/admin/history", "/admin/export"],
+)
+def test_view(benchmark, admin_client, path):
+    response = benchmark(admin_client.get, path)
+    assert response.status_code == 200
+
+
+def _import_workbook() -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Data", "Godzina", "Trener", "Telefon", "Miejsce"])
+    start = datetime.now() + timedelta(days=30)
+    for i in range(IMPORT_ROWS):
+        ws.append(
+            [
+                (start + timedelta(days=i % 60)).strftime("%Y-%m-%d"),
+                f"{10 + i % 8}:00",
+                f"Trener Import{i % 10}",
+                f"7{i % 10:08d}",
+                f"Hala {i % 8}",
+            ]
+        )
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def test_import_excel(benchmark, admin_client):
+    payload = _import_workbook()
+
+    def setup():
+        data = {"file": (io.BytesIO(payload), "treningi.xlsx")}
+        return (("/admin/import",), {"data": data, "content_type": "multipart/form-data"})
+
+    response = benchmark.pedantic(admin_client.post, setup=setup, rounds=3)
+    assert response.status_code == 302
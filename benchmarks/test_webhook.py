@@ -0,0 +1,254 @@
+"""Inbound WhatsApp webhook and the helpers on its hot path."""
+
+import itertools
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import create_app, db
+from app.admin_routes import _resolve_series
+from app.models import (
+    Booking,
+    Coach,
+    Location,
+    Training,
+    TrainingSeries,
+    Volunteer,
+    WhatsAppRateLimit,
+)
+from app import throttle
+from app.webhook_routes import detect_intent
+
+from .datagen import REPLY_CORPUS, Scale, populate
+
+SENDER_PHONE = "699123456"
+_msg_ids = itertools.count()
+
+
+@pytest.fixture(scope="module")
+def sender(bench_app):
+    """Volunteer with an unconfirmed booking tomorrow."""
+    with bench_app.app_context():
+        volunteer = Volunteer(
+            first_name="Bench",
+            last_name="Sender",
+            email="bench.sender@example.com",
+            phone_number=SENDER_PHONE,
+            is_adult=True,
+        )
+        training = Training(
+            date=datetime.now(timezone.utc) + timedelta(days=1),
+            coach_id=db.session.scalar(db.select(Coach.id).limit(1)),
+            location_id=db.session.scalar(db.select(Location.id).limit(1)),
+            max_volunteers=3,
+        )
+        db.session.add_all([volunteer, training])
+        db.session.flush()
+        booking = Booking(training_id=training.id, volunteer_id=volunteer.id)
+        db.session.add(booking)
+        db.session.commit()
+        return booking.id
+
+
+@pytest.fixture
+def webhook_client(bench_app, monkeypatch):
+    # Every round comes from one chat; keep the per-chat limiter out of it
+    monkeypatch.setattr("app.webhook_routes.is_rate_limited", lambda phone: False)
+    return bench_app.test_client()
+
+
+def _post(client, chat_id: str, body: str):
+    payload = {
+        "event": "message",
+        "payload": {
+            "fromMe": False,
+            "from": chat_id,
+            "body": body,
+            "id": f"bench-{next(_msg_ids)}",
+        },
+    }
+    return client.post(
+        "/webhook/whatsapp", data=json.dumps(payload), content_type="application/json"
+    )
+
+
+def _reset_booking(bench_app, booking_id):
+    with bench_app.app_context():
+        db.session.get(Booking, booking_id).is_confirmed = None
+        db.session.commit()
+
+
+@pytest.mark.parametrize(
+    "body", ["TAK", "Czy trening się odbędzie?"], ids=["confirm", "question"]
+)
+def test_webhook_volunteer(benchmark, bench_app, webhook_client, sender, body):
+    def setup():
+        _reset_booking(bench_app, sender)
+        return ((webhook_client, f"48{SENDER_PHONE}@c.us", body), {})
+
+    response = benchmark.pedantic(_post, setup=setup, rounds=10, warmup_rounds=1)
+    assert response.status_code == 200
+
+
+def test_webhook_unknown_sender(benchmark, webhook_client):
+    response = benchmark(lambda: _post(webhook_client, "48711000000@c.us", "TAK"))
+    assert response.get_json()["status"] == "ignored"
+
+
+def _print_trace(payload: dict, volunteer: Volunteer, intent: str) -> None:
+    """The ``print(..., flush=True)`` lines the webhook emitted for this
+    message before structured logging, verbatim."""
+    from_field, body, msg_id = payload["from"], payload["body"], payload["id"]
+    print("[WEBHOOK] Request received", flush=True)
+    print("[WEBHOOK] event=message", flush=True)
+    print(f"[WEBHOOK] fromMe=False, from={from_field}, body={body[:80]}, id={msg_id}", flush=True)
+    print(f"[WEBHOOK] payload keys: {list(payload.keys())}", flush=True)
+    print(f"[WEBHOOK] Phone from @c.us: {from_field.split('@')[0]}", flush=True)
+    print(f"[WEBHOOK] Resolved: volunteer={volunteer}, coach=None", flush=True)
+    print(
+        f"[WEBHOOK] Processing: vol={volunteer.first_name} {volunteer.last_name}, "
+        f"msg={body[:50]}",
+        flush=True,
+    )
+    print(f"[WEBHOOK] Intent: {intent}", flush=True)
+
+
+# Medians of test_webhook_log_level by mode, to compare with the print path
+_log_medians: dict[str, float] = {}
+
+
+@pytest.mark.parametrize("mode", ["print", "WARNING", "INFO", "DEBUG"])
+def test_webhook_log_level(benchmark, bench_app, webhook_client, sender, mode):
+    """Per-call cost of the old print trace against the structured record
+    (INFO) and debug tracing; ``print`` runs with logging at WARNING."""
+    previous = bench_app.logger.level
+    bench_app.logger.setLevel(logging.WARNING if mode == "print" else getattr(logging, mode))
+    chat_id = f"48{SENDER_PHONE}@c.us"
+    with bench_app.app_context():
+        volunteer = db.session.get(Booking, sender).volunteer
+        db.session.expunge(volunteer)
+
+    def post():
+        response = _post(webhook_client, chat_id, "TAK")
+        if mode == "print":
+            payload = {"fromMe": False, "from": chat_id, "body": "TAK",
+                       "id": f"bench-{next(_msg_ids)}"}
+            _print_trace(payload, volunteer, "confirm")
+        return response
+
+    try:
+        def setup():
+            _reset_booking(bench_app, sender)
+            return ((), {})
+
+        benchmark.pedantic(post, setup=setup, rounds=10, warmup_rounds=1)
+    finally:
+        bench_app.logger.setLevel(previous)
+
+    _log_medians[mode] = _median_ms(benchmark)
+    if mode == "INFO" and "print" in _log_medians:
+        # One structured record must not cost more than the prints it replaced
+        # (1.5x: the default --bench-tolerance, timings are noisy)
+        assert _log_medians["INFO"] <= _log_medians["print"] * 1.5, _log_medians
+
+
+# Per-message cost the inbound limiter may add for a chat's first message;
+# the former per-message database write cost about 1.5 ms
+INBOUND_BUDGET_MS = 0.05
+
+
+def test_inbound_rate_limit_10k_senders(benchmark, bench_app):
+    """One message from each of 10k senders through the shared limiter."""
+    senders = [f"48{600000000 + i}@c.us" for i in range(10_000)]
+    rounds = itertools.count()
+
+    def run():
+        # A fresh window per round, so every bucket starts empty
+        now = 1e9 + next(rounds) * 3600
+        return sum(throttle.inbound_limited(chat_id, now) for chat_id in senders)
+
+    with bench_app.app_context():
+        limited = benchmark.pedantic(run, rounds=5, warmup_rounds=1)
+        rows = db.session.scalar(
+            db.select(db.func.count()).select_from(WhatsAppRateLimit)
+            .where(WhatsAppRateLimit.key.startswith(throttle.INBOUND_PREFIX))
+        )
+    assert limited == 0
+    # Quiet chats are decided in memory
+    assert rows == 0
+    per_message = _median_ms(benchmark) / len(senders)
+    assert per_message < INBOUND_BUDGET_MS, f"{per_message:.4f} ms per message"
+
+
+def test_inbound_rate_limit_busy_chats(benchmark, bench_app):
+    """A burst of 12 messages from each of 500 chats (limit 10)."""
+    chats = [f"48{610000000 + i}@c.us" for i in range(500)]
+    rounds = itertools.count()
+
+    def run():
+        now = 2e9 + next(rounds) * 3600
+        return sum(
+            throttle.inbound_limited(chat_id, now) for _ in range(12) for chat_id in chats
+        )
+
+    with bench_app.app_context():
+        limited = benchmark.pedantic(run, rounds=2)
+    # The last two messages of each chat are over the limit
+    assert limited == 2 * len(chats)
+
+
+def test_detect_intent_corpus(benchmark):
+    corpus = REPLY_CORPUS * 100
+    intents = benchmark(lambda: [detect_intent(text) for text in corpus])
+    assert intents[0] == "confirm"
+
+
+# Lookups at 50x the historical series must stay within this factor of the
+# smallest dataset; the pre-index scan grew linearly with the series count.
+SERIES_COUNTS = (40, 400, 2000)
+SERIES_GROWTH_LIMIT = 3.0
+_series_medians: dict[int, float] = {}
+
+
+@pytest.fixture
+def series_app(bench_app, tmp_path, monkeypatch, request):
+    """Separate database with ``request.param`` series and 20 weeks of each."""
+    count = request.param
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'series.sqlite3'}")
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        populate(Scale(series=count, trainings=count * 40, volunteers=1, bookings=1))
+    return app
+
+
+def _median_ms(benchmark) -> float:
+    stats = benchmark.stats
+    if isinstance(stats, dict):
+        return stats["median_ms"]
+    return stats.stats.median * 1000  # pytest-benchmark
+
+
+@pytest.mark.parametrize("series_app", SERIES_COUNTS, indirect=True,
+                         ids=[f"{count}_series" for count in SERIES_COUNTS])
+def test_resolve_series(benchmark, series_app):
+    with series_app.app_context():
+        series_key = db.session.scalar(
+            db.select(Training.series_key)
+            .join(TrainingSeries, Training.series_id == TrainingSeries.id)
+            .limit(1)
+        )
+        resolved = benchmark(_resolve_series, series_key)
+        count = db.session.scalar(db.select(db.func.count()).select_from(TrainingSeries))
+        db.session.rollback()
+    assert resolved is not None
+
+    _series_medians[count] = _median_ms(benchmark)
+    smallest = min(SERIES_COUNTS)
+    if count != smallest and smallest in _series_medians:
+        assert _series_medians[count] <= SERIES_GROWTH_LIMIT * _series_medians[smallest], (
+            f"series lookup grew from {_series_medians[smallest]:.2f} ms at {smallest} "
+            f"series to {_series_medians[count]:.2f} ms at {count}"
+        )
@@ -0,0 +1,63 @@
+"""add indexed series_key column to trainings
+
+Revision ID: h8i9j0k1l2m3
+Revises: g7h8i9j0k1l2
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'h8i9j0k1l2m3'
+down_revision = 'g7h8i9j0k1l2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Materialise the weekday/time/coach/location series key."""
+    with op.batch_alter_table("trainings", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("series_key", sa.String(length=32), nullable=True),
+        )
+        batch_op.create_index(
+            "ix_trainings_series_key", ["series_key"], unique=False
+        )
+
+    trainings_table = sa.table(
+        "trainings",
+        sa.column("id", sa.Integer),
+        sa.column("date", sa.DateTime),
+        sa.column("coach_id", sa.Integer),
+        sa.column("location_id", sa.Integer),
+        sa.column("series_key", sa.String),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(
+            trainings_table.c.id,
+            trainings_table.c.date,
+            trainings_table.c.coach_id,
+            trainings_table.c.location_id,
+        )
+    ).all()
+    for row in rows:
+        if row.date is None:
+            continue
+        key = (
+            f"{row.date.weekday()}-{row.date.strftime('%H%M')}-"
+            f"c{row.coach_id}-l{row.location_id}"
+        )
+        bind.execute(
+            trainings_table.update()
+            .where(trainings_table.c.id == row.id)
+            .values(series_key=key)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("trainings", schema=None) as batch_op:
+        batch_op.drop_index("ix_trainings_series_key")
+        batch_op.drop_column("series_key")
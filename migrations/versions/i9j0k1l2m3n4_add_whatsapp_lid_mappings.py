@@ -0,0 +1,30 @@
+"""add whatsapp_lid_mappings table
+
+Revision ID: i9j0k1l2m3n4
+Revises: h8i9j0k1l2m3
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'i9j0k1l2m3n4'
+down_revision = 'h8i9j0k1l2m3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'whatsapp_lid_mappings',
+        sa.Column('lid', sa.String(length=64), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('lid'),
+    )
+
+
+def downgrade():
+    op.drop_table('whatsapp_lid_mappings')
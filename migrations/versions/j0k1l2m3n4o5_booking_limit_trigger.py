@@ -0,0 +1,110 @@
+"""enforce booking limit with a trigger; timezone-aware training dates on postgresql
+
+Revision ID: j0k1l2m3n4o5
+Revises: i9j0k1l2m3n4
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'j0k1l2m3n4o5'
+down_revision = 'i9j0k1l2m3n4'
+branch_labels = None
+depends_on = None
+
+
+# Same DDL as app.database.BOOKING_LIMIT_DDL at the time of this revision
+CREATE_TRIGGERS = {
+    'sqlite': [
+        """
+        CREATE TRIGGER booking_limit_insert BEFORE INSERT ON bookings
+        WHEN (SELECT COUNT(*) FROM bookings WHERE training_id = NEW.training_id)
+             >= (SELECT max_volunteers FROM trainings WHERE id = NEW.training_id)
+        BEGIN
+            SELECT RAISE(ABORT, 'booking_limit: training is full');
+        END
+        """,
+        """
+        CREATE TRIGGER booking_limit_update BEFORE UPDATE OF training_id ON bookings
+        WHEN NEW.training_id IS NOT OLD.training_id
+             AND (SELECT COUNT(*) FROM bookings WHERE training_id = NEW.training_id)
+             >= (SELECT max_volunteers FROM trainings WHERE id = NEW.training_id)
+        BEGIN
+            SELECT RAISE(ABORT, 'booking_limit: training is full');
+        END
+        """,
+    ],
+    'postgresql': [
+        """
+        CREATE OR REPLACE FUNCTION enforce_booking_limit() RETURNS trigger AS $$
+        DECLARE
+            capacity integer;
+            taken integer;
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.training_id = OLD.training_id THEN
+                RETURN NEW;
+            END IF;
+            -- Lock the training so concurrent sign-ups are counted in turn
+            SELECT max_volunteers INTO capacity
+              FROM trainings WHERE id = NEW.training_id FOR UPDATE;
+            SELECT COUNT(*) INTO taken FROM bookings WHERE training_id = NEW.training_id;
+            IF taken >= capacity THEN
+                RAISE EXCEPTION USING
+                    MESSAGE = 'booking_limit: training ' || NEW.training_id || ' is full',
+                    ERRCODE = 'check_violation';
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER booking_limit BEFORE INSERT OR UPDATE OF training_id ON bookings
+        FOR EACH ROW EXECUTE FUNCTION enforce_booking_limit()
+        """,
+    ],
+}
+
+DROP_TRIGGERS = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS booking_limit_insert',
+        'DROP TRIGGER IF EXISTS booking_limit_update',
+    ],
+    'postgresql': [
+        'DROP TRIGGER IF EXISTS booking_limit ON bookings',
+        'DROP FUNCTION IF EXISTS enforce_booking_limit()',
+    ],
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # The model stores aware UTC datetimes; existing values are UTC
+        op.alter_column(
+            'trainings',
+            'date',
+            type_=sa.DateTime(timezone=True),
+            existing_type=sa.DateTime(),
+            existing_nullable=False,
+            postgresql_using="date AT TIME ZONE 'UTC'",
+        )
+    for statement in CREATE_TRIGGERS.get(dialect, ()):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for statement in DROP_TRIGGERS.get(dialect, ()):
+        op.execute(statement)
+    if dialect == 'postgresql':
+        op.alter_column(
+            'trainings',
+            'date',
+            type_=sa.DateTime(),
+            existing_type=sa.DateTime(timezone=True),
+            existing_nullable=False,
+            postgresql_using="date AT TIME ZONE 'UTC'",
+        )
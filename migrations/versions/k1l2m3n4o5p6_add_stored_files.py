@@ -0,0 +1,38 @@
+"""add stored_files table where it is missing
+
+The model existed without a migration, so only databases created with
+``db.create_all()`` have the table. The data of existing rows is copied to
+disk by ``flask migrate-stored-files``.
+
+Revision ID: k1l2m3n4o5p6
+Revises: j0k1l2m3n4o5
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'k1l2m3n4o5p6'
+down_revision = 'j0k1l2m3n4o5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('stored_files'):
+        return
+    op.create_table(
+        'stored_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=256), nullable=False),
+        sa.Column('content_type', sa.String(length=128), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    # The table may predate this revision; keep it and its data
+    pass
@@ -0,0 +1,52 @@
+"""add message_log table
+
+Revision ID: m3n4o5p6q7r8
+Revises: l2m3n4o5p6q7
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'm3n4o5p6q7r8'
+down_revision = 'l2m3n4o5p6q7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'message_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('recipient', sa.String(length=64), nullable=False),
+        sa.Column('template', sa.String(length=32), nullable=True),
+        sa.Column('waha_id', sa.String(length=128), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('ack', sa.SmallInteger(), nullable=True),
+        sa.Column('latency_ms', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('acked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('waha_id'),
+    )
+    op.create_index('ix_message_log_created_at', 'message_log', ['created_at'])
+    op.create_index(
+        'ix_message_log_status_created_at', 'message_log', ['status', 'created_at']
+    )
+    op.create_index(
+        'ix_message_log_template_created_at', 'message_log', ['template', 'created_at']
+    )
+    op.create_index(
+        'ix_message_log_recipient_created_at', 'message_log', ['recipient', 'created_at']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_message_log_recipient_created_at', table_name='message_log')
+    op.drop_index('ix_message_log_template_created_at', table_name='message_log')
+    op.drop_index('ix_message_log_status_created_at', table_name='message_log')
+    op.drop_index('ix_message_log_created_at', table_name='message_log')
+    op.drop_table('message_log')
@@ -0,0 +1,29 @@
+"""add whatsapp_rate_limits table
+
+Revision ID: n4o5p6q7r8s9
+Revises: m3n4o5p6q7r8
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'n4o5p6q7r8s9'
+down_revision = 'm3n4o5p6q7r8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'whatsapp_rate_limits',
+        sa.Column('key', sa.String(length=96), nullable=False),
+        sa.Column('tat', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+
+
+def downgrade():
+    op.drop_table('whatsapp_rate_limits')
@@ -0,0 +1,26 @@
+"""clear whatsapp_lid_mappings stored from contact-name matches
+
+Revision ID: o5p6q7r8s9t0
+Revises: n4o5p6q7r8s9
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'o5p6q7r8s9t0'
+down_revision = 'n4o5p6q7r8s9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The admin chat list used to store @lid mappings matched only by
+    # contact name. Rows cannot tell how they were matched, so the cache is
+    # emptied; it refills from WAHA by phone number.
+    op.execute('DELETE FROM whatsapp_lid_mappings')
+
+
+def downgrade():
+    pass
@@ -12,40 +12,115 @@
     return Number.isNaN(date.getTime()) ? null : date;
   }
 
+  const DAY_MS = 24 * 60 * 60 * 1000;
+  const MAX_HORIZON_DAYS = 2 * 366;
+
+  function toDayNumber(isoDate) {
+    const match = /^(\d{4})-(\d{2})-(\d{2})$/.exec(isoDate || "");
+    if (!match) {
+      return null;
+    }
+    return Math.floor(
+      Date.UTC(Number(match[1]), Number(match[2]) - 1, Number(match[3])) / DAY_MS
+    );
+  }
+
+  function easterSunday(year) {
+    const a = year % 19;
+    const b = Math.floor(year / 100);
+    const c = year % 100;
+    const d = Math.floor(b / 4);
+    const e = b % 4;
+    const f = Math.floor((b + 8) / 25);
+    const g = Math.floor((b - f + 1) / 3);
+    const h = (19 * a + b - d - g + 15) % 30;
+    const i = Math.floor(c / 4);
+    const k = c % 4;
+    const l = (32 + 2 * e + 2 * i - h - k) % 7;
+    const m = Math.floor((a + 11 * h + 22 * l) / 451);
+    const month = Math.floor((h + l - 7 * m + 114) / 31);
+    const day = ((h + l - 7 * m + 114) % 31) + 1;
+    return Math.floor(Date.UTC(year, month - 1, day) / DAY_MS);
+  }
+
+  function polishHolidays(year) {
+    const fixed = ["01-01", "01-06", "05-01", "05-03", "08-15", "11-01", "11-11", "12-25", "12-26"];
+    if (year >= 2025) {
+      fixed.push("12-24");
+    }
+    const days = fixed.map(function (md) {
+      return toDayNumber(`${year}-${md}`);
+    });
+    const easter = easterSunday(year);
+    days.push(easter, easter + 1, easter + 49, easter + 60);
+    return days;
+  }
+
+  // Mirrors app/recurrence.py:expand_weekly so the preview matches the server.
   function calculateOccurrences({
     repeatEnabled,
     startValue,
     intervalWeeks,
     repeatUntilValue,
+    weekdays,
+    countLimit,
+    exceptionsValue,
+    skipHolidays,
   }) {
     if (!repeatEnabled) {
       return 1;
     }
 
-    if (!startValue || !repeatUntilValue || !intervalWeeks || intervalWeeks <= 0) {
+    if (!startValue || (!repeatUntilValue && !countLimit) || !intervalWeeks || intervalWeeks <= 0) {
       return null;
     }
 
-    const [datePart, timePart = "00:00"] = startValue.split("T");
-    const startDate = toDate(`${datePart}T${timePart}`);
-    const repeatUntil = toDate(`${repeatUntilValue}T23:59:59`);
-
-    if (!startDate || !repeatUntil) {
+    const [datePart] = startValue.split("T");
+    const startDay = toDayNumber(datePart);
+    if (startDay === null) {
       return null;
     }
+    let endDay = startDay + MAX_HORIZON_DAYS;
+    if (repeatUntilValue) {
+      endDay = toDayNumber(repeatUntilValue);
+      if (endDay === null) {
+        return null;
+      }
+    }
 
-    let count = 1;
-    const current = new Date(startDate);
+    // 1970-01-01 was a Thursday (Monday-based index 3)
+    const startWeekday = (startDay + 3) % 7;
+    const weekStart = startDay - startWeekday;
+    const days = weekdays.length ? weekdays : [startWeekday];
+    const step = 7 * intervalWeeks;
 
-    while (true) {
-      current.setDate(current.getDate() + intervalWeeks * 7);
-      if (current > repeatUntil) {
-        break;
+    const excluded = new Set();
+    (exceptionsValue || "").split(/[\s,;]+/).forEach(function (token) {
+      const day = toDayNumber(token);
+      if (day !== null) {
+        excluded.add(day);
+      }
+    });
+    if (skipHolidays) {
+      const firstYear = Number(datePart.slice(0, 4));
+      const lastYear = new Date(endDay * DAY_MS).getUTCFullYear();
+      for (let year = firstYear; year <= lastYear; year += 1) {
+        polishHolidays(year).forEach(function (day) {
+          excluded.add(day);
+        });
       }
-      count += 1;
     }
 
-    return count;
+    let count = 0;
+    days.forEach(function (weekday) {
+      for (let day = weekStart + weekday; day <= endDay; day += step) {
+        if (day >= startDay && !excluded.has(day)) {
+          count += 1;
+        }
+      }
+    });
+
+    return countLimit ? Math.min(count, countLimit) : count;
   }
 
   document.addEventListener("DOMContentLoaded", function () {
@@ -59,6 +134,12 @@
     const dateField = document.getElementById("date");
     const repeatIntervalField = document.getElementById("repeat_interval");
     const repeatUntilField = document.getElementById("repeat_until");
+    const repeatCountField = document.getElementById("repeat_count");
+    const repeatExceptionsField = document.getElementById("repeat_exceptions");
+    const skipHolidaysField = document.getElementById("skip_holidays");
+    const weekdayFields = Array.from(
+      document.querySelectorAll('#repeat-weekdays input[type="checkbox"]')
+    );
 
     const weekdayNames = [
       "Poniedziałek",
@@ -102,12 +183,23 @@
       const startValue = dateField ? dateField.value : null;
       const repeatUntilValue = repeatUntilField ? repeatUntilField.value : null;
       const repeatEnabled = repeatToggle ? repeatToggle.checked : false;
+      const weekdays = weekdayFields
+        .filter(function (field) {
+          return field.checked;
+        })
+        .map(function (field) {
+          return toNumber(field.value);
+        });
 
       const occurrences = calculateOccurrences({
         repeatEnabled,
         startValue,
         intervalWeeks,
         repeatUntilValue,
+        weekdays,
+        countLimit: toNumber(repeatCountField ? repeatCountField.value : null),
+        exceptionsValue: repeatExceptionsField ? repeatExceptionsField.value : "",
+        skipHolidays: skipHolidaysField ? skipHolidaysField.checked : false,
       });
 
       occurrenceDisplay.textContent = occurrences === null ? "–" : String(occurrences);
@@ -151,7 +243,14 @@
       repeatToggle.addEventListener("change", updateRepeatVisibility);
     }
 
-    [dateField, repeatIntervalField, repeatUntilField].forEach(function (field) {
+    [
+      dateField,
+      repeatIntervalField,
+      repeatUntilField,
+      repeatCountField,
+      repeatExceptionsField,
+      skipHolidaysField,
+    ].concat(weekdayFields).forEach(function (field) {
       if (!field) {
         return;
       }
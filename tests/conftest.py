@@ -8,11 +8,14 @@ from app.models import Coach, Location, Training, Volunteer
 
 
 @pytest.fixture
-def app_instance(monkeypatch):
+def app_instance(monkeypatch, tmp_path):
     monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
     monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    monkeypatch.setenv("NPLUSONE_MODE", "raise")
     app = create_app()
     app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    # Uploaded attachments land in the instance folder; keep them out of the checkout
+    app.instance_path = str(tmp_path / "instance")
     with app.app_context():
         db.create_all()
     yield app
@@ -42,6 +45,22 @@ def clear_pending_signups():
         _pending_signups.clear()
 
 
+@pytest.fixture(autouse=True)
+def clear_lid_cache():
+    """The @lid cache outlives the per-test in-memory database."""
+    from app.whatsapp_utils import clear_lid_cache
+    yield
+    clear_lid_cache()
+
+
+@pytest.fixture(autouse=True)
+def clear_attachment_cache():
+    """Cached attachment parts are keyed by ids of the per-test database."""
+    from app.attachments import clear_attachment_cache
+    yield
+    clear_attachment_cache()
+
+
 @pytest.fixture
 def sample_data(app_instance):
     """Create one coach, location, volunteer and training for tests."""
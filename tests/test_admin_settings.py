@@ -1,6 +1,7 @@
 import pytest
 from io import BytesIO
 from pathlib import Path
+from sqlalchemy import event, inspect as sa_inspect
 from app import db
 from app.models import EmailSettings, StoredFile
 import app
@@ -434,6 +435,86 @@ def test_admin_settings_migrates_legacy_file_ids(client, app_instance):
         assert (attachments_dir / minor_meta["stored_name"]).read_bytes() == b"minor"
 
 
+def _legacy_settings(app_instance, filename, data):
+    with app_instance.app_context():
+        stored = StoredFile(filename=filename, content_type="application/pdf", data=data)
+        db.session.add(stored)
+        db.session.flush()
+        db.session.merge(
+            EmailSettings(
+                id=1,
+                port=587,
+                sender="Admin",
+                encryption="tls",
+                registration_template="Hello",
+                registration_files_adult=[stored.id],
+                registration_files_minor=[],
+            )
+        )
+        db.session.commit()
+        return stored.id
+
+
+def test_settings_page_does_not_load_blob_of_materialized_file(client, app_instance):
+    client.post("/admin/login", data={"password": "secret"})
+    file_id = _legacy_settings(app_instance, "deferred.pdf", b"x" * 1000)
+    assert client.get("/admin/settings").status_code == 200
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app_instance.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        # The file is on disk now, so the row is only checked for existence
+        assert client.get("/admin/settings").status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    stored_queries = [s for s in statements if "stored_files" in s]
+    assert stored_queries
+    assert not any("stored_files.data" in s or "substr" in s for s in stored_queries)
+    with app_instance.app_context():
+        assert db.session.get(StoredFile, file_id) is not None
+
+
+def test_stored_file_iter_data_yields_chunks(app_instance):
+    with app_instance.app_context():
+        stored = StoredFile(filename="big.pdf", content_type="application/pdf", data=bytes(range(256)) * 10)
+        db.session.add(stored)
+        db.session.commit()
+        file_id = stored.id
+        db.session.expunge_all()
+
+        stored = db.session.get(StoredFile, file_id)
+        chunks = list(stored.iter_data(chunk_size=1000))
+
+        assert [len(c) for c in chunks] == [1000, 1000, 560]
+        assert b"".join(chunks) == bytes(range(256)) * 10
+        assert "data" not in sa_inspect(stored).dict
+
+
+def test_migrate_stored_files_command(app_instance):
+    file_id = _legacy_settings(app_instance, "cli_adult.pdf", b"adult via cli")
+
+    result = app_instance.test_cli_runner().invoke(
+        args=["migrate-stored-files", "--delete-rows"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Przeniesiono: 1" in result.output
+    with app_instance.app_context():
+        settings = db.session.get(EmailSettings, 1)
+        meta = settings.registration_files_adult[0]
+        assert meta["stored_name"] == f"legacy_{file_id}_cli_adult.pdf"
+        attachments_dir = Path(app_instance.instance_path) / "attachments"
+        assert (attachments_dir / meta["stored_name"]).read_bytes() == b"adult via cli"
+        assert db.session.get(StoredFile, file_id) is None
+
+
 def test_admin_send_test_email(client, app_instance, monkeypatch):
     login = client.post(
         "/admin/login", data={"password": "secret"}, follow_redirects=True
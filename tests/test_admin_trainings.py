@@ -306,3 +306,310 @@ def test_delete_series_marks_trainings_deleted(
         assert all(t.is_deleted for t in trainings)
         series = TrainingSeries.query.one()
         assert series.repeat is False
+
+
+def test_training_series_key_is_materialised(app_instance, coach_and_location):
+    coach_id, location_id = coach_and_location
+    with app_instance.app_context():
+        training = Training(
+            date=datetime(2099, 3, 4, 17, 30),
+            coach_id=coach_id,
+            location_id=location_id,
+        )
+        db.session.add(training)
+        db.session.commit()
+        assert training.series_key == _series_key_for(training)
+
+        training.date = datetime(2099, 3, 5, 9, 0)
+        db.session.commit()
+        assert training.series_key == f"3-0900-c{coach_id}-l{location_id}"
+
+
+def test_resolve_series_uses_single_query(app_instance, coach_and_location):
+    from sqlalchemy import event
+
+    from app.admin_routes import _resolve_series
+
+    coach_id, location_id = coach_and_location
+    with app_instance.app_context():
+        # Hundreds of historical series on other slots must not affect lookup.
+        for idx in range(300):
+            series = TrainingSeries(
+                start_date=datetime(2020, 1, 6, 8, 0),
+                repeat=True,
+                coach_id=coach_id,
+                location_id=location_id,
+                max_volunteers=2,
+            )
+            db.session.add(series)
+            db.session.add(
+                Training(
+                    date=datetime(2020, 1, 6 + idx % 7, 6 + idx % 12, 0),
+                    coach_id=coach_id,
+                    location_id=location_id,
+                    series=series,
+                )
+            )
+        target = TrainingSeries(
+            start_date=datetime(2099, 1, 3, 18, 0),
+            repeat=True,
+            coach_id=coach_id,
+            location_id=location_id,
+            max_volunteers=2,
+        )
+        target_training = Training(
+            date=datetime(2099, 1, 3, 18, 0),
+            coach_id=coach_id,
+            location_id=location_id,
+            series=target,
+        )
+        db.session.add_all([target, target_training])
+        db.session.commit()
+        series_key = _series_key_for(target_training)
+        target_id = target.id
+        db.session.expunge_all()
+
+        statements = []
+
+        def _count(*args, **kwargs):
+            statements.append(args[2])
+
+        event.listen(db.engine, "before_cursor_execute", _count)
+        try:
+            series, trainings, metadata = _resolve_series(series_key)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", _count)
+
+        assert len(statements) == 1
+        assert series.id == target_id
+        assert [t.series_id for t in trainings] == [target_id]
+        assert metadata["time_label"] == "18:00"
+
+
+def test_year_long_series_uses_set_based_conflict_check(
+    client, app_instance, coach_and_location
+):
+    from sqlalchemy import event
+
+    coach_id, location_id = coach_and_location
+    with app_instance.app_context():
+        db.session.add(
+            Training(
+                date=datetime(2099, 3, 5, 18, 0),
+                coach_id=coach_id,
+                location_id=location_id,
+            )
+        )
+        db.session.commit()
+
+    login = client.post(
+        "/admin/login", data={"password": "secret"}, follow_redirects=True
+    )
+    assert login.status_code == 200
+
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app_instance.app_context():
+        event.listen(db.engine, "before_cursor_execute", _record)
+        try:
+            response = client.post(
+                "/admin/trainings",
+                data={
+                    "date": "2099-01-01T18:00",
+                    "location_id": str(location_id),
+                    "coach_id": str(coach_id),
+                    "max_volunteers": "2",
+                    "repeat": "y",
+                    "repeat_interval": "1",
+                    "repeat_until": "2099-12-31",
+                },
+            )
+        finally:
+            event.remove(db.engine, "before_cursor_execute", _record)
+    assert response.status_code == 302
+
+    conflict_checks = [
+        s for s in statements
+        if s.lstrip().upper().startswith("SELECT") and "trainings.date IN (" in s
+    ]
+    training_inserts = [
+        s for s in statements if s.startswith("INSERT INTO trainings")
+    ]
+    assert len(conflict_checks) == 1
+    assert len(training_inserts) == 1
+
+    with app_instance.app_context():
+        series = TrainingSeries.query.one()
+        assert series.planned_count == 53
+        assert series.created_count == 52
+        assert series.skipped_dates == ["2099-03-05 18:00"]
+
+
+def test_manage_trainings_repeat_rule_with_weekdays_and_exceptions(
+    client, app_instance, coach_and_location
+):
+    coach_id, location_id = coach_and_location
+
+    login = client.post(
+        "/admin/login", data={"password": "secret"}, follow_redirects=True
+    )
+    assert login.status_code == 200
+
+    response = client.post(
+        "/admin/trainings",
+        data={
+            "date": "2099-01-05T18:00",
+            "location_id": str(location_id),
+            "coach_id": str(coach_id),
+            "max_volunteers": "2",
+            "repeat": "y",
+            "repeat_interval": "1",
+            "repeat_weekdays": ["0", "3"],
+            "repeat_count": "5",
+            "repeat_exceptions": "2099-01-08",
+            "skip_holidays": "y",
+        },
+        follow_redirects=True,
+    )
+    assert response.status_code == 200
+    assert "Dodano 5 z 5 zaplanowanych treningów." in response.get_data(as_text=True)
+
+    with app_instance.app_context():
+        dates = [
+            t.date.strftime("%Y-%m-%d %H:%M")
+            for t in Training.query.order_by(Training.date)
+        ]
+        # 2099-01-06 (Epiphany) is a Tuesday, so only the explicit exception applies.
+        assert dates == [
+            "2099-01-05 18:00",
+            "2099-01-12 18:00",
+            "2099-01-15 18:00",
+            "2099-01-19 18:00",
+            "2099-01-22 18:00",
+        ]
+        series = TrainingSeries.query.one()
+        assert series.repeat_until is None
+        assert series.planned_count == 5
+
+
+def test_manage_trainings_rejects_malformed_exceptions(
+    client, app_instance, coach_and_location
+):
+    coach_id, location_id = coach_and_location
+    client.post("/admin/login", data={"password": "secret"})
+
+    response = client.post(
+        "/admin/trainings",
+        data={
+            "date": "2099-01-05T18:00",
+            "location_id": str(location_id),
+            "coach_id": str(coach_id),
+            "max_volunteers": "2",
+            "repeat": "y",
+            "repeat_interval": "1",
+            "repeat_until": "2099-02-05",
+            "repeat_exceptions": "08.01.2099",
+        },
+    )
+    assert response.status_code == 200
+    assert "Podaj daty w formacie rrrr-mm-dd" in response.get_data(as_text=True)
+    with app_instance.app_context():
+        assert Training.query.count() == 0
+
+
+def test_delete_series_keeps_other_weekdays_of_the_rule(
+    client, app_instance, coach_and_location
+):
+    coach_id, location_id = coach_and_location
+    client.post("/admin/login", data={"password": "secret"})
+    client.post(
+        "/admin/trainings",
+        data={
+            "date": "2099-01-05T18:00",
+            "location_id": str(location_id),
+            "coach_id": str(coach_id),
+            "max_volunteers": "2",
+            "repeat": "y",
+            "repeat_interval": "1",
+            "repeat_weekdays": ["0", "2"],
+            "repeat_until": "2099-01-21",
+        },
+    )
+
+    monday_key = f"0-1800-c{coach_id}-l{location_id}"
+    response = client.post(f"/admin/trainings/series/{monday_key}/delete")
+    assert response.status_code == 302
+
+    with app_instance.app_context():
+        live = Training.query.filter(Training.is_deleted.is_(False)).all()
+        assert sorted(t.date.day for t in live) == [7, 14, 21]
+        assert all(t.date.weekday() == 2 for t in live)
+        assert TrainingSeries.query.one().repeat is True
+
+    page = client.get("/admin/trainings").get_data(as_text=True)
+    assert f"/admin/trainings/series/2-1800-c{coach_id}-l{location_id}/edit" in page
+
+
+def test_edit_series_prefills_from_the_selected_weekday(
+    client, app_instance, coach_and_location
+):
+    coach_id, location_id = coach_and_location
+    client.post("/admin/login", data={"password": "secret"})
+    client.post(
+        "/admin/trainings",
+        data={
+            "date": "2099-01-05T18:00",
+            "location_id": str(location_id),
+            "coach_id": str(coach_id),
+            "max_volunteers": "2",
+            "repeat": "y",
+            "repeat_interval": "1",
+            "repeat_weekdays": ["0", "2"],
+            "repeat_until": "2099-01-21",
+        },
+    )
+    with app_instance.app_context():
+        other = Coach(first_name="Inny", last_name="Trener", phone_number="456")
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+
+    client.post(
+        f"/admin/trainings/series/2-1800-c{coach_id}-l{location_id}/edit",
+        data={"coach_id": str(other_id), "location_id": str(location_id), "max_volunteers": "5"},
+    )
+
+    page = client.get(
+        f"/admin/trainings/series/2-1800-c{other_id}-l{location_id}/edit"
+    ).get_data(as_text=True)
+    assert f'<option selected value="{other_id}">' in page
+    assert 'name="max_volunteers" required type="number" value="5"' in page
+
+
+def test_manage_trainings_rejects_count_beyond_horizon(
+    client, app_instance, coach_and_location
+):
+    coach_id, location_id = coach_and_location
+    client.post("/admin/login", data={"password": "secret"})
+
+    response = client.post(
+        "/admin/trainings",
+        data={
+            "date": "2099-01-05T18:00",
+            "location_id": str(location_id),
+            "coach_id": str(coach_id),
+            "max_volunteers": "2",
+            "repeat": "y",
+            "repeat_interval": "1",
+            "repeat_count": "200",
+        },
+    )
+    assert response.status_code == 200
+    assert "Podaj datę zakończenia albo zmniejsz liczbę wystąpień." in response.get_data(
+        as_text=True
+    )
+    with app_instance.app_context():
+        assert Training.query.count() == 0
@@ -0,0 +1,290 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+import requests
+from sqlalchemy import event
+
+from app import db
+from app import ai_assistant
+from app.models import Booking, Coach, Location, Training, Volunteer
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    ai_assistant.clear_response_cache()
+    ai_assistant.clear_context_cache()
+    ai_assistant._breaker.reset()
+    yield
+    ai_assistant.clear_response_cache()
+    ai_assistant.clear_context_cache()
+    ai_assistant._breaker.reset()
+
+
+@pytest.fixture
+def volunteer_id(app_instance):
+    with app_instance.app_context():
+        coach = Coach(first_name="Jan", last_name="Nowak", phone_number="500100200")
+        location = Location(name="Hala")
+        volunteer = Volunteer(
+            first_name="Anna",
+            last_name="Kowalska",
+            email="anna@example.com",
+            phone_number="607575408",
+        )
+        training = Training(
+            date=datetime.now(timezone.utc) + timedelta(days=2),
+            coach=coach,
+            location=location,
+        )
+        db.session.add_all([coach, location, volunteer, training])
+        db.session.flush()
+        db.session.add(Booking(training_id=training.id, volunteer_id=volunteer.id))
+        db.session.commit()
+        return volunteer.id
+
+
+def _gemini_ok(text):
+    response = type("Resp", (), {})()
+    response.status_code = 200
+    response.text = ""
+    response.json = lambda: {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    return response
+
+
+def test_repeated_question_served_from_cache(app_instance, volunteer_id):
+    app_instance.config["GEMINI_API_KEY"] = "key"
+    with app_instance.app_context():
+        volunteer = db.session.get(Volunteer, volunteer_id)
+        with patch("app.ai_assistant._http.post") as post:
+            post.return_value = _gemini_ok("Trening jest w Hali.")
+            first = ai_assistant.ask_gemini("Gdzie jest trening?", volunteer=volunteer)
+            second = ai_assistant.ask_gemini("gdzie  jest trening", volunteer=volunteer)
+
+    assert first == second == "Trening jest w Hali."
+    assert post.call_count == 1
+
+
+def test_cache_key_includes_context(app_instance, volunteer_id):
+    app_instance.config["GEMINI_API_KEY"] = "key"
+    with app_instance.app_context():
+        volunteer = db.session.get(Volunteer, volunteer_id)
+        with patch("app.ai_assistant._http.post") as post:
+            post.return_value = _gemini_ok("Odpowiedź")
+            ai_assistant.ask_gemini("gdzie jest trening?", volunteer=volunteer)
+            Booking.query.delete()
+            db.session.commit()
+            ai_assistant.ask_gemini("gdzie jest trening?", volunteer=volunteer)
+
+    assert post.call_count == 2
+
+
+def test_cache_entries_expire_and_are_bounded(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(ai_assistant.time, "monotonic", lambda: clock[0])
+
+    ai_assistant._cache_put("a", "A", ttl=10, max_entries=2)
+    ai_assistant._cache_put("b", "B", ttl=10, max_entries=2)
+    assert ai_assistant._cache_get("a") == "A"  # "a" becomes most recent
+    ai_assistant._cache_put("c", "C", ttl=10, max_entries=2)
+
+    assert ai_assistant._cache_get("b") is None
+    assert ai_assistant._cache_get("c") == "C"
+
+    clock[0] += 11
+    assert ai_assistant._cache_get("a") is None
+    assert ai_assistant._cache_get("c") is None
+
+
+def test_breaker_opens_after_failures_and_probes_after_cooldown(
+    app_instance, volunteer_id, monkeypatch
+):
+    clock = [1000.0]
+    monkeypatch.setattr(ai_assistant.time, "monotonic", lambda: clock[0])
+    app_instance.config.update(
+        GEMINI_API_KEY="key", GEMINI_BREAKER_THRESHOLD=2, GEMINI_BREAKER_RESET=30
+    )
+    with app_instance.app_context():
+        volunteer = db.session.get(Volunteer, volunteer_id)
+        with patch("app.ai_assistant._http.post") as post:
+            post.side_effect = requests.Timeout("slow")
+            assert ai_assistant.ask_gemini("pytanie 1", volunteer=volunteer) is None
+            assert ai_assistant.ask_gemini("pytanie 2", volunteer=volunteer) is None
+            assert ai_assistant._breaker.state == "open"
+
+            # Open circuit: no upstream call at all
+            assert ai_assistant.ask_gemini("pytanie 3", volunteer=volunteer) is None
+            assert post.call_count == 2
+
+            clock[0] += 31
+            assert ai_assistant._breaker.state == "half-open"
+            post.side_effect = None
+            post.return_value = _gemini_ok("Jest OK")
+            assert ai_assistant.ask_gemini("pytanie 4", volunteer=volunteer) == "Jest OK"
+            assert ai_assistant._breaker.state == "closed"
+
+
+def _gemini_list_reply():
+    response = _gemini_ok("")
+    response.json = lambda: [{"candidates": []}]
+    return response
+
+
+@pytest.mark.parametrize(
+    "probe",
+    [{"side_effect": TypeError("boom")}, {"return_value": _gemini_list_reply()}],
+    ids=["error_from_call", "non_dict_reply"],
+)
+def test_unexpected_probe_error_does_not_wedge_breaker(
+    app_instance, volunteer_id, monkeypatch, probe
+):
+    clock = [1000.0]
+    monkeypatch.setattr(ai_assistant.time, "monotonic", lambda: clock[0])
+    app_instance.config.update(
+        GEMINI_API_KEY="key", GEMINI_BREAKER_THRESHOLD=1, GEMINI_BREAKER_RESET=30
+    )
+    with app_instance.app_context():
+        volunteer = db.session.get(Volunteer, volunteer_id)
+        with patch("app.ai_assistant._http.post") as post:
+            post.side_effect = requests.Timeout("slow")
+            assert ai_assistant.ask_gemini("pytanie 1", volunteer=volunteer) is None
+
+            clock[0] += 31
+            post.side_effect = None
+            post.configure_mock(**probe)
+            assert ai_assistant.ask_gemini("pytanie 2", volunteer=volunteer) is None
+            assert ai_assistant._breaker.state == "open"
+
+            clock[0] += 31
+            post.side_effect = None
+            post.return_value = _gemini_ok("Jest OK")
+            assert ai_assistant.ask_gemini("pytanie 3", volunteer=volunteer) == "Jest OK"
+            assert ai_assistant._breaker.state == "closed"
+
+
+def test_half_open_allows_single_probe(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(ai_assistant.time, "monotonic", lambda: clock[0])
+    breaker = ai_assistant.CircuitBreaker(threshold=1, reset_after=10)
+
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()  # probe already in flight
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_call_gives_up_at_overall_deadline(app_instance, volunteer_id):
+    app_instance.config.update(
+        GEMINI_API_KEY="key", GEMINI_TIMEOUT=0.2, GEMINI_BREAKER_THRESHOLD=1
+    )
+    release = threading.Event()
+
+    def trickling_post(*args, **kwargs):
+        # Each read stays under the per-read timeout, the whole reply does not
+        assert kwargs["timeout"] == (0.2, 0.2)
+        release.wait(5)
+        return _gemini_ok("Późna odpowiedź")
+
+    with app_instance.app_context():
+        volunteer = db.session.get(Volunteer, volunteer_id)
+        with patch("app.ai_assistant._http.post", side_effect=trickling_post):
+            started = time.monotonic()
+            try:
+                reply = ai_assistant.ask_gemini("pytanie", volunteer=volunteer)
+            finally:
+                release.set()
+            waited = time.monotonic() - started
+
+    assert reply is None
+    assert waited < 1
+    assert ai_assistant._breaker.state == "open"
+
+
+def _count_statements(callback):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _record)
+    try:
+        result = callback()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _record)
+    return result, statements
+
+
+def test_coach_context_counts_bookings_in_one_query(app_instance):
+    with app_instance.app_context():
+        coach = Coach(first_name="Jan", last_name="Nowak", phone_number="500100200")
+        location = Location(name="Hala")
+        db.session.add_all([coach, location])
+        trainings = [
+            Training(
+                date=datetime.now(timezone.utc) + timedelta(days=day),
+                coach=coach,
+                location=location,
+                max_volunteers=3,
+            )
+            for day in range(1, 6)
+        ]
+        db.session.add_all(trainings)
+        for index in range(2):
+            volunteer = Volunteer(
+                first_name="W",
+                last_name=str(index),
+                email=f"w{index}@example.com",
+                phone_number=f"60000000{index}",
+            )
+            db.session.add(volunteer)
+            db.session.flush()
+            db.session.add(Booking(training_id=trainings[0].id, volunteer_id=volunteer.id))
+        db.session.commit()
+        coach = db.session.get(Coach, coach.id)
+
+        context, statements = _count_statements(
+            lambda: ai_assistant._get_coach_context(coach)
+        )
+
+    assert len(statements) == 1
+    assert context.count("zapisanych wolontariuszy") == 5
+    assert "zapisanych wolontariuszy: 2/3" in context
+
+
+def test_volunteer_context_is_single_query_and_cached(app_instance, volunteer_id):
+    with app_instance.app_context():
+        volunteer = db.session.get(Volunteer, volunteer_id)
+        first, statements = _count_statements(
+            lambda: ai_assistant._get_volunteer_context(volunteer)
+        )
+        second, cached_statements = _count_statements(
+            lambda: ai_assistant._get_volunteer_context(volunteer)
+        )
+
+    assert len(statements) == 1
+    assert cached_statements == []
+    assert first == second
+    assert "trener: Jan Nowak (tel: 500100200)" in first
+    assert "oczekuje potwierdzenia" in first
+
+
+def test_volunteer_context_invalidated_by_booking_change(app_instance, volunteer_id):
+    with app_instance.app_context():
+        volunteer = db.session.get(Volunteer, volunteer_id)
+        assert "oczekuje potwierdzenia" in ai_assistant._get_volunteer_context(volunteer)
+
+        booking = Booking.query.filter_by(volunteer_id=volunteer_id).one()
+        booking.is_confirmed = True
+        db.session.commit()
+        assert "status: potwierdzony" in ai_assistant._get_volunteer_context(volunteer)
+
+        Booking.query.filter_by(volunteer_id=volunteer_id).delete()
+        db.session.commit()
+        assert "Brak nadchodzących" in ai_assistant._get_volunteer_context(volunteer)
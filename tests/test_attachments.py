@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+
+from sqlalchemy import event
+
+from app import attachments, db
+from app.attachments import registration_attachments
+from app.models import StoredFile
+
+
+def _write(app_instance, name, data):
+    directory = Path(app_instance.instance_path) / "attachments"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_bytes(data)
+    return path
+
+
+def _entry(name):
+    return {"stored_name": name, "original_name": "info.pdf", "content_type": "application/pdf"}
+
+
+def test_parts_are_reused_until_the_file_changes(app_instance, monkeypatch):
+    path = _write(app_instance, "cache_reuse.pdf", b"first")
+    reads = []
+    read_bytes = Path.read_bytes
+    monkeypatch.setattr(Path, "read_bytes", lambda self: reads.append(self) or read_bytes(self))
+
+    with app_instance.test_request_context():
+        first = registration_attachments([_entry("cache_reuse.pdf")])
+        second = registration_attachments([_entry("cache_reuse.pdf")])
+        assert second[0] is first[0]
+        assert len(reads) == 1
+
+        path.write_bytes(b"second version")
+        os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000))
+        third = registration_attachments([_entry("cache_reuse.pdf")])
+
+    assert len(reads) == 2
+    assert third[0].get_filename() == "info.pdf"
+    assert third[0].get_payload(decode=True) == b"second version"
+
+
+def test_cache_is_bounded_by_encoded_size(app_instance):
+    app_instance.config["ATTACHMENT_CACHE_MAX_BYTES"] = 3000
+    for name in ("cache_a.pdf", "cache_b.pdf", "cache_c.pdf"):
+        _write(app_instance, name, os.urandom(1000))
+
+    with app_instance.test_request_context():
+        for name in ("cache_a.pdf", "cache_b.pdf", "cache_c.pdf"):
+            registration_attachments([_entry(name)])
+
+        cached = [key[1] for key in attachments._parts]
+        assert cached == ["cache_b.pdf", "cache_c.pdf"]
+        assert attachments._parts_bytes <= 3000
+
+
+def test_legacy_rows_are_queried_once(app_instance):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app_instance.test_request_context():
+        stored = StoredFile(filename="legacy.pdf", content_type="application/pdf", data=b"legacy")
+        db.session.add(stored)
+        db.session.commit()
+        file_id = stored.id
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            for _ in range(3):
+                parts = registration_attachments([file_id])
+                assert parts[0].get_payload(decode=True) == b"legacy"
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+    assert len([s for s in statements if "stored_files" in s]) == 1
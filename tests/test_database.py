@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app, db
+from app.database import engine_options, normalize_database_url, sqlite_pragmas
+from app.models import Booking, Coach, Location, Training, Volunteer
+
+
+def _file_app(monkeypatch, tmp_path, **env):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'db.sqlite3'}")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    app = create_app()
+    app.config.update(TESTING=True)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Location(name="Hala"))
+        db.session.commit()
+    return app
+
+
+def _pragma(name):
+    return db.session.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_sqlite_profile_is_applied_to_connections(monkeypatch, tmp_path):
+    app = _file_app(monkeypatch, tmp_path, SQLITE_BUSY_TIMEOUT_MS="1234")
+
+    with app.app_context():
+        assert _pragma("journal_mode") == "wal"
+        assert _pragma("synchronous") == 1  # NORMAL
+        assert _pragma("busy_timeout") == 1234
+        assert _pragma("cache_size") == -32768
+        assert _pragma("mmap_size") == 268435456
+        assert _pragma("temp_store") == 2  # MEMORY
+
+
+def test_sqlite_profile_can_be_disabled(monkeypatch, tmp_path):
+    app = _file_app(monkeypatch, tmp_path, SQLITE_PROFILE="0")
+
+    with app.app_context():
+        assert _pragma("journal_mode") == "delete"
+
+
+def test_invalid_sqlite_setting_is_rejected():
+    config = {
+        "SQLITE_JOURNAL_MODE": "WAL; DROP TABLE coaches",
+        "SQLITE_SYNCHRONOUS": "NORMAL",
+        "SQLITE_BUSY_TIMEOUT_MS": 5000,
+        "SQLITE_CACHE_SIZE_KB": 1024,
+        "SQLITE_MMAP_SIZE": 0,
+        "SQLITE_TEMP_STORE": "MEMORY",
+    }
+    with pytest.raises(ValueError, match="SQLITE_JOURNAL_MODE"):
+        sqlite_pragmas(config)
+
+
+def _read_while_writer_holds_lock(app, tmp_path):
+    """Read through the app while another connection holds the write lock."""
+    writer = sqlite3.connect(tmp_path / "db.sqlite3", isolation_level=None)
+    writer.execute("BEGIN EXCLUSIVE")
+    writer.execute("INSERT INTO locations (name) VALUES ('Nowa hala')")
+    result = {}
+
+    def read():
+        with app.app_context():
+            try:
+                result["names"] = [loc.name for loc in Location.query.all()]
+            except Exception as exc:
+                result["error"] = exc
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    reader.join(timeout=10)
+    writer.execute("ROLLBACK")
+    writer.close()
+    return result
+
+
+def test_readers_do_not_block_on_writer_in_wal_mode(monkeypatch, tmp_path):
+    app = _file_app(monkeypatch, tmp_path, SQLITE_BUSY_TIMEOUT_MS="200")
+
+    result = _read_while_writer_holds_lock(app, tmp_path)
+
+    # The reader sees the last committed state, not the pending insert
+    assert result == {"names": ["Hala"]}
+
+
+def test_readers_block_on_writer_with_rollback_journal(monkeypatch, tmp_path):
+    app = _file_app(
+        monkeypatch, tmp_path, SQLITE_JOURNAL_MODE="DELETE", SQLITE_BUSY_TIMEOUT_MS="200"
+    )
+
+    result = _read_while_writer_holds_lock(app, tmp_path)
+
+    assert "database is locked" in str(result.get("error"))
+
+
+def test_postgres_urls_use_psycopg():
+    assert normalize_database_url("postgres://u:p@db/treningi") == "postgresql+psycopg://u:p@db/treningi"
+    assert normalize_database_url("postgresql://db/treningi") == "postgresql+psycopg://db/treningi"
+    assert normalize_database_url("postgresql+psycopg2://db/t") == "postgresql+psycopg2://db/t"
+    assert normalize_database_url("sqlite:///x.db") == "sqlite:///x.db"
+
+
+def _pool_config(**overrides):
+    config = {
+        "SQLALCHEMY_DATABASE_URI": "postgresql+psycopg://db/treningi",
+        "WEB_CONCURRENCY": 2,
+        "WEB_THREADS": 2,
+        "DB_MAX_CONNECTIONS": 20,
+        "DB_POOL_SIZE": 0,
+        "DB_POOL_RECYCLE": 1800,
+        "DB_POOL_TIMEOUT": 10,
+    }
+    config.update(overrides)
+    return config
+
+
+def test_postgres_pool_fits_connection_budget():
+    options = engine_options(_pool_config(WEB_CONCURRENCY=4))
+
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 2
+    assert options["pool_pre_ping"] is True
+    assert options["pool_recycle"] == 1800
+    # Four workers never exceed DB_MAX_CONNECTIONS together
+    assert 4 * (options["pool_size"] + options["max_overflow"]) <= 20
+
+
+def test_explicit_pool_size_and_sqlite_defaults():
+    assert engine_options(_pool_config(DB_POOL_SIZE=8))["pool_size"] == 8
+    assert engine_options(_pool_config(SQLALCHEMY_DATABASE_URI="sqlite:///x.db")) == {}
+
+
+def test_booking_limit_trigger_rejects_overbooking(app_instance):
+    with app_instance.app_context():
+        place = {"coach": Coach(first_name="J", last_name="N", phone_number="1"), "location": Location(name="Hala")}
+        full = Training(date=datetime.now(timezone.utc), max_volunteers=1, **place)
+        other = Training(date=datetime.now(timezone.utc), max_volunteers=1, **place)
+        first = Volunteer(first_name="A", last_name="B", email="a@example.com")
+        second = Volunteer(first_name="C", last_name="D", email="c@example.com")
+        db.session.add_all([full, other, first, second])
+        db.session.flush()
+        db.session.add(Booking(training=full, volunteer=first))
+        db.session.commit()
+
+        db.session.add(Booking(training=full, volunteer=second))
+        with pytest.raises(IntegrityError, match="booking_limit"):
+            db.session.commit()
+        db.session.rollback()
+
+        booking = Booking(training=other, volunteer=second)
+        db.session.add(booking)
+        db.session.commit()
+        booking.training_id = full.id
+        with pytest.raises(IntegrityError, match="booking_limit"):
+            db.session.commit()
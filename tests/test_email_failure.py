@@ -1,6 +1,7 @@
 import smtplib
 import pytest
-from app.email_utils import send_email
+from app.email_utils import send_bulk_email, send_email
+
 
 # override autouse fixture so send_email is not mocked
 @pytest.fixture(autouse=True)
@@ -12,14 +13,19 @@ def test_send_email_failure_returns_false(app_instance, monkeypatch):
     class FailingSMTP:
         def __init__(self, host, port):
             pass
+
         def __enter__(self):
             return self
+
         def __exit__(self, exc_type, exc, tb):
             pass
+
         def starttls(self):
             pass
+
         def login(self, username, password):
             pass
+
         def send_message(self, msg):
             raise smtplib.SMTPException("boom")
 
@@ -30,6 +36,52 @@ def test_send_email_failure_returns_false(app_instance, monkeypatch):
         assert error == "boom"
 
 
+def test_send_bulk_email_isolates_refusals_and_reconnects(app_instance, monkeypatch):
+    connections = []
+
+    class FlakySMTP:
+        def __init__(self, host, port):
+            connections.append(self)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            pass
+
+        def sendmail(self, from_addr, to_addrs, data):
+            if to_addrs == ["refused@example.com"]:
+                raise smtplib.SMTPRecipientsRefused({to_addrs[0]: (550, b"no such user")})
+            if to_addrs == ["drop@example.com"] and len(connections) == 1:
+                raise smtplib.SMTPServerDisconnected("gone")
+
+    monkeypatch.setattr(smtplib, "SMTP", FlakySMTP)
+    messages = [
+        ("ok@example.com", "<p>1</p>"),
+        ("refused@example.com", "<p>2</p>"),
+        ("drop@example.com", "<p>3</p>"),
+        ("last@example.com", "<p>4</p>"),
+    ]
+    with app_instance.app_context():
+        results = send_bulk_email("Sub", messages, host="h", port=25, encryption="none")
+
+    assert [ok for ok, _ in results] == [True, False, True, True]
+    assert len(connections) == 2
+
+
+def test_send_bulk_email_fails_remaining_when_server_is_down(app_instance, monkeypatch):
+    def refuse(host, port):
+        raise ConnectionRefusedError("refused")
+
+    monkeypatch.setattr(smtplib, "SMTP", refuse)
+    with app_instance.app_context():
+        results = send_bulk_email(
+            "Sub", [("a@example.com", "x"), ("b@example.com", "y")], host="h", port=25
+        )
+
+    assert results == [(False, "refused"), (False, "refused")]
+
+
 def test_admin_flash_on_email_failure(client, app_instance, monkeypatch):
     # login first
     login = client.post(
@@ -40,14 +92,19 @@ def test_admin_flash_on_email_failure(client, app_instance, monkeypatch):
     class FailingSMTP:
         def __init__(self, host, port):
             pass
+
         def __enter__(self):
             return self
+
         def __exit__(self, exc_type, exc, tb):
             pass
+
         def starttls(self):
             pass
+
         def login(self, username, password):
             pass
+
         def send_message(self, msg):
             raise smtplib.SMTPException("boom")
 
@@ -71,3 +128,41 @@ def test_admin_flash_on_email_failure(client, app_instance, monkeypatch):
     assert b"Nie uda\xc5\x82o si\xc4\x99 wys\xc5\x82a\xc4\x87 wiadomo\xc5\x9bci testowej" in resp.data
     assert b"boom" in resp.data
 
+
+def test_phone_requests_commit_per_batch_and_skip_bad_renders(app_instance, monkeypatch):
+    from app import cli, db
+    from app.models import EmailSettings, Volunteer
+
+    with app_instance.app_context():
+        db.session.add(EmailSettings(id=1, phone_request_template="<p>{first_name} {update_link}</p>"))
+        db.session.add_all(
+            Volunteer(first_name=name, last_name="Test", email=f"{name}@example.com", is_adult=True)
+            for name in ("ala", "bad", "ola", "ula")
+        )
+        db.session.commit()
+
+    def render(template, data):
+        if data["first_name"] == "bad":
+            raise ValueError("broken value")
+        return template.format(**data)
+
+    calls = []
+
+    def send(subject, messages):
+        calls.append([recipient for recipient, _body in messages])
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return [(True, None)] * len(messages)
+
+    monkeypatch.setattr(cli, "PHONE_REQUEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(cli, "render_template_string", render)
+    monkeypatch.setattr(cli, "send_bulk_email", send)
+    result = app_instance.test_cli_runner().invoke(args=["send-phone-requests"])
+
+    assert "Error rendering email for bad@example.com" in result.output
+    assert calls == [["ala@example.com"], ["ola@example.com", "ula@example.com"]]
+    with app_instance.app_context():
+        db.session.rollback()
+        sent = {v.first_name for v in Volunteer.query.filter_by(phone_request_sent=True)}
+        # The first batch was committed before the run was interrupted
+        assert sent == {"ala"}
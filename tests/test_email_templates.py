@@ -1,11 +1,14 @@
+import email
+import email.policy
 import smtplib
 import pytest
 
 from app.template_utils import render_template_string
-from app.email_utils import send_email
+from app.email_utils import send_bulk_email, send_email
 from app.models import EmailSettings
 from app import db
 
+
 # Override the autouse fixture from conftest so we can test send_email
 @pytest.fixture(autouse=True)
 def no_email():
@@ -25,14 +28,19 @@ def test_send_email_includes_plain_and_html(app_instance, monkeypatch):
         def __init__(self, host, port):
             captured['host'] = host
             captured['port'] = port
+
         def __enter__(self):
             return self
+
         def __exit__(self, exc_type, exc, tb):
             pass
+
         def starttls(self):
             captured['tls'] = True
+
         def login(self, username, password):
             captured['login'] = (username, password)
+
         def send_message(self, msg):
             captured['message'] = msg
 
@@ -102,6 +110,52 @@ def test_send_email_adds_attachments(app_instance, monkeypatch):
     assert attachment.get_payload(decode=True) == b"hello"
 
 
+def test_send_bulk_email_personalizes_and_shares_attachments(app_instance, monkeypatch):
+    connections = []
+
+    class DummySMTP:
+        def __init__(self, host, port):
+            self.sent = []
+            connections.append(self)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            pass
+
+        def starttls(self):
+            pass
+
+        def login(self, username, password):
+            pass
+
+        def sendmail(self, from_addr, to_addrs, data):
+            self.sent.append(email.message_from_bytes(data, policy=email.policy.default))
+
+    monkeypatch.setattr(smtplib, "SMTP", DummySMTP)
+
+    with app_instance.app_context():
+        results = send_bulk_email(
+            "Subject",
+            [("a@example.com", "<p>Hi A</p>"), ("b@example.com", "<p>Hi B</p>")],
+            attachments=[("info.txt", "text/plain", b"hello")],
+            host="smtp.example.com",
+            port=25,
+        )
+
+    assert results == [(True, None), (True, None)]
+    assert len(connections) == 1
+    first, second = connections[0].sent
+    assert first["To"] == "a@example.com" and second["To"] == "b@example.com"
+    assert first.get_body(preferencelist=("plain",)).get_content().strip() == "Hi A"
+    assert second.get_body(preferencelist=("html",)).get_content().strip() == "<p>Hi B</p>"
+    for msg in (first, second):
+        [attachment] = list(msg.iter_attachments())
+        assert attachment.get_filename() == "info.txt"
+        assert attachment.get_payload(decode=True) == b"hello"
+
+
 def test_preview_endpoint_renders(client, app_instance):
     with client.session_transaction() as sess:
         sess['admin_logged_in'] = True
@@ -0,0 +1,186 @@
+import os
+import re
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import create_app
+from app.instrumentation import profiler
+
+
+def test_server_timing_reports_sql_and_wall_time(client, sample_data):
+    profiler.reset()
+
+    response = client.get("/")
+
+    header = response.headers["Server-Timing"]
+    assert re.search(r"app;dur=\d+\.\d", header)
+    queries = int(re.search(r'sql;dur=[\d.]+;desc="(\d+) queries"', header).group(1))
+    assert queries > 0
+
+    stats = profiler.snapshot()["routes.index"]
+    assert stats["count"] == 1
+    assert stats["sql_count"] == queries
+    assert stats["max_ms"] == stats["total_ms"] > 0
+
+
+def test_outbound_http_time_is_attributed_to_service(client):
+    profiler.reset()
+    client.post("/admin/login", data={"password": "secret"})
+
+    with patch(
+        "app.admin_routes.http_requests.post",
+        return_value=MagicMock(status_code=201),
+    ):
+        response = client.post(
+            "/admin/whatsapp/api/send",
+            json={"chatId": "48697495755@c.us", "message": "test"},
+        )
+
+    assert "waha;dur=" in response.headers["Server-Timing"]
+    assert "waha" in profiler.snapshot()["admin.whatsapp_api_send"]["http_ms"]
+
+
+def test_profiling_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+    monkeypatch.setenv("ADMIN_PASSWORD", "secret")
+    monkeypatch.setenv("REQUEST_PROFILING", "0")
+    app = create_app()
+
+    response = app.test_client().get("/webhook/whatsapp")
+
+    assert "Server-Timing" not in response.headers
+
+
+def test_slow_query_logged_with_view_and_plan(client, app_instance, sample_data, caplog):
+    app_instance.config["SLOW_QUERY_MS"] = 1e-9
+
+    with caplog.at_level("WARNING"):
+        client.get("/")
+
+    slow = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Slow query")]
+    assert slow
+    trainings_query = next(m for m in slow if "FROM trainings" in m)
+    assert "in view routes.index" in trainings_query
+    assert "params=" in trainings_query
+    assert re.search(r"plan: .*(SCAN|SEARCH)", trainings_query)
+
+
+def test_slow_query_logged_for_cli_command(app_instance, caplog):
+    app_instance.config["SLOW_QUERY_MS"] = 1e-9
+
+    with caplog.at_level("WARNING"):
+        result = app_instance.test_cli_runner().invoke(args=["send-reminders"])
+
+    assert result.exit_code == 0, result.output
+    assert any(
+        "in command " in r.getMessage() and "send-reminders" in r.getMessage()
+        for r in caplog.records
+    )
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="set TEST_POSTGRES_URL")
+def test_failed_explain_keeps_postgres_transaction_usable(monkeypatch, caplog):
+    from sqlalchemy import text
+
+    from app import db, instrumentation
+
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", os.environ["TEST_POSTGRES_URL"])
+    app = create_app()
+    app.config["SLOW_QUERY_MS"] = 1e-9
+    monkeypatch.setitem(instrumentation._EXPLAIN_PREFIXES, "postgresql", "EXPLAIN (NO_SUCH_OPTION) ")
+
+    with app.app_context(), caplog.at_level("WARNING"):
+        assert db.session.execute(text("SELECT 1")).scalar() == 1
+        # Same transaction: would fail with InFailedSqlTransaction without the savepoint
+        assert db.session.execute(text("SELECT 2")).scalar() == 2
+        db.session.rollback()
+
+    assert any("plan: <unavailable" in r.getMessage() for r in caplog.records)
+
+
+def test_fast_queries_are_not_logged(client, app_instance, sample_data, caplog):
+    app_instance.config["SLOW_QUERY_MS"] = 60_000
+
+    with caplog.at_level("WARNING"):
+        client.get("/")
+
+    assert not any(r.getMessage().startswith("Slow query") for r in caplog.records)
+
+
+def _trainings_with_lazy_bookings(app_instance, count):
+    from datetime import datetime, timedelta, timezone
+
+    from app import db
+    from app.models import Coach, Location, Training
+
+    coach = Coach(first_name="Jan", last_name="Nowak", phone_number="500100200")
+    location = Location(name="Hala")
+    db.session.add_all(
+        Training(
+            date=datetime(2099, 1, 1, tzinfo=timezone.utc) + timedelta(days=day),
+            coach=coach,
+            location=location,
+        )
+        for day in range(count)
+    )
+    db.session.commit()
+    db.session.expunge_all()
+    return Training.query.all()
+
+
+def test_repeated_lazy_load_fails_in_raise_mode(app_instance):
+    from app.instrumentation import NPlusOneError
+
+    app_instance.config["NPLUSONE_THRESHOLD"] = 3
+    with app_instance.app_context():
+        trainings = _trainings_with_lazy_bookings(app_instance, 5)
+        with pytest.raises(NPlusOneError, match="Training.bookings lazy-loaded 4 times"):
+            for training in trainings:
+                len(training.bookings)
+
+
+def test_repeated_lazy_load_warns_once(app_instance, caplog):
+    app_instance.config.update(NPLUSONE_MODE="warn", NPLUSONE_THRESHOLD=3)
+    with app_instance.app_context():
+        trainings = _trainings_with_lazy_bookings(app_instance, 8)
+        with caplog.at_level("WARNING"):
+            for training in trainings:
+                len(training.bookings)
+
+    warnings = [r.getMessage() for r in caplog.records if "N+1 query" in r.getMessage()]
+    assert len(warnings) == 1
+    assert "Training.bookings" in warnings[0]
+
+
+@pytest.mark.parametrize("path", ["/", "/admin/trainings"])
+def test_training_lists_eager_load_relationships(client, app_instance, path):
+    from datetime import datetime, timedelta, timezone
+
+    from app import db
+    from app.models import Booking, Coach, Location, Training, TrainingSeries, Volunteer
+
+    count = app_instance.config["NPLUSONE_THRESHOLD"] + 2
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    with app_instance.app_context():
+        for i in range(count):
+            coach = Coach(first_name="Coach", last_name=str(i), phone_number=f"60000{i:04d}")
+            location = Location(name=f"Court {i}")
+            series = TrainingSeries(
+                start_date=start, repeat=True, repeat_interval_weeks=1,
+                coach=coach, location=location, max_volunteers=2,
+            )
+            training = Training(
+                date=start + timedelta(days=i), coach=coach, location=location, series=series
+            )
+            volunteer = Volunteer(
+                first_name="Vol", last_name=str(i), email=f"vol{i}@example.com", is_adult=True
+            )
+            db.session.add_all([training, volunteer])
+            db.session.flush()
+            db.session.add(Booking(training_id=training.id, volunteer_id=volunteer.id))
+        db.session.commit()
+    client.post("/admin/login", data={"password": "secret"})
+
+    # More trainings than NPLUSONE_THRESHOLD: a lazy load per row would raise
+    assert client.get(path).status_code == 200
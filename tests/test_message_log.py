@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import requests
+
+from app import db
+from app.message_log import record_message
+from app.models import MessageLog
+
+WAHA_ID = "true_48697495755@c.us_3EB0A1B2C3"
+
+
+def _ack(ack, waha_id=WAHA_ID, from_me=True):
+    return {
+        "event": "message.ack",
+        "payload": {"id": waha_id, "fromMe": from_me, "ack": ack},
+    }
+
+
+def test_sent_message_is_logged_with_waha_id(app_instance):
+    from app.whatsapp_utils import send_whatsapp_message
+
+    with app_instance.app_context():
+        app_instance.config["WHATSAPP_API_URL"] = "http://waha:3000"
+        app_instance.config["WHATSAPP_RECIPIENT_SPACING"] = 0
+        with patch("app.whatsapp_utils.requests.post") as post:
+            post.return_value.status_code = 201
+            post.return_value.json.return_value = {
+                "id": {"fromMe": True, "_serialized": WAHA_ID},
+                "ack": 1,
+            }
+            assert send_whatsapp_message("697495755", "hej", template="volunteer_reminder") == (
+                True,
+                None,
+            )
+            post.side_effect = requests.ConnectionError("refused")
+            ok, error = send_whatsapp_message("697495755", "hej", template="volunteer_reminder")
+        assert not ok
+
+        sent, failed = MessageLog.query.order_by(MessageLog.id).all()
+        assert sent.recipient == "48697495755@c.us"
+        assert sent.template == "volunteer_reminder"
+        assert (sent.status, sent.ack, sent.waha_id) == ("sent", 1, WAHA_ID)
+        assert sent.latency_ms is not None
+        assert failed.status == "failed"
+        assert failed.error == error
+        assert failed.waha_id is None
+
+
+def test_ack_webhook_only_moves_status_forward(client, app_instance):
+    with app_instance.app_context():
+        record_message("48697495755@c.us", "reply", "sent", waha_id=WAHA_ID, ack=1)
+
+    assert client.post("/webhook/whatsapp", json=_ack(3)).get_json()["action"] == "ack"
+    # Late acks for earlier states, and acks of incoming messages, change nothing
+    assert client.post("/webhook/whatsapp", json=_ack(2)).get_json()["reason"] == "stale ack"
+    assert client.post("/webhook/whatsapp", json=_ack(-1)).get_json()["reason"] == "stale ack"
+    assert client.post("/webhook/whatsapp", json=_ack(4, from_me=False)).get_json()["status"] == "ignored"
+
+    with app_instance.app_context():
+        row = MessageLog.query.one()
+        assert (row.status, row.ack) == ("read", 3)
+        assert row.acked_at is not None
+
+
+def test_admin_view_filters_and_summarises(client, app_instance):
+    now = datetime.now(timezone.utc)
+    with app_instance.app_context():
+        for i, status in enumerate(["sent", "read", "failed", "failed"]):
+            db.session.add(
+                MessageLog(
+                    recipient=f"4869749575{i}@c.us",
+                    template="volunteer_reminder" if i < 3 else "reply",
+                    status=status,
+                    latency_ms=100 * (i + 1),
+                    error="WAHA API error: 500" if status == "failed" else None,
+                    created_at=now - timedelta(hours=i),
+                )
+            )
+        db.session.commit()
+    client.post("/admin/login", data={"password": "secret"})
+
+    page = client.get("/admin/messages").get_data(as_text=True)
+    assert "Wszystkie: 4" in page
+    assert "Błędy: 50.0%" in page
+    assert "Średni czas wysyłki: 250 ms" in page
+
+    page = client.get(
+        "/admin/messages?status=failed&template=volunteer_reminder"
+    ).get_data(as_text=True)
+    assert "Wszystkie: 1" in page
+    assert "48697495752@c.us" in page
+    assert "48697495753@c.us" not in page
+
+    for recipient in ("+48 697 495 750", "697495750", "48697495750@c.us"):
+        page = client.get(f"/admin/messages?recipient={recipient}").get_data(as_text=True)
+        assert "Wszystkie: 1" in page
+    # Whole numbers only; a prefix no longer matches every 48697… chat
+    page = client.get("/admin/messages?recipient=4869749575").get_data(as_text=True)
+    assert "Wszystkie: 0" in page
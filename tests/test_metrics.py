@@ -0,0 +1,114 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import metrics
+from app.metrics import Counter, Gauge, Histogram, Registry
+from app.models import Volunteer
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    metrics.REGISTRY.reset()
+    yield
+    metrics.REGISTRY.reset()
+
+
+def test_registry_renders_text_exposition_format():
+    registry = Registry()
+    sends = Counter("sends_total", "Sends.", ["result"], registry=registry)
+    queue = Gauge("queue_depth", "Queue.", registry=registry)
+    latency = Histogram("latency_seconds", "Latency.", ["endpoint"], buckets=(0.1, 1), registry=registry)
+
+    sends.labels("sent").inc()
+    sends.labels("sent").inc()
+    queue.set(3)
+    latency.labels('a"b').observe(0.05)
+    latency.labels('a"b').observe(0.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP sends_total Sends.",
+        "# TYPE sends_total counter",
+        'sends_total{result="sent"} 2.0',
+        "# HELP queue_depth Queue.",
+        "# TYPE queue_depth gauge",
+        "queue_depth 3.0",
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{endpoint="a\\"b",le="0.1"} 1.0',
+        'latency_seconds_bucket{endpoint="a\\"b",le="1.0"} 2.0',
+        'latency_seconds_bucket{endpoint="a\\"b",le="+Inf"} 2.0',
+        'latency_seconds_sum{endpoint="a\\"b"} 0.55',
+        'latency_seconds_count{endpoint="a\\"b"} 2.0',
+    ]
+
+
+def test_metrics_requires_admin_or_token(client, app_instance):
+    assert client.get("/metrics").status_code == 302
+
+    app_instance.config["METRICS_TOKEN"] = "scrape"
+    bad = client.get("/metrics", headers={"Authorization": "Bearer nope"})
+    assert bad.status_code == 401
+    non_ascii = client.get("/metrics", headers={"Authorization": "Bearer scrapé"})
+    assert non_ascii.status_code == 401
+    ok = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert ok.status_code == 200
+    assert ok.content_type.startswith("text/plain; version=0.0.4")
+
+    client.post("/admin/login", data={"password": "secret"})
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{endpoint="admin.login"} 1.0' in body
+    assert "pending_signup_notifications 0.0" in body
+
+
+def test_sends_and_intents_are_counted(client, app_instance):
+    with app_instance.app_context():
+        from app import db
+        from app.whatsapp_utils import send_whatsapp_message
+
+        db.session.add(
+            Volunteer(
+                first_name="Anna",
+                last_name="Kowalska",
+                email="anna@example.com",
+                phone_number="607575408",
+            )
+        )
+        db.session.commit()
+
+        app_instance.config["WHATSAPP_API_URL"] = "http://waha"
+        app_instance.config["WHATSAPP_RECIPIENT_SPACING"] = 0
+        with patch(
+            "app.whatsapp_utils.requests.post",
+            side_effect=[MagicMock(status_code=201), MagicMock(status_code=500, text="x")],
+        ):
+            send_whatsapp_message("+48697495755", "test")
+            send_whatsapp_message("+48697495755", "test")
+
+    assert metrics.WHATSAPP_MESSAGES.value("sent") == 1
+    assert metrics.WHATSAPP_MESSAGES.value("failed") == 1
+
+    with patch("app.webhook_routes.send_whatsapp_message"), patch(
+        "app.webhook_routes.ask_gemini", return_value=None
+    ):
+        for body in ("rezygnuję z 2", "co słychać?"):
+            client.post(
+                "/webhook/whatsapp",
+                data=json.dumps(
+                    {
+                        "event": "message",
+                        "payload": {
+                            "fromMe": False,
+                            "from": "48607575408@c.us",
+                            "body": body,
+                            "id": f"metrics-{body}",
+                        },
+                    }
+                ),
+                content_type="application/json",
+            )
+
+    assert metrics.WEBHOOK_INTENTS.value("cancel_n") == 1
+    assert metrics.WEBHOOK_INTENTS.value("none") == 1
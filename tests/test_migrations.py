@@ -0,0 +1,163 @@
+"""Alembic migrations on every supported database backend.
+
+The PostgreSQL cases need ``TEST_POSTGRES_URL`` (a server where the user may
+create databases; each test uses a fresh one) or ``testing.postgresql`` with
+the server binaries on PATH; without either they are skipped.
+"""
+
+import os
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect, make_url, text
+from sqlalchemy.exc import IntegrityError
+
+from app.database import normalize_database_url
+
+ROOT = Path(__file__).resolve().parents[1]
+MODEL_TABLES = {
+    "coaches",
+    "locations",
+    "volunteers",
+    "trainings",
+    "training_series",
+    "bookings",
+    "email_settings",
+    "whatsapp_lid_mappings",
+    "stored_files",
+    "notification_jobs",
+    "notification_deliveries",
+    "message_log",
+    "whatsapp_rate_limits",
+}
+
+
+def _postgres_server():
+    """Return ``(url, stop)`` for a PostgreSQL server, or skip the test."""
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if url:
+        return url, lambda: None
+    try:
+        import testing.postgresql
+    except ImportError:
+        pytest.skip("set TEST_POSTGRES_URL or install testing.postgresql")
+    try:
+        server = testing.postgresql.Postgresql()
+    except RuntimeError as exc:
+        pytest.skip(f"cannot start PostgreSQL: {exc}")
+    return server.url(), server.stop
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def database_url(request, tmp_path):
+    if request.param == "sqlite":
+        yield f"sqlite:///{tmp_path / 'migrations.sqlite3'}"
+        return
+
+    server_url, stop = _postgres_server()
+    admin = create_engine(normalize_database_url(server_url), isolation_level="AUTOCOMMIT")
+    name = f"treningi_test_{uuid.uuid4().hex[:12]}"
+    with admin.connect() as conn:
+        conn.execute(text(f'CREATE DATABASE "{name}"'))
+    try:
+        url = make_url(normalize_database_url(server_url)).set(database=name)
+        yield url.render_as_string(hide_password=False)
+    finally:
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        admin.dispose()
+        stop()
+
+
+def _flask_db(url: str, *args: str) -> None:
+    # A separate process, as in deployment; Alembic also reconfigures logging
+    result = subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "app:create_app", "db", *args],
+        cwd=ROOT,
+        env={**os.environ, "SQLALCHEMY_DATABASE_URI": url},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def _book_training_twice(engine) -> None:
+    """Fill a one-place training, then insert a second booking."""
+    with engine.begin() as conn:
+        coach_id = conn.execute(
+            text(
+                "INSERT INTO coaches (first_name, last_name, phone_number) "
+                "VALUES ('Jan', 'Nowak', '500100200') RETURNING id"
+            )
+        ).scalar()
+        location_id = conn.execute(
+            text("INSERT INTO locations (name) VALUES ('Hala') RETURNING id")
+        ).scalar()
+        training_id = conn.execute(
+            text(
+                "INSERT INTO trainings (date, coach_id, location_id, is_canceled, "
+                "is_deleted, max_volunteers) VALUES (:date, :coach, :location, "
+                ":false, :false, 1) RETURNING id"
+            ),
+            {
+                "date": datetime.now(timezone.utc),
+                "coach": coach_id,
+                "location": location_id,
+                "false": False,
+            },
+        ).scalar()
+        volunteer_ids = [
+            conn.execute(
+                text(
+                    "INSERT INTO volunteers (first_name, last_name, email) "
+                    "VALUES ('Ann', 'Smith', :email) RETURNING id"
+                ),
+                {"email": email},
+            ).scalar()
+            for email in ("ann@example.com", "bob@example.com")
+        ]
+    for volunteer_id in volunteer_ids:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO bookings (training_id, volunteer_id, time_change_notified) "
+                    "VALUES (:training, :volunteer, :false)"
+                ),
+                {"training": training_id, "volunteer": volunteer_id, "false": False},
+            )
+
+
+def test_upgrade_builds_schema_with_booking_limit(database_url):
+    _flask_db(database_url, "upgrade")
+
+    engine = create_engine(database_url)
+    try:
+        inspector = inspect(engine)
+        assert MODEL_TABLES <= set(inspector.get_table_names())
+        if engine.dialect.name == "postgresql":
+            date = next(c for c in inspector.get_columns("trainings") if c["name"] == "date")
+            assert date["type"].timezone is True
+
+        with pytest.raises(IntegrityError, match="booking_limit"):
+            _book_training_twice(engine)
+    finally:
+        engine.dispose()
+
+
+def test_booking_limit_revision_downgrades_cleanly(database_url):
+    _flask_db(database_url, "upgrade")
+    _flask_db(database_url, "downgrade", "i9j0k1l2m3n4")
+
+    engine = create_engine(database_url)
+    try:
+        # Without the trigger the second booking goes through
+        _book_training_twice(engine)
+    finally:
+        engine.dispose()
+
+    _flask_db(database_url, "upgrade")
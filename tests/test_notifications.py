@@ -0,0 +1,289 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db, notifications
+from app.models import (
+    Booking,
+    Coach,
+    EmailSettings,
+    Location,
+    NotificationDelivery,
+    NotificationJob,
+    Training,
+    TrainingSeries,
+    Volunteer,
+)
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Record bulk emails and WhatsApp messages instead of sending them."""
+    outbox = {"email": [], "whatsapp": []}
+
+    def fake_bulk(subject, messages, **kwargs):
+        messages = list(messages)
+        outbox["email"].extend((subject, to, html) for to, html in messages)
+        return [(True, None)] * len(messages)
+
+    def fake_whatsapp(phone, message, **kwargs):
+        outbox["whatsapp"].append((phone, message))
+        return True, None
+
+    monkeypatch.setattr("app.email_utils.send_bulk_email", fake_bulk)
+    monkeypatch.setattr("app.notifications.send_whatsapp_message", fake_whatsapp)
+    return outbox
+
+
+def _booked_training(date, volunteers=2, series=None):
+    coach = Coach.query.first() or Coach(first_name="Jan", last_name="Nowak", phone_number="500100200")
+    location = Location.query.first() or Location(name="Hala")
+    training = Training(
+        date=date, coach=coach, location=location, max_volunteers=volunteers, series=series
+    )
+    db.session.add(training)
+    for i in range(volunteers):
+        volunteer = Volunteer.query.filter_by(email=f"v{i}@example.com").first() or Volunteer(
+            first_name=f"Imię{i}",
+            last_name="Test",
+            email=f"v{i}@example.com",
+            phone_number=f"60010020{i}",
+        )
+        db.session.add(Booking(training=training, volunteer=volunteer))
+    db.session.commit()
+    return training.id
+
+
+def _login(client):
+    client.post("/admin/login", data={"password": "secret"})
+
+
+def test_cancel_training_sends_personal_messages_via_job(client, app_instance, sent):
+    app_instance.config["NOTIFICATIONS_ASYNC"] = False
+    with app_instance.app_context():
+        db.session.add(EmailSettings(id=1, cancellation_template="Cześć {first_name}, {date} odwołany"))
+        training_id = _booked_training(datetime.now(timezone.utc) + timedelta(days=2))
+    _login(client)
+
+    response = client.post(f"/admin/trainings/{training_id}/cancel")
+
+    assert response.status_code == 302
+    assert "/admin/notifications/" in response.headers["Location"]
+    # One message per volunteer; nobody sees the other addresses
+    assert sorted(to for _, to, _ in sent["email"]) == ["v0@example.com", "v1@example.com"]
+    assert all(f"Cześć {name}" in html for name, (_, _, html) in zip(["Imię0", "Imię1"], sent["email"]))
+    assert sorted(phone for phone, _ in sent["whatsapp"]) == ["600100200", "600100201"]
+
+    page = client.get(response.headers["Location"]).get_data(as_text=True)
+    assert "Wysłane: 4" in page
+    assert "Zakończono" in page
+    with app_instance.app_context():
+        assert db.session.get(Training, training_id).is_canceled
+
+
+def test_cancel_training_returns_before_notifications_are_sent(client, app_instance, monkeypatch):
+    release = threading.Event()
+    outbox = []
+
+    def slow_whatsapp(phone, message, **kwargs):
+        release.wait(5)
+        outbox.append(phone)
+        return True, None
+
+    monkeypatch.setattr("app.notifications.send_whatsapp_message", slow_whatsapp)
+    with app_instance.app_context():
+        training_id = _booked_training(datetime.now(timezone.utc) + timedelta(days=2))
+    _login(client)
+
+    response = client.post(f"/admin/trainings/{training_id}/cancel")
+    assert response.status_code == 302
+    assert outbox == []
+    page = client.get(response.headers["Location"]).get_data(as_text=True)
+    assert "Wysyłka trwa" in page
+
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name.startswith("notifications-"):
+            thread.join(5)
+    assert sorted(outbox) == ["600100200", "600100201"]
+
+
+def test_cancel_series_cancels_upcoming_trainings_in_one_job(client, app_instance, sent):
+    app_instance.config["NOTIFICATIONS_ASYNC"] = False
+    now = datetime.now(timezone.utc)
+    with app_instance.app_context():
+        coach = Coach(first_name="Jan", last_name="Nowak", phone_number="500100200")
+        location = Location(name="Hala")
+        series = TrainingSeries(
+            start_date=now - timedelta(days=7),
+            repeat=True,
+            repeat_interval_weeks=1,
+            coach=coach,
+            location=location,
+            max_volunteers=1,
+        )
+        db.session.add(series)
+        past_id = _booked_training(now - timedelta(days=7), volunteers=1, series=series)
+        upcoming_ids = [
+            _booked_training(now + timedelta(days=7 * week), volunteers=1, series=series)
+            for week in (1, 2)
+        ]
+        series_key = db.session.get(Training, past_id).series_key
+    _login(client)
+
+    response = client.post(f"/admin/trainings/series/{series_key}/cancel")
+
+    assert response.status_code == 302
+    with app_instance.app_context():
+        assert not db.session.get(Training, past_id).is_canceled
+        assert all(db.session.get(Training, i).is_canceled for i in upcoming_ids)
+        assert NotificationJob.query.count() == 1
+    assert len(sent["email"]) == 2
+    assert len(sent["whatsapp"]) == 2
+
+
+def test_failed_deliveries_are_recorded_and_stale_jobs_resumed(app_instance, monkeypatch):
+    monkeypatch.setattr(
+        "app.email_utils.send_bulk_email",
+        lambda subject, messages, **kw: [(False, "550 no such user")] * len(list(messages)),
+    )
+    monkeypatch.setattr("app.notifications.send_whatsapp_message", lambda phone, msg, **kw: (True, None))
+    with app_instance.test_request_context():
+        training_id = _booked_training(datetime.now(timezone.utc) + timedelta(days=1), volunteers=1)
+        job = notifications.training_cancellation_job([training_id])
+        # A worker that died a while ago
+        job.heartbeat_at = datetime.now(timezone.utc) - notifications.STALE_AFTER * 2
+        db.session.commit()
+        job_id = job.id
+
+        assert notifications.resume_stale_jobs() == [job_id]
+        assert notifications.resume_stale_jobs() == []
+
+        deliveries = {d.channel: d for d in NotificationDelivery.query.filter_by(job_id=job_id)}
+        assert deliveries["email"].status == "failed"
+        assert deliveries["email"].error == "550 no such user"
+        assert deliveries["whatsapp"].status == "sent"
+        assert notifications.job_progress(job_id) == {"pending": 0, "sent": 1, "failed": 1, "total": 2}
+
+
+def test_running_job_is_not_claimed_twice(app_instance):
+    with app_instance.test_request_context():
+        training_id = _booked_training(datetime.now(timezone.utc) + timedelta(days=1), volunteers=1)
+        job = notifications.training_cancellation_job([training_id])
+        job.heartbeat_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+        assert notifications.run_job(job.id) is False
+        assert notifications.job_progress(job.id)["pending"] == 2
+
+
+def test_edit_training_time_change_is_sent_by_job(client, app_instance, sent):
+    app_instance.config["NOTIFICATIONS_ASYNC"] = False
+    when = (datetime.now(timezone.utc) + timedelta(days=3)).replace(
+        hour=18, minute=0, second=0, microsecond=0
+    )
+    with app_instance.app_context():
+        training_id = _booked_training(when)
+        training = db.session.get(Training, training_id)
+        coach_id, location_id = training.coach_id, training.location_id
+    _login(client)
+
+    response = client.post(
+        f"/admin/trainings/edit/{training_id}",
+        data={
+            "date": when.strftime("%Y-%m-%dT19:30"),
+            "location_id": str(location_id),
+            "coach_id": str(coach_id),
+            "max_volunteers": "2",
+            "confirm_time_change": "1",
+        },
+    )
+
+    assert response.status_code == 302
+    assert "/admin/notifications/" in response.headers["Location"]
+    assert all(subject == "Zmiana godziny treningu" for subject, _, _ in sent["email"])
+    assert len(sent["email"]) == 2
+    assert all("Nowa godzina: *19:30*" in message for _, message in sent["whatsapp"])
+    with app_instance.app_context():
+        assert all(b.time_change_notified for b in db.session.get(Training, training_id).bookings)
+
+
+def test_edit_training_move_to_other_day_and_place_notifies(client, app_instance, sent):
+    app_instance.config["NOTIFICATIONS_ASYNC"] = False
+    when = (datetime.now(timezone.utc) + timedelta(days=3)).replace(
+        hour=18, minute=0, second=0, microsecond=0
+    )
+    with app_instance.app_context():
+        training_id = _booked_training(when, volunteers=1)
+        coach_id = db.session.get(Training, training_id).coach_id
+        pool = Location(name="Basen")
+        db.session.add(pool)
+        db.session.commit()
+        pool_id = pool.id
+    _login(client)
+    data = {
+        # Same hour, next day and another place
+        "date": (when + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M"),
+        "location_id": str(pool_id),
+        "coach_id": str(coach_id),
+        "max_volunteers": "2",
+    }
+
+    page = client.post(f"/admin/trainings/edit/{training_id}", data=data).get_data(as_text=True)
+    assert "Czy na pewno chcesz przenieść trening" in page
+    assert not sent["email"]
+
+    response = client.post(
+        f"/admin/trainings/edit/{training_id}", data={**data, "confirm_time_change": "1"}
+    )
+
+    assert "/admin/notifications/" in response.headers["Location"]
+    assert [subject for subject, _, _ in sent["email"]] == ["Zmiany w treningach"]
+    (_, message), = sent["whatsapp"]
+    assert "📍 Basen (było: Hala)" in message
+    assert "(było: " in message.split("📍")[0]
+
+
+def test_edit_series_sends_one_message_per_volunteer(client, app_instance, sent):
+    app_instance.config["NOTIFICATIONS_ASYNC"] = False
+    now = datetime.now(timezone.utc)
+    with app_instance.app_context():
+        coach = Coach(first_name="Jan", last_name="Nowak", phone_number="500100200")
+        location = Location(name="Hala")
+        new_location = Location(name="Basen")
+        series = TrainingSeries(
+            start_date=now + timedelta(days=7),
+            repeat=True,
+            repeat_interval_weeks=1,
+            coach=coach,
+            location=location,
+            max_volunteers=2,
+        )
+        db.session.add_all([series, new_location])
+        # v0 is booked on both trainings, v1 only on the first
+        first_id = _booked_training(now + timedelta(days=7), volunteers=2, series=series)
+        _booked_training(now + timedelta(days=14), volunteers=1, series=series)
+        series_key = db.session.get(Training, first_id).series_key
+        coach_id, new_location_id = coach.id, new_location.id
+    _login(client)
+
+    response = client.post(
+        f"/admin/trainings/series/{series_key}/edit",
+        data={
+            "coach_id": str(coach_id),
+            "location_id": str(new_location_id),
+            "max_volunteers": "2",
+        },
+    )
+
+    assert response.status_code == 302
+    assert "/admin/notifications/" in response.headers["Location"]
+    assert sorted(to for _, to, _ in sent["email"]) == ["v0@example.com", "v1@example.com"]
+    messages = dict(sent["whatsapp"])
+    assert messages["600100200"].count("📍 Basen (było: Hala)") == 2
+    assert messages["600100201"].count("📍 Basen (było: Hala)") == 1
+    with app_instance.app_context():
+        job = NotificationJob.query.one()
+        assert job.kind == "training_changed"
+        assert job.title == "Zmiana 2 treningów"
@@ -0,0 +1,101 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.recurrence import (
+    easter_sunday,
+    expand_weekly,
+    parse_date_list,
+    polish_public_holidays,
+)
+
+
+def test_default_rule_matches_every_n_weeks():
+    start = datetime(2024, 1, 3, 18, 0)
+    result = expand_weekly(start, interval_weeks=2, until=date(2024, 1, 31))
+    assert result == [
+        datetime(2024, 1, 3, 18, 0),
+        datetime(2024, 1, 17, 18, 0),
+        datetime(2024, 1, 31, 18, 0),
+    ]
+
+
+def test_multiple_weekdays_never_start_before_first_date():
+    # Wednesday start; Monday of the first week is skipped.
+    start = datetime(2024, 1, 3, 9, 30)
+    result = expand_weekly(
+        start, until=date(2024, 1, 15), weekdays=[0, 2, 4]
+    )
+    assert [d.date() for d in result] == [
+        date(2024, 1, 3),
+        date(2024, 1, 5),
+        date(2024, 1, 8),
+        date(2024, 1, 10),
+        date(2024, 1, 12),
+        date(2024, 1, 15),
+    ]
+    assert all(d.hour == 9 and d.minute == 30 for d in result)
+
+
+def test_interval_counts_weeks_from_start_week():
+    start = datetime(2024, 1, 3, 18, 0)
+    result = expand_weekly(
+        start, interval_weeks=2, until=date(2024, 1, 31), weekdays=[2, 3]
+    )
+    assert [d.date() for d in result] == [
+        date(2024, 1, 3),
+        date(2024, 1, 4),
+        date(2024, 1, 17),
+        date(2024, 1, 18),
+        date(2024, 1, 31),
+    ]
+
+
+def test_exceptions_and_holidays_are_skipped_before_count():
+    start = datetime(2024, 4, 29, 17, 0)  # Monday
+    result = expand_weekly(
+        start,
+        weekdays=[0, 2],
+        count=4,
+        exclude=[date(2024, 5, 6)],
+        skip_holidays=True,
+    )
+    # 1 May (Wed) is a holiday, 6 May excluded explicitly.
+    assert [d.date() for d in result] == [
+        date(2024, 4, 29),
+        date(2024, 5, 8),
+        date(2024, 5, 13),
+        date(2024, 5, 15),
+    ]
+
+
+def test_count_without_until_is_bounded():
+    result = expand_weekly(datetime(2024, 1, 1, 10, 0), count=500)
+    assert 100 < len(result) < 110
+
+
+@pytest.mark.parametrize(
+    "year, expected",
+    [(2024, date(2024, 3, 31)), (2025, date(2025, 4, 20)), (2026, date(2026, 4, 5))],
+)
+def test_easter_sunday(year, expected):
+    assert easter_sunday(year) == expected
+
+
+def test_polish_public_holidays_include_movable_feasts():
+    holidays = polish_public_holidays(2025)
+    assert date(2025, 4, 21) in holidays  # Easter Monday
+    assert date(2025, 6, 19) in holidays  # Corpus Christi
+    assert date(2025, 12, 24) in holidays
+    assert date(2024, 12, 24) not in polish_public_holidays(2024)
+
+
+def test_parse_date_list():
+    assert parse_date_list("2024-01-01, 2024-02-02;2024-03-03") == [
+        date(2024, 1, 1),
+        date(2024, 2, 2),
+        date(2024, 3, 3),
+    ]
+    assert parse_date_list("") == []
+    with pytest.raises(ValueError):
+        parse_date_list("01.02.2024")
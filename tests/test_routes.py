@@ -56,6 +56,42 @@ def test_duplicate_booking_flash(client, app_instance):
         assert volunteer.is_adult is True
 
 
+def test_concurrent_double_submit_reports_existing_booking(client, app_instance):
+    from sqlalchemy import event
+
+    training_id, volunteer_id = setup_training(app_instance)
+
+    def other_request_books_first(session):
+        # The duplicate lands after the route checked for an existing booking
+        if session.new:
+            session.execute(
+                db.insert(Booking).values(training_id=training_id, volunteer_id=volunteer_id)
+            )
+
+    with app_instance.app_context():
+        event.listen(db.session, "before_commit", other_request_books_first)
+        try:
+            response = client.post(
+                '/',
+                data={
+                    'first_name': 'Ann',
+                    'last_name': 'Smith',
+                    'email': 'ann@example.com',
+                    'phone_number': '500600700',
+                    'training_id': str(training_id),
+                    'is_adult': 'true',
+                    'privacy_consent': 'y',
+                },
+                follow_redirects=True,
+            )
+        finally:
+            event.remove(db.session, "before_commit", other_request_books_first)
+
+    page = response.get_data(as_text=True)
+    assert 'Jesteś już zapisany na ten trening.' in page
+    assert 'Limit wolontariuszy' not in page
+
+
 def test_deleted_training_shows_in_history(client, app_instance):
     training_id, _ = setup_training(app_instance)
 
@@ -118,7 +154,7 @@ def test_signup_handles_attachment_metadata(
         db.session.add(settings)
         db.session.commit()
 
-    captured: dict[str, list[tuple[str, str, bytes]] | None] = {"attachments": None}
+    captured: dict[str, list | None] = {"attachments": None}
 
     def fake_send_email(subject, body, recipients, **kwargs):
         captured["attachments"] = kwargs.get("attachments")
@@ -144,7 +180,7 @@ def test_signup_handles_attachment_metadata(
     assert b"Zapisano na trening!" in response.data
     attachments = captured["attachments"]
     assert attachments is not None and len(attachments) == 1
-    filename, content_type, data = attachments[0]
-    assert filename == "info.txt"
-    assert content_type == "text/plain"
-    assert data == b"Important info"
+    part = attachments[0]
+    assert part.get_filename() == "info.txt"
+    assert part.get_content_type() == "text/plain"
+    assert part.get_payload(decode=True) == b"Important info"
@@ -124,7 +124,7 @@ def test_registration_attachments_match_age(
 ):
     training_id, _, _, _ = sample_data
 
-    captured: list[list[tuple[str, str, bytes]] | None] = []
+    captured: list[list | None] = []
 
     def fake_send_email(*args, **kwargs):
         captured.append(kwargs.get("attachments"))
@@ -174,9 +174,9 @@ def test_registration_attachments_match_age(
     sign_up(client, minor_volunteer, training_id)
 
     assert len(captured) == 2
-    assert captured[0] and captured[0][0][0] == "adult.pdf"
-    assert captured[0][0][1] == "application/pdf"
-    assert captured[0][0][2] == b"adult"
-    assert captured[1] and captured[1][0][0] == "minor.pdf"
-    assert captured[1][0][1] == "application/pdf"
-    assert captured[1][0][2] == b"minor"
+    assert captured[0] and captured[0][0].get_filename() == "adult.pdf"
+    assert captured[0][0].get_content_type() == "application/pdf"
+    assert captured[0][0].get_payload(decode=True) == b"adult"
+    assert captured[1] and captured[1][0].get_filename() == "minor.pdf"
+    assert captured[1][0].get_content_type() == "application/pdf"
+    assert captured[1][0].get_payload(decode=True) == b"minor"
@@ -0,0 +1,206 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app import create_app, db, throttle
+from app.models import MessageLog, WhatsAppRateLimit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttle, "time", clock)
+    monkeypatch.setattr(throttle, "_swept_at", 0.0)
+    return clock
+
+
+def test_global_rate_allows_a_burst_then_paces(app_instance, clock):
+    app_instance.config.update(
+        WHATSAPP_RATE_PER_MINUTE=60, WHATSAPP_RATE_BURST=2, WHATSAPP_RECIPIENT_SPACING=0
+    )
+    with app_instance.app_context():
+        waits = [throttle.wait_turn(f"4860010020{i}@c.us") for i in range(4)]
+
+    assert waits == [0, 0, 1, 1]
+
+
+def test_recipient_spacing_applies_per_chat(app_instance, clock):
+    app_instance.config.update(WHATSAPP_RATE_PER_MINUTE=0, WHATSAPP_RECIPIENT_SPACING=5)
+    with app_instance.app_context():
+        assert throttle.wait_turn("48697495755@c.us") == 0
+        assert throttle.wait_turn("48600100200@c.us") == 0
+        assert throttle.wait_turn("48697495755@c.us") == 5
+
+
+def test_global_delay_pushes_next_message_to_the_same_chat(app_instance, clock):
+    app_instance.config.update(
+        WHATSAPP_RATE_PER_MINUTE=6, WHATSAPP_RATE_BURST=1, WHATSAPP_RECIPIENT_SPACING=5
+    )
+    with app_instance.app_context():
+        throttle.wait_turn("48600100200@c.us")
+        # Waits 10s for the global limit, so the chat is next free 5s after that
+        assert throttle.wait_turn("48697495755@c.us") == 10
+        app_instance.config["WHATSAPP_RATE_PER_MINUTE"] = 0
+        assert throttle.reserve_slot("48697495755@c.us", clock.now) == clock.now + 5
+
+
+def test_concurrent_senders_get_distinct_slots(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'throttle.db'}")
+    monkeypatch.setenv("WHATSAPP_RATE_PER_MINUTE", "60")
+    monkeypatch.setenv("WHATSAPP_RATE_BURST", "1")
+    monkeypatch.setenv("WHATSAPP_RECIPIENT_SPACING", "0")
+    # Separate app objects stand in for the web and scheduler processes
+    apps = [create_app(), create_app()]
+    with apps[0].app_context():
+        db.create_all()
+    slots = []
+
+    def send(app, n):
+        with app.app_context():
+            for i in range(n):
+                slots.append(throttle.reserve_slot(f"4860010020{i}@c.us", now=0.0))
+
+    threads = [threading.Thread(target=send, args=(app, 10)) for app in apps for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(slots) == [float(i) for i in range(40)]
+
+
+def test_inbound_limit_refills_and_ignores_rejected_messages(app_instance, clock):
+    app_instance.config.update(WEBHOOK_RATE_LIMIT=2, WEBHOOK_RATE_WINDOW=60)
+    chat = "48697495755@c.us"
+    with app_instance.app_context():
+        start = clock.now
+        assert [throttle.inbound_limited(chat, start) for _ in range(3)] == [False, False, True]
+        assert throttle.inbound_limited("48600100200@c.us", start) is False
+        # One message frees up every 30s; the rejected one took nothing
+        assert throttle.inbound_limited(chat, start + 29) is True
+        assert throttle.inbound_limited(chat, start + 30) is False
+        assert throttle.inbound_limited(chat, start + 30) is True
+
+
+def test_quiet_chats_do_not_touch_the_database(app_instance, clock, monkeypatch):
+    app_instance.config.update(WEBHOOK_RATE_LIMIT=10, WEBHOOK_RATE_WINDOW=60)
+    consumed = []
+    original = throttle._consume
+    monkeypatch.setattr(
+        throttle, "_consume", lambda *args: consumed.append(args[1]) or original(*args)
+    )
+    with app_instance.app_context():
+        for i in range(100):
+            assert throttle.inbound_limited(f"486001{i:05d}@c.us", clock.now) is False
+        assert consumed == []
+        # A second message while the bucket fills counts both in the shared row
+        assert throttle.inbound_limited("48600100000@c.us", clock.now + 1) is False
+        assert consumed == ["inbound:48600100000@c.us"]
+        row = db.session.get(WhatsAppRateLimit, "inbound:48600100000@c.us")
+        assert row.tat == clock.now + 1 + 12
+
+
+def test_inbound_cache_evicts_least_recent_chat(app_instance, clock):
+    app_instance.config.update(
+        WEBHOOK_RATE_LIMIT=1, WEBHOOK_RATE_WINDOW=60, WEBHOOK_RATE_CACHE_SIZE=2
+    )
+    with app_instance.app_context():
+        for chat in ("a@c.us", "b@c.us", "a@c.us", "c@c.us"):
+            throttle.inbound_limited(chat, clock.now)
+        cache = app_instance.extensions["inbound_rate_limits"]
+        assert list(cache.buckets) == ["a@c.us", "c@c.us"]
+
+
+def test_sweep_drops_drained_chat_buckets_in_batches(app_instance, clock, monkeypatch):
+    monkeypatch.setattr(throttle, "SWEEP_BATCH", 2)
+    app_instance.config.update(WHATSAPP_RATE_PER_MINUTE=60, WHATSAPP_RECIPIENT_SPACING=3)
+    with app_instance.app_context():
+        throttle.reserve_slot("48600100200@c.us", clock.now - 10)
+        throttle.reserve_slot("48697495755@c.us", clock.now)
+        db.session.add_all(
+            [WhatsAppRateLimit(key=f"inbound:{i}@c.us", tat=clock.now + i - 5) for i in range(10)]
+        )
+        db.session.commit()
+
+        assert throttle.sweep(clock.now) == 7
+        keys = {row.key for row in WhatsAppRateLimit.query}
+    # The global bucket stays; a busy chat keeps its row until it drains
+    assert keys == {"global", "chat:48697495755@c.us"} | {
+        f"inbound:{i}@c.us" for i in range(6, 10)
+    }
+
+
+def test_request_hands_a_paced_message_to_a_timer(app_instance, clock):
+    app_instance.config.update(
+        WHATSAPP_API_URL="http://waha:3000",
+        WHATSAPP_RATE_PER_MINUTE=0,
+        WHATSAPP_RECIPIENT_SPACING=5,
+    )
+    from app.whatsapp_utils import send_whatsapp_message
+
+    timers = []
+
+    class RecordingTimer:
+        def __init__(self, interval, function, args):
+            self.interval, self.function, self.args = interval, function, args
+            timers.append(self)
+
+        def start(self):
+            pass
+
+    with app_instance.test_request_context(), patch(
+        "app.whatsapp_utils.requests.post"
+    ) as post, patch("app.whatsapp_utils.threading.Timer", RecordingTimer):
+        post.return_value.status_code = 201
+        post.return_value.json.return_value = {}
+        assert send_whatsapp_message("697495755", "pierwsza") == (True, None)
+        assert send_whatsapp_message("697495755", "druga") == (True, None)
+
+        # The request did not sleep; the second message waits in a timer
+        assert clock.sleeps == []
+        assert post.call_count == 1
+        (timer,) = timers
+        assert timer.interval == 5
+        timer.function(*timer.args)
+
+        assert post.call_count == 2
+        assert post.call_args.kwargs["json"]["text"] == "druga"
+        assert MessageLog.query.count() == 2
+
+
+def test_inbound_limit_is_shared_between_processes(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'inbound.db'}")
+    monkeypatch.setenv("WEBHOOK_RATE_LIMIT", "5")
+    # Separate app objects stand in for two gunicorn workers
+    apps = [create_app(), create_app()]
+    with apps[0].app_context():
+        db.create_all()
+    results = []
+
+    def receive(app):
+        with app.app_context():
+            for _ in range(5):
+                results.append(throttle.inbound_limited("48697495755@c.us", now=1000.0))
+
+    threads = [threading.Thread(target=receive, args=(app,)) for app in apps for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each worker may let the first message of a quiet chat through on its own
+    assert 5 <= results.count(False) <= 6
@@ -121,3 +121,67 @@ def test_ask_gemini_rejects_unknown_sender(app_instance):
         from app.ai_assistant import ask_gemini
 
         assert ask_gemini("hello") is None
+
+
+def test_webhook_logs_one_structured_record(
+    client, app_instance, volunteer_with_phone, monkeypatch, caplog, capsys
+):
+    import logging
+
+    monkeypatch.setattr("app.webhook_routes.ask_gemini", lambda *a, **k: "AI reply")
+    monkeypatch.setattr("app.webhook_routes.send_whatsapp_message", lambda *a, **k: None)
+    app_instance.logger.setLevel(logging.INFO)
+
+    with caplog.at_level(logging.INFO, logger=app_instance.logger.name):
+        client.post(
+            "/webhook/whatsapp",
+            data=json.dumps(_webhook_payload("48607575408@c.us", "o której jutro?")),
+            content_type="application/json",
+        )
+
+    records = [
+        json.loads(r.getMessage())
+        for r in caplog.records
+        if r.getMessage().startswith('{"event": "whatsapp_webhook"')
+    ]
+    assert len(records) == 1
+    record = records[0]
+    assert record["action"] == "unknown"
+    assert record["sender"] == "volunteer"
+    assert record["intent"] is None
+    assert set(record["stages_ms"]) == {"parse", "dedup", "identify", "intent", "handle"}
+    assert not any(r.levelno == logging.DEBUG for r in caplog.records)
+    assert capsys.readouterr().out == ""
+
+
+def test_chat_over_the_webhook_rate_limit_gets_429(
+    client, app_instance, volunteer_with_phone, monkeypatch
+):
+    app_instance.config["WEBHOOK_RATE_LIMIT"] = 2
+    monkeypatch.setattr("app.webhook_routes.ask_gemini", lambda *a, **k: "AI reply")
+    monkeypatch.setattr("app.webhook_routes.send_whatsapp_message", lambda *a, **k: (True, None))
+
+    statuses = [
+        client.post(
+            "/webhook/whatsapp",
+            data=json.dumps(_webhook_payload("48607575408@c.us", f"pytanie {i}")),
+            content_type="application/json",
+        ).status_code
+        for i in range(3)
+    ]
+
+    assert statuses == [200, 200, 429]
+
+
+def test_duplicate_ids_expire_and_stay_bounded(monkeypatch):
+    from app import webhook_routes
+
+    monkeypatch.setattr(webhook_routes, "_processed_msg_ids", webhook_routes.OrderedDict())
+    monkeypatch.setattr(webhook_routes, "DEDUP_MAX_IDS", 2)
+    seen = webhook_routes._seen_recently
+
+    assert seen("m1", 0) is False
+    assert seen("m1", 10) is True
+    assert seen("m1", 31) is False
+    assert [seen(m, 32) for m in ("m2", "m3")] == [False, False]
+    assert list(webhook_routes._processed_msg_ids) == ["m2", "m3"]
@@ -0,0 +1,44 @@
+import pytest
+
+from app.webhook_routes import detect_intent, normalize_text
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("POTWIERDZAM", "confirm"),
+        ("Potwierdzam, do zobaczenia", "confirm"),
+        ("potwierdz", "confirm"),
+        ("Tak", "confirm"),
+        ("tak, będę", "confirm"),
+        ("Będę!", "confirm"),
+        ("ok", "confirm"),
+        ("  +  ", "confirm"),
+        ("potwierdzam oba", "confirm"),
+        ("Potwierdzam wszystkie", "confirm"),
+        ("potwierdzam 2", "confirm_2"),
+        ("Tak, potwierdzam 1", "confirm_1"),
+        ("1", "confirm_1"),
+        (" 12 ", "confirm_12"),
+        ("REZYGNUJĘ", "cancel"),
+        ("rezygnuje", "cancel"),
+        ("rezygnacja", "cancel"),
+        ("Odwołuję", "cancel"),
+        ("anuluj", "cancel"),
+        ("Rezygnuję ze wszystkich", "cancel"),
+        ("rezygnuję z 2", "cancel_2"),
+        ("rezygnuje 3", "cancel_3"),
+        ("potwierdzam 1, rezygnuję z 2", "confirm_1"),
+        ("Dzień dobry, gdzie jest hala?", None),
+        ("okej", None),
+        ("taki sobie", None),
+        ("1 2", None),
+        ("", None),
+    ],
+)
+def test_detect_intent(message, expected):
+    assert detect_intent(message) == expected
+
+
+def test_normalize_text_strips_accents_and_case():
+    assert normalize_text("  ZAŻÓŁĆ Gęślą Jaźń ") == "zazolc gesla jazn"
@@ -0,0 +1,81 @@
+import io
+import json
+from unittest.mock import MagicMock, patch
+
+from app import db
+from app.models import Volunteer, WhatsAppLidMapping
+from app.webhook_routes import _extract_phone_from_lid
+from app.whatsapp_utils import clear_lid_cache
+
+
+LID = "123456789012345@lid"
+
+
+def _urlopen_returning(payload):
+    return MagicMock(return_value=io.BytesIO(json.dumps(payload).encode()))
+
+
+def test_lid_resolved_once_then_served_from_cache_and_db(app_instance):
+    with app_instance.app_context():
+        urlopen = _urlopen_returning({"name": "+48 607 575 408"})
+        with patch("app.webhook_routes.urllib.request.urlopen", urlopen):
+            assert _extract_phone_from_lid(LID) == "48607575408"
+            assert _extract_phone_from_lid(LID) == "48607575408"
+            assert urlopen.call_count == 1
+
+            # A restarted process still finds the mapping in the DB
+            clear_lid_cache()
+            assert _extract_phone_from_lid(LID) == "48607575408"
+            assert urlopen.call_count == 1
+
+        assert db.session.get(WhatsAppLidMapping, LID).phone == "48607575408"
+
+
+def test_chat_list_fallback_remembers_every_lid(app_instance):
+    chats = [
+        {"id": {"_serialized": "111@lid"}, "name": "+48 500 100 200"},
+        {"id": {"_serialized": LID}, "name": "+48 607 575 408"},
+        {"id": {"_serialized": "222@lid"}, "name": "Bez numeru"},
+    ]
+    responses = [OSError("no single-chat endpoint"), io.BytesIO(json.dumps(chats).encode())]
+    with app_instance.app_context():
+        with patch(
+            "app.webhook_routes.urllib.request.urlopen", side_effect=responses
+        ) as urlopen:
+            assert _extract_phone_from_lid(LID) == "48607575408"
+            assert _extract_phone_from_lid("111@lid") == "48500100200"
+        assert urlopen.call_count == 2
+        assert db.session.get(WhatsAppLidMapping, "222@lid") is None
+
+
+def test_admin_chat_list_prefills_lid_mappings(client, app_instance):
+    with app_instance.app_context():
+        db.session.add(
+            Volunteer(
+                first_name="Anna",
+                last_name="Kowalska",
+                email="anna@example.com",
+                phone_number="607 575 408",
+            )
+        )
+        db.session.commit()
+
+    response = MagicMock(status_code=200)
+    response.json.return_value = [
+        {"id": {"_serialized": LID}, "name": "+48 607 575 408", "timestamp": 1},
+        {"id": {"_serialized": "999@lid"}, "name": "Obcy", "timestamp": 2},
+        {"id": {"_serialized": "888@lid"}, "name": "Anna Kowalska", "timestamp": 0},
+    ]
+    client.post("/admin/login", data={"password": "secret"})
+    with patch("app.admin_routes.http_requests.get", return_value=response):
+        chats = client.get("/admin/whatsapp/api/chats").get_json()
+    assert [chat["id"] for chat in chats] == [LID, "888@lid"]
+
+    with app_instance.app_context():
+        # A match on the contact name alone is listed but not remembered
+        assert db.session.get(WhatsAppLidMapping, "888@lid") is None
+
+    with app_instance.app_context():
+        with patch("app.webhook_routes.urllib.request.urlopen") as urlopen:
+            assert _extract_phone_from_lid(LID) == "48607575408"
+        urlopen.assert_not_called()